@@ -20,6 +20,75 @@ SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
 
+# Adresses de l'API et du service de tokens Spotify (le test de charge les remplace par
+# celles d'un faux serveur local, voir `python manage.py loadtest`)
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+SPOTIFY_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+
+# Client HTTP Spotify : connexions conservées par worker, délais (s), nouvelles tentatives
+# et regroupement des requêtes GET identiques simultanées
+SPOTIFY_HTTP = {
+    "POOL_SIZE": 20,
+    "CONNECT_TIMEOUT": 3.05,
+    "READ_TIMEOUT": 10,
+    "RETRIES": 2,
+    "BACKOFF_FACTOR": 0.3,
+    "COALESCE": True,
+}
+
+# Nombre maximum de commandes de lecture envoyées en parallèle par worker (synchronisation)
+SPOTIFY_SYNC_CONCURRENCY = 16
+
+# Nombre maximum de requêtes de collecte d'historique (profils musicaux) envoyées en parallèle
+# par worker, dans un pool distinct de celui des commandes de lecture
+SPOTIFY_BACKGROUND_CONCURRENCY = 8
+
+# Synchronisation continue des groupes : intervalles d'interrogation (s), facteur
+# d'allongement quand rien ne change, écart (ms) déclenchant une nouvelle synchronisation et
+# nombre maximum de boucles simultanées par processus
+SPOTYNOV_SYNC_LOOP = {
+    "MIN_INTERVAL": 1.0,
+    "MAX_INTERVAL": 10.0,
+    "BACKOFF": 1.5,
+    "DRIFT_THRESHOLD_MS": 500,
+    "MAX_LOOPS": 100,
+}
+
+# Pagination de la liste des groupes : taille de page par défaut et maximale
+SPOTYNOV_GROUP_LIST = {
+    "DEFAULT_LIMIT": 100,
+    "MAX_LIMIT": 1000,
+}
+
+# Nombre maximum d'éléments d'une requête groupée (routes `.../bulk/`)
+SPOTYNOV_BULK_MAX_ITEMS = 1000
+
+# Flux d'événements des groupes : événements conservés par groupe pour les reconnexions
+# et intervalle (s) des messages de maintien de connexion
+SPOTYNOV_EVENTS = {
+    "BUFFER_SIZE": 256,
+    "HEARTBEAT": 15,
+}
+
+# Régulateur des appels Spotify par worker : débit (requêtes/s), rafale, attente maximale (s)
+# et nouvelles tentatives après un 429
+SPOTIFY_RATE_LIMIT = {
+    "RATE": 10,
+    "BURST": 20,
+    "MAX_WAIT": 30,
+    "RETRIES": 3,
+}
+
+# Mesures des requêtes : envoi de l'en-tête `Server-Timing` et bornes (s) des histogrammes
+# de durée exposés par la route `api/metrics/`
+SPOTYNOV_METRICS = {
+    "SERVER_TIMING": True,
+    "BUCKETS": (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+}
+
+# Délai (en secondes) avant l'expiration d'un token Spotify à partir duquel il est renouvelé
+SPOTIFY_TOKEN_REFRESH_MARGIN = 60
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -53,6 +122,8 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # Durée des requêtes et de leurs phases (en-tête `Server-Timing`, route `api/metrics/`)
+    'users.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +165,26 @@ DATABASES = {
 }
 
 
+# Stockage des utilisateurs et des groupes
+# 'users.backends.JSONBackend' (users.json / groups.json) ou 'users.backends.SQLiteBackend'
+# (remplir la base avec `python manage.py migrate_json_storage`)
+
+SPOTYNOV_STORAGE = {
+    'BACKEND': 'users.backends.JSONBackend',
+    'OPTIONS': {},
+}
+
+
+# Enregistrement et rejeu des échanges avec Spotify : `MODE` vaut `None` (appels directs),
+# "record" (ajout de chaque échange au fichier JSONL `FILE`) ou "replay" (réponses lues dans
+# le fichier, sans réseau, après la durée d'origine si `EMULATE_TIMING`)
+SPOTIFY_RECORDING = {
+    'MODE': os.getenv("SPOTIFY_RECORDING_MODE") or None,
+    'FILE': os.getenv("SPOTIFY_RECORDING_FILE") or BASE_DIR / 'spotify_fixtures.jsonl',
+    'EMULATE_TIMING': os.getenv("SPOTIFY_RECORDING_EMULATE_TIMING") == "1",
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -143,8 +234,34 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    # JSON compact encodé et décodé par orjson s'il est installé (sinon par le module json) ;
+    # les classes `rest_framework.renderers.JSONRenderer` / `parsers.JSONParser` restent utilisables
+    'DEFAULT_RENDERER_CLASSES': [
+        'users.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'users.renderers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Cache des utilisateurs résolus par l'authentification JWT (taille maximale, durée en secondes)
+SPOTYNOV_USER_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 60,
 }
 
+# Cache des profils musicaux calculés par utilisateur (taille maximale, durée en secondes)
+SPOTYNOV_PERSONALITY_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 3600,
+}
+
+# Nombre maximum de membres dont l'historique est collecté simultanément (profil de groupe)
+SPOTYNOV_GROUP_BATCH_SIZE = 50
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
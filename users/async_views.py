@@ -0,0 +1,337 @@
+import asyncio
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import authenticate_request
+from .models import UserManager, GroupManager
+from .playback import DEFAULT_SYNC_CONCURRENCY
+from .spotify import get_async_spotify_client, AsyncRequestError, spotify_token_url
+from .tokens import token_manager
+from .ratelimit import BACKGROUND
+from .personality import (
+    PERSONALITY_CACHE, CACHE_STATUS_HEADER, UpstreamError, afetch_history, analyse_history, cached_etags,
+    update_cache,
+)
+from .utils import save_spotify_token
+from .serialization import loads
+from .signals import playback_changed
+from .events import get_channel, discard_channel, stream_group_events
+from .views import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_REDIRECT_URI
+
+
+def read_json(request):
+    """
+    Retourne le corps JSON (ou de formulaire) d'une requête sous forme de dictionnaire.
+    """
+    if request.content_type == "application/json":
+        try:
+            data = loads(request.body or b"{}")
+        except ValueError:
+            return {}
+        return data if isinstance(data, dict) else {}
+    return request.POST.dict()
+
+
+async def async_spotify_callback(request):
+    """
+    Version asynchrone de `spotify_callback`.
+
+    L'échange du code d'autorisation contre les tokens se fait avec le client Spotify
+    asynchrone : le worker ASGI reste disponible pendant l'attente de Spotify.
+
+    **Méthode HTTP** : GET
+
+    **Paramètres** (dans l'URL) :
+    - `code` (str) : Code d'autorisation fourni par Spotify après authentification.
+    - `state` (str) : Nom d'utilisateur de l'application associé à l'authentification.
+
+    **Réponses possibles** :
+    - 200 : Succès, les tokens sont enregistrés.
+    - 400 : Erreur si `code` ou `state` est manquant ou si l'échange de token échoue.
+    - 502 : Erreur si Spotify est injoignable.
+    """
+    code = request.GET.get("code")
+    username = request.GET.get("state")
+
+    if not code:
+        return JsonResponse({"error": "Code manquant"}, status=400)
+    if not username:
+        return JsonResponse({"error": "Nom d'utilisateur manquant"}, status=400)
+
+    data = {
+        "grant_type": "authorization_code",
+        "code": code,
+        "redirect_uri": SPOTIFY_REDIRECT_URI,
+        "client_id": SPOTIFY_CLIENT_ID,
+        "client_secret": SPOTIFY_CLIENT_SECRET,
+    }
+
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    try:
+        response = await get_async_spotify_client().post(spotify_token_url(), data=data, headers=headers)
+        token_info = response.json()
+    except (AsyncRequestError, ValueError):
+        return JsonResponse({"error": "Spotify est injoignable"}, status=502)
+
+    if "access_token" not in token_info:
+        return JsonResponse({"error": "Échec de récupération du token", "details": token_info}, status=400)
+
+    await sync_to_async(save_spotify_token)(
+        username, token_info["access_token"], token_info["refresh_token"], token_info.get("expires_in")
+    )
+
+    return JsonResponse({
+        "message": "Spotify connecté avec succès !",
+        "user": username,
+        "tokens": {
+            "access_token": token_info["access_token"],
+            "refresh_token": token_info["refresh_token"]
+        }
+    })
+
+
+class AsyncLoginView(View):
+    """
+    Version asynchrone de `LoginView`.
+
+    **Méthode HTTP** : POST
+
+    **Paramètres** (dans le corps de la requête) :
+    - `username` (str) : Nom d'utilisateur enregistré.
+    - `password` (str) : Mot de passe associé au compte.
+
+    **Réponses possibles** :
+    - 200 : Succès, retourne les tokens d'accès et de rafraîchissement.
+    - 401 : Échec d'authentification si les identifiants sont incorrects.
+    """
+    async def post(self, request):
+        data = read_json(request)
+        username = data.get("username")
+        password = data.get("password")
+
+        if not username or not password:
+            return JsonResponse({"error": "Identifiants incorrects"}, status=401)
+
+        user = await sync_to_async(UserManager.authenticate_user)(username, password)
+        if user is None:
+            return JsonResponse({"error": "Identifiants incorrects"}, status=401)
+
+        refresh = RefreshToken()
+        refresh["username"] = username
+
+        return JsonResponse({
+            "message": "Connexion réussie.",
+            "access_token": str(refresh.access_token),
+            "refresh_token": str(refresh)
+        })
+
+
+class AsyncUserPersonalityView(View):
+    """
+    Version asynchrone de `UserPersonalityView`, partageant son cache (`PERSONALITY_CACHE`).
+
+    **Méthode HTTP** : GET
+
+    **Paramètres** :
+    - `username` (str) : Nom d'utilisateur dont on souhaite analyser le style musical.
+    - `Authorization` (en-tête) : Token JWT de l'utilisateur `username` (`Bearer ...`), ou token
+      d'accès Spotify, utilisé sans passer par le cache.
+
+    **Réponses possibles** :
+    - 200 : Succès, retourne l'analyse du style musical.
+    - 401 : Erreur si la requête n'est ni authentifiée ni accompagnée d'un token Spotify, si le
+      token JWT est invalide, ou si l'utilisateur n'a pas lié son compte Spotify.
+    - 403 : Erreur si la requête est authentifiée en tant qu'un autre utilisateur.
+    - 400 : Erreur si la récupération des titres likés échoue.
+    - 502 : Erreur si Spotify est injoignable.
+    """
+    async def get(self, request, username):
+        try:
+            authenticated = await sync_to_async(authenticate_request)(request)
+        except AuthenticationFailed:
+            return JsonResponse({"error": "Token invalide"}, status=401)
+
+        client = get_async_spotify_client()
+        token = request.headers.get("Authorization") if authenticated is None else None
+        entry = None
+
+        if token:
+            async def get(path, params, headers):
+                return await client.get(path, token, params=params, headers=headers, priority=BACKGROUND)
+        else:
+            if authenticated is None:
+                return JsonResponse({"error": "Authentification requise"}, status=401)
+            if authenticated[0].username != username:
+                return JsonResponse({"error": "Accès refusé"}, status=403)
+
+            entry, fresh = PERSONALITY_CACHE.lookup(username)
+            if fresh:
+                return JsonResponse(entry["profile"], headers={CACHE_STATUS_HEADER: "HIT"})
+
+            async def get(path, params, headers):
+                return await token_manager.acall(username, lambda token: client.get(
+                    path, token, params=params, headers=headers, priority=BACKGROUND
+                ))
+
+        try:
+            history = await afetch_history(get, cached_etags(entry))
+        except AsyncRequestError:
+            return JsonResponse({"error": "Spotify est injoignable"}, status=502)
+        except UpstreamError as error:
+            if error.response is None:
+                return JsonResponse({"error": "Token Spotify manquant"}, status=401)
+            return JsonResponse({"error": "Impossible de récupérer les titres likés"}, status=400)
+
+        if token:
+            profile = await sync_to_async(analyse_history)(username, history)
+            return JsonResponse(profile, headers={CACHE_STATUS_HEADER: "BYPASS"})
+
+        entry, cache_status = await sync_to_async(update_cache)(username, entry, history)
+        return JsonResponse(entry["profile"], headers={CACHE_STATUS_HEADER: cache_status})
+
+
+async def async_play_for_member(client, semaphore, member, track_uri, position_ms):
+    """
+    Équivalent asynchrone de `playback.play_for_member`, borné par `semaphore`.
+    """
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            response = await token_manager.acall(member, lambda token: client.put(
+                "/me/player/play", token, json={"uris": [track_uri], "position_ms": position_ms}
+            ))
+            if response is None:
+                return {"member": member, "status": "no_token", "status_code": None, "latency_ms": 0.0}
+            status_code = response.status_code
+            result = "synced" if status_code < 300 else "error"
+        except AsyncRequestError:
+            status_code = None
+            result = "error"
+
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+    return {"member": member, "status": result, "status_code": status_code, "latency_ms": latency_ms}
+
+
+class AsyncSyncPlaybackView(View):
+    """
+    Version asynchrone de `SyncPlaybackView`.
+
+    Les commandes de lecture des membres sont lancées simultanément sur la boucle
+    d'événements, au plus `SPOTIFY_SYNC_CONCURRENCY` à la fois.
+
+    **Méthode HTTP** : POST
+
+    **Paramètres** :
+    - `group_name` (str) : Nom du groupe dont la lecture doit être synchronisée.
+    - `Authorization` (en-tête) : Token JWT de l'administrateur du groupe (`Bearer ...`).
+
+    **Réponses possibles** :
+    - 200 : Succès, retourne le résultat et la latence de la synchronisation de chaque membre.
+    - 400 : Erreur si le nom du groupe ou le token Spotify de l'administrateur est manquant, ou
+      si la lecture est introuvable.
+    - 401 : Erreur si la requête n'est pas authentifiée ou si le token JWT est invalide.
+    - 403 : Erreur si la requête est authentifiée en tant qu'un autre utilisateur que l'administrateur.
+    - 404 : Erreur si le groupe n'existe pas.
+    - 502 : Erreur si Spotify est injoignable.
+    """
+    async def post(self, request):
+        group_name = read_json(request).get("group_name")
+
+        if not group_name:
+            return JsonResponse({"error": "Token ou nom du groupe manquant"}, status=400)
+        try:
+            authenticated = await sync_to_async(authenticate_request)(request)
+        except AuthenticationFailed:
+            return JsonResponse({"error": "Token invalide"}, status=401)
+        if authenticated is None:
+            return JsonResponse({"error": "Authentification requise"}, status=401)
+
+        group = await sync_to_async(GroupManager.get_group)(group_name)
+        if group is None:
+            return JsonResponse({"error": "Groupe introuvable"}, status=404)
+        if authenticated[0].username != group.get("admin"):
+            return JsonResponse({"error": "Accès refusé"}, status=403)
+
+        client = get_async_spotify_client()
+        try:
+            playback = await token_manager.acall(group["admin"], lambda token: client.get("/me/player", token))
+        except AsyncRequestError:
+            return JsonResponse({"error": "Spotify est injoignable"}, status=502)
+
+        if playback is None:
+            return JsonResponse({"error": "Token ou nom du groupe manquant"}, status=400)
+        if playback.status_code != 200:
+            return JsonResponse({"error": "Impossible de récupérer la lecture en cours"}, status=400)
+
+        track_info = playback.json()
+        if not track_info.get("is_playing"):
+            return JsonResponse({"message": "Aucune lecture en cours"})
+
+        track_uri = track_info["item"]["uri"]
+        position_ms = track_info["progress_ms"]
+
+        start = time.perf_counter()
+        members = [member for member in group["members"] if member != group.get("admin")]
+
+        semaphore = asyncio.Semaphore(getattr(settings, "SPOTIFY_SYNC_CONCURRENCY", DEFAULT_SYNC_CONCURRENCY))
+        results = await asyncio.gather(*(
+            async_play_for_member(client, semaphore, member, track_uri, position_ms)
+            for member in members
+        ))
+        playback_changed.send(sender=AsyncSyncPlaybackView, group_name=group_name, playback={
+            "is_playing": True, "track_uri": track_uri, "position_ms": position_ms,
+        })
+
+        return JsonResponse({
+            "message": "Lecture synchronisée",
+            "track_uri": track_uri,
+            "position_ms": position_ms,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            "results": results,
+        })
+
+
+class GroupEventsView(View):
+    """
+    Flux des événements d'un groupe (Server-Sent Events), à la place de l'interrogation
+    répétée de `GroupUsersView` et de `groups/sync/`.
+
+    Le flux commence par un événement `state` (membres, administrateur, dernière lecture
+    connue), puis transmet `member_joined`, `member_left`, `playback` et `group_deleted`.
+    Chaque événement porte un identifiant : un client `EventSource` qui se reconnecte
+    reçoit les événements manqués (en-tête `Last-Event-ID`), ou un nouvel état complet s'ils
+    ne sont plus disponibles. Les événements sont diffusés aux abonnés du worker qui les
+    produit (voir `events.GroupChannel`).
+
+    **Méthode HTTP** : GET
+
+    **Paramètres** :
+    - `group_name` (str) : Nom du groupe à suivre.
+    - `Last-Event-ID` (en-tête, optionnel) : Identifiant du dernier événement reçu.
+
+    **Réponses possibles** :
+    - 200 : Succès, flux `text/event-stream`.
+    - 404 : Erreur si le groupe n'existe pas.
+    """
+    async def get(self, request, group_name):
+        channel = get_channel(group_name)
+        load_group = sync_to_async(GroupManager.get_group)
+        if channel.group is None and await load_group(group_name) is None:
+            if not channel.subscribers:
+                discard_channel(group_name, channel)
+            return JsonResponse({"error": "Groupe introuvable"}, status=404)
+
+        try:
+            last_event_id = int(request.headers["Last-Event-ID"])
+        except (KeyError, ValueError):
+            last_event_id = None
+
+        events = stream_group_events(channel, lambda: load_group(group_name), last_event_id)
+        return StreamingHttpResponse(events, content_type="text/event-stream", headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        })
@@ -1,6 +1,20 @@
+from django.conf import settings
+from django.dispatch import receiver
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from .cache import TTLCache
+from .metrics import phase
 from .models import UserManager
+from .signals import user_created, user_deleted
+
+USER_CACHE_SETTINGS = getattr(settings, "SPOTYNOV_USER_CACHE", {})
+
+# Utilisateurs déjà résolus, par nom d'utilisateur
+USER_CACHE = TTLCache(
+    max_size=USER_CACHE_SETTINGS.get("MAX_SIZE", 10000),
+    ttl=USER_CACHE_SETTINGS.get("TTL", 60),
+    name="users",
+)
 
 class CustomUser:
     """
@@ -26,26 +40,61 @@ class CustomJWTAuthentication(JWTAuthentication):
     Cette classe surcharge l'authentification JWT pour récupérer les utilisateurs depuis un fichier JSON 
     au lieu d'une base de données.
     
+    Les utilisateurs résolus sont conservés dans `USER_CACHE` (LRU borné, avec expiration) :
+    une requête authentifiée ne consulte le stockage que si l'utilisateur n'y est pas encore.
+    Une entrée est invalidée dès que l'utilisateur est créé ou supprimé.
+    
+    La durée de l'authentification (décodage du token compris) est mesurée dans la phase
+    `jwt` de la requête.
+    
     **Méthodes** :
+    - `authenticate(request)`: Authentifie la requête à partir de l'en-tête `Authorization`.
     - `get_user(validated_token)`: Vérifie et retourne l'utilisateur authentifié basé sur le token JWT.
     
     **Processus** :
     1. Extrait le nom d'utilisateur du token JWT validé.
-    2. Vérifie si l'utilisateur existe dans le système d'authentification.
-    3. Retourne une instance de `CustomUser` si l'utilisateur est valide.
+    2. Cherche l'utilisateur dans `USER_CACHE`.
+    3. Sinon, vérifie si l'utilisateur existe dans le stockage et le met en cache.
+    4. Retourne une instance de `CustomUser` si l'utilisateur est valide.
     
     **Exceptions** :
     - `AuthenticationFailed` : Si l'utilisateur n'existe pas ou est invalide.
     """
+    def authenticate(self, request):
+        with phase("jwt"):
+            return super().authenticate(request)
+
     def get_user(self, validated_token):
         username = validated_token.get("username", None)
 
         if not username:
             raise AuthenticationFailed({"detail": "Utilisateur non trouvé", "code": "user_not_found"})
 
-        user = UserManager.authenticate_user(username, None)
+        user = USER_CACHE.get(username)
+        if user is not None:
+            return user
 
-        if user is None:
+        if not UserManager.user_exists(username):
             raise AuthenticationFailed({"detail": "Utilisateur non trouvé", "code": "user_not_found"})
 
-        return CustomUser(username)
+        user = CustomUser(username)
+        USER_CACHE.set(username, user)
+        return user
+
+
+def authenticate_request(request):
+    """
+    Authentifie une requête Django hors DRF (vues asynchrones) avec `CustomJWTAuthentication`.
+    
+    **Retour** :
+    - `(utilisateur, token)`, ou `None` si l'en-tête `Authorization` ne porte pas de token JWT.
+    
+    **Exceptions** :
+    - `AuthenticationFailed` : Si le token JWT est invalide ou l'utilisateur inexistant.
+    """
+    return CustomJWTAuthentication().authenticate(request)
+
+
+@receiver([user_created, user_deleted])
+def invalidate_cached_user(sender, username, **kwargs):
+    USER_CACHE.invalidate(username)
@@ -0,0 +1,536 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from .serialization import dumps, loads
+from .store import CHANGE_LOG_SIZE, JSONStore, GroupStore
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+USERS_FILE = os.path.join(BASE_DIR, "users.json")
+GROUPS_FILE = "groups.json"
+
+DEFAULT_BACKEND = "users.backends.JSONBackend"
+
+
+class BaseBackend:
+    """
+    Interface commune des moteurs de stockage des utilisateurs et des groupes.
+
+    `UserManager` et `GroupManager` ne manipulent les données qu'au travers de ces méthodes.
+    Le moteur utilisé est choisi par le réglage `SPOTYNOV_STORAGE` (voir `get_storage()`).
+
+    Les enregistrements échangés ont la même forme que dans les fichiers JSON historiques :
+    - utilisateur : `{"password": ..., "spotify_access_token": ..., ...}`
+    - groupe : `{"members": [...], "admin": ...}`
+
+    **Méthodes** :
+    - `atomic()`: Contexte dans lequel une suite de lectures et d'écritures est exclusive.
+    - `batch()`: Comme `atomic()`, en persistant toutes les écritures en une seule fois.
+    - `load_users()` / `save_users(users)`: Lit ou remplace tous les utilisateurs.
+    - `get_user(username)` / `put_user(username, user)`: Lit ou enregistre un utilisateur.
+    - `delete_user(username)`: Supprime un utilisateur.
+    - `load_groups()` / `save_groups(groups)`: Lit ou remplace tous les groupes.
+    - `get_group(group_name)` / `put_group(group_name, group)`: Lit ou enregistre un groupe.
+    - `delete_group(group_name)`: Supprime un groupe.
+    - `get_user_group(username)`: Retourne le groupe d'un utilisateur, ou `None`.
+    - `is_member(group_name, username)`: Vérifie l'appartenance d'un utilisateur à un groupe.
+    - `group_page(prefix, after, count)`: Retourne des groupes consécutifs dans l'ordre des noms.
+    - `iter_groups(prefix, after, limit)`: Parcourt les groupes dans l'ordre des noms, page par page.
+    - `users_version()` / `user_version(username)`: Version des utilisateurs ou d'un utilisateur.
+    - `groups_version()` / `group_version(group_name)`: Version des groupes ou d'un groupe.
+    - `group_changes(since, count)`: Retourne les modifications de groupes postérieures à une version.
+
+    Une version est un couple `(numéro, date de modification)`. Le numéro augmente à chaque
+    écriture de la collection ou de l'enregistrement (suppression comprise) ; il est lu sans
+    charger l'enregistrement, pour répondre aux requêtes conditionnelles (`ETag`).
+    """
+    # Nombre de groupes lus à chaque appel de `group_page` par `iter_groups`
+    iter_chunk_size = 500
+
+    def atomic(self):
+        raise NotImplementedError
+
+    def batch(self):
+        return self.atomic()
+
+    def load_users(self):
+        raise NotImplementedError
+
+    def save_users(self, users):
+        raise NotImplementedError
+
+    def get_user(self, username):
+        raise NotImplementedError
+
+    def put_user(self, username, user):
+        raise NotImplementedError
+
+    def delete_user(self, username):
+        raise NotImplementedError
+
+    def load_groups(self):
+        raise NotImplementedError
+
+    def save_groups(self, groups):
+        raise NotImplementedError
+
+    def get_group(self, group_name):
+        raise NotImplementedError
+
+    def put_group(self, group_name, group):
+        raise NotImplementedError
+
+    def delete_group(self, group_name):
+        raise NotImplementedError
+
+    def get_user_group(self, username):
+        raise NotImplementedError
+
+    def is_member(self, group_name, username):
+        raise NotImplementedError
+
+    def group_page(self, prefix, after, count):
+        raise NotImplementedError
+
+    def users_version(self):
+        raise NotImplementedError
+
+    def user_version(self, username):
+        raise NotImplementedError
+
+    def groups_version(self):
+        raise NotImplementedError
+
+    def group_version(self, group_name):
+        raise NotImplementedError
+
+    def group_changes(self, since, count):
+        """
+        Retourne au plus `count` modifications de groupes postérieures à la version `since`
+        des groupes, sous forme de tuples `(version, op, nom, groupe)` (`op` vaut `put` ou
+        `del`, `groupe` vaut `None` pour une suppression), ou `None` si le journal borné des
+        modifications ne remonte plus jusqu'à `since`.
+        """
+        raise NotImplementedError
+
+    def iter_groups(self, prefix="", after=None, limit=None):
+        """
+        Génère au plus `limit` paires `(nom, groupe)` dont le nom commence par `prefix` et
+        suit `after` (exclu), dans l'ordre des noms.
+
+        Les groupes sont lus par pages d'au plus `iter_chunk_size` : seule la page en cours
+        est en mémoire, et aucun verrou n'est tenu entre deux pages.
+        """
+        while limit is None or limit > 0:
+            count = self.iter_chunk_size if limit is None else min(limit, self.iter_chunk_size)
+            page = self.group_page(prefix, after, count)
+            yield from page
+            if len(page) < count:
+                return
+            after = page[-1][0]
+            if limit is not None:
+                limit -= count
+
+
+class JSONBackend(BaseBackend):
+    """
+    Stockage dans `users.json` et `groups.json` (comportement historique).
+
+    Les deux fichiers sont servis par des copies résidentes journalisées (`JSONStore`,
+    `GroupStore`).
+
+    **Options** :
+    - `users_file` (str) : Chemin du fichier des utilisateurs.
+    - `groups_file` (str) : Chemin du fichier des groupes.
+    - `change_log_size` (int) : Nombre de modifications de groupes conservées pour le flux
+      des changements.
+    """
+    def __init__(self, users_file=USERS_FILE, groups_file=GROUPS_FILE, change_log_size=CHANGE_LOG_SIZE):
+        self.users = JSONStore(str(users_file))
+        self.groups = GroupStore(str(groups_file), change_log_size=change_log_size)
+
+    @contextmanager
+    def atomic(self):
+        with self.users.transaction(), self.groups.transaction():
+            yield
+
+    @contextmanager
+    def batch(self):
+        with self.users.batch(), self.groups.batch():
+            yield
+
+    def load_users(self):
+        return self.users.data
+
+    def save_users(self, users):
+        self.users.replace(users)
+
+    def get_user(self, username):
+        return self.users.get(username)
+
+    def put_user(self, username, user):
+        self.users.put(username, user)
+
+    def delete_user(self, username):
+        self.users.delete(username)
+
+    def load_groups(self):
+        return self.groups.data
+
+    def save_groups(self, groups):
+        self.groups.replace(groups)
+
+    def get_group(self, group_name):
+        return self.groups.get(group_name)
+
+    def put_group(self, group_name, group):
+        self.groups.put(group_name, group)
+
+    def delete_group(self, group_name):
+        self.groups.delete(group_name)
+
+    def get_user_group(self, username):
+        return self.groups.group_of(username)
+
+    def is_member(self, group_name, username):
+        return self.groups.is_member(group_name, username)
+
+    def group_page(self, prefix, after, count):
+        return self.groups.page(prefix, after, count)
+
+    def users_version(self):
+        return self.users.version()
+
+    def user_version(self, username):
+        return self.users.version(username)
+
+    def groups_version(self):
+        return self.groups.version()
+
+    def group_version(self, group_name):
+        return self.groups.version(group_name)
+
+    def group_changes(self, since, count):
+        return self.groups.changes_since(since, count)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spotynov_users (
+    username TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS spotynov_groups (
+    name TEXT PRIMARY KEY,
+    admin TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS spotynov_members (
+    group_name TEXT NOT NULL REFERENCES spotynov_groups (name) ON DELETE CASCADE,
+    username TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (group_name, username)
+);
+CREATE INDEX IF NOT EXISTS spotynov_members_username ON spotynov_members (username);
+CREATE TABLE IF NOT EXISTS spotynov_versions (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    modified REAL NOT NULL,
+    PRIMARY KEY (scope, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS spotynov_group_changes (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    data TEXT
+);
+"""
+
+# Requêtes paramétrées : préparées une fois puis réutilisées par le cache de chaque connexion
+SELECT_USER = "SELECT data FROM spotynov_users WHERE username = ?"
+SELECT_USERS = "SELECT username, data FROM spotynov_users"
+UPSERT_USER = (
+    "INSERT INTO spotynov_users (username, data) VALUES (?, ?) "
+    "ON CONFLICT (username) DO UPDATE SET data = excluded.data"
+)
+DELETE_USER = "DELETE FROM spotynov_users WHERE username = ?"
+DELETE_USERS = "DELETE FROM spotynov_users"
+SELECT_GROUP = "SELECT admin FROM spotynov_groups WHERE name = ?"
+SELECT_GROUPS = "SELECT name, admin FROM spotynov_groups"
+UPSERT_GROUP = (
+    "INSERT INTO spotynov_groups (name, admin) VALUES (?, ?) "
+    "ON CONFLICT (name) DO UPDATE SET admin = excluded.admin"
+)
+DELETE_GROUP = "DELETE FROM spotynov_groups WHERE name = ?"
+DELETE_GROUPS = "DELETE FROM spotynov_groups"
+SELECT_GROUP_MEMBERS = "SELECT username FROM spotynov_members WHERE group_name = ? ORDER BY position"
+SELECT_MEMBERS = "SELECT group_name, username FROM spotynov_members ORDER BY group_name, position"
+SELECT_USER_GROUP = "SELECT group_name FROM spotynov_members WHERE username = ? ORDER BY rowid LIMIT 1"
+SELECT_MEMBERSHIP = "SELECT 1 FROM spotynov_members WHERE group_name = ? AND username = ?"
+SELECT_GROUP_PAGE = (
+    "SELECT name, admin FROM spotynov_groups "
+    "WHERE name >= ? AND name > ? AND (? IS NULL OR name < ?) ORDER BY name LIMIT ?"
+)
+SELECT_MEMBERS_RANGE = (
+    "SELECT group_name, username FROM spotynov_members "
+    "WHERE group_name BETWEEN ? AND ? ORDER BY group_name, position"
+)
+BUMP_VERSION = (
+    "INSERT INTO spotynov_versions (scope, key, version, modified) VALUES (?, '', 1, ?) "
+    "ON CONFLICT (scope, key) DO UPDATE SET version = version + 1, modified = excluded.modified "
+    "RETURNING version"
+)
+UPSERT_VERSION = (
+    "INSERT INTO spotynov_versions (scope, key, version, modified) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (scope, key) DO UPDATE SET version = excluded.version, modified = excluded.modified"
+)
+SELECT_VERSION = "SELECT version, modified FROM spotynov_versions WHERE scope = ? AND key = ?"
+INSERT_CHANGE = "INSERT INTO spotynov_group_changes (version, name, data) VALUES (?, ?, ?)"
+PRUNE_CHANGES = "DELETE FROM spotynov_group_changes WHERE version <= ?"
+SELECT_CHANGES = "SELECT version, name, data FROM spotynov_group_changes WHERE version > ? ORDER BY version LIMIT ?"
+SELECT_OLDEST_CHANGE = "SELECT MIN(version) FROM spotynov_group_changes"
+INSERT_MEMBER = "INSERT INTO spotynov_members (group_name, username, position) VALUES (?, ?, ?)"
+DELETE_GROUP_MEMBERS = "DELETE FROM spotynov_members WHERE group_name = ?"
+
+
+class SQLiteBackend(BaseBackend):
+    """
+    Stockage dans une base SQLite indexée.
+
+    Les utilisateurs sont indexés par nom, les groupes par nom, et les appartenances par
+    groupe (clé primaire) et par utilisateur (index secondaire) : toutes les recherches des
+    gestionnaires sont des accès indexés, quel que soit le nombre de lignes.
+
+    Chaque thread possède sa propre connexion, ouverte en mode WAL pour que les lectures ne
+    soient pas bloquées par un écrivain. Les écritures d'une même opération sont regroupées
+    dans une transaction `BEGIN IMMEDIATE` par `atomic()`.
+
+    Les versions sont tenues dans `spotynov_versions` : une ligne par collection (clé vide),
+    dont le compteur est incrémenté à chaque écriture, et une ligne par enregistrement
+    modifié, qui reçoit la nouvelle valeur du compteur. Un enregistrement sans ligne (écrit
+    avant l'apparition de la table) prend la version de sa collection.
+
+    Chaque écriture d'un groupe ajoute aussi une ligne à `spotynov_group_changes`, numérotée
+    par la nouvelle version des groupes ; les lignes au-delà des `change_log_size` dernières
+    sont supprimées dans la même transaction.
+
+    **Options** :
+    - `name` (str) : Chemin de la base ; par défaut celle de `DATABASES["default"]`.
+    - `timeout` (float) : Attente maximale (en secondes) d'un verrou d'écriture.
+    - `change_log_size` (int) : Nombre de modifications de groupes conservées pour le flux
+      des changements.
+    """
+    def __init__(self, name=None, timeout=5.0, change_log_size=CHANGE_LOG_SIZE):
+        self.name = str(name or settings.DATABASES["default"]["NAME"])
+        self.timeout = timeout
+        self.change_log_size = change_log_size
+        self._local = threading.local()
+        self.connection.executescript(SCHEMA)
+
+    @property
+    def connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.name, timeout=self.timeout, isolation_level=None, cached_statements=256,
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("PRAGMA foreign_keys = ON")
+            self._local.connection = connection
+            self._local.depth = 0
+        return connection
+
+    @contextmanager
+    def atomic(self):
+        connection = self.connection
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        connection.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        else:
+            connection.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def _bump(self, collection, scope, keys):
+        """Incrémente la version de `collection` et l'attribue aux clés `keys` de `scope`."""
+        now = time.time()
+        with self.atomic():
+            version = self.connection.execute(BUMP_VERSION, (collection, now)).fetchone()[0]
+            self.connection.executemany(UPSERT_VERSION, ((scope, key, version, now) for key in keys))
+        return version
+
+    def _log_change(self, version, group_name, group):
+        self.connection.execute(INSERT_CHANGE, (version, group_name, None if group is None else dumps(group).decode()))
+        self.connection.execute(PRUNE_CHANGES, (version - self.change_log_size,))
+
+    def _version(self, collection, scope=None, key=None):
+        row = None
+        if scope is not None:
+            row = self.connection.execute(SELECT_VERSION, (scope, key)).fetchone()
+        if row is None:
+            row = self.connection.execute(SELECT_VERSION, (collection, "")).fetchone()
+        return tuple(row) if row else (0, None)
+
+    def load_users(self):
+        return {username: loads(data) for username, data in self.connection.execute(SELECT_USERS)}
+
+    def save_users(self, users):
+        with self.atomic():
+            self.connection.execute(DELETE_USERS)
+            self.connection.executemany(
+                UPSERT_USER, ((username, dumps(user).decode()) for username, user in users.items())
+            )
+            self.connection.execute("DELETE FROM spotynov_versions WHERE scope = 'user'")
+            self._bump("users", "user", ())
+
+    def get_user(self, username):
+        row = self.connection.execute(SELECT_USER, (username,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def put_user(self, username, user):
+        with self.atomic():
+            self.connection.execute(UPSERT_USER, (username, dumps(user).decode()))
+            self._bump("users", "user", (username,))
+
+    def delete_user(self, username):
+        with self.atomic():
+            self.connection.execute(DELETE_USER, (username,))
+            self._bump("users", "user", (username,))
+
+    def _group(self, admin, members):
+        group = {"members": members}
+        if admin is not None:
+            group["admin"] = admin
+        return group
+
+    def load_groups(self):
+        with self.atomic():
+            members = {}
+            for group_name, username in self.connection.execute(SELECT_MEMBERS):
+                members.setdefault(group_name, []).append(username)
+            return {
+                group_name: self._group(admin, members.get(group_name, []))
+                for group_name, admin in self.connection.execute(SELECT_GROUPS)
+            }
+
+    def save_groups(self, groups):
+        with self.atomic():
+            self.connection.execute(DELETE_GROUPS)
+            for group_name, group in groups.items():
+                self.put_group(group_name, group)
+            self.connection.execute("DELETE FROM spotynov_versions WHERE scope = 'group'")
+            self.connection.execute("DELETE FROM spotynov_group_changes")
+            self._bump("groups", "group", ())
+
+    def get_group(self, group_name):
+        row = self.connection.execute(SELECT_GROUP, (group_name,)).fetchone()
+        if row is None:
+            return None
+        members = [username for (username,) in self.connection.execute(SELECT_GROUP_MEMBERS, (group_name,))]
+        return self._group(row[0], members)
+
+    def put_group(self, group_name, group):
+        with self.atomic():
+            self.connection.execute(UPSERT_GROUP, (group_name, group.get("admin")))
+            self.connection.execute(DELETE_GROUP_MEMBERS, (group_name,))
+            self.connection.executemany(
+                INSERT_MEMBER,
+                ((group_name, username, position) for position, username in enumerate(group.get("members", []))),
+            )
+            version = self._bump("groups", "group", (group_name,))
+            self._log_change(version, group_name, self._group(group.get("admin"), list(group.get("members", []))))
+
+    def delete_group(self, group_name):
+        with self.atomic():
+            self.connection.execute(DELETE_GROUP, (group_name,))
+            self._log_change(self._bump("groups", "group", (group_name,)), group_name, None)
+
+    def get_user_group(self, username):
+        row = self.connection.execute(SELECT_USER_GROUP, (username,)).fetchone()
+        return row[0] if row else None
+
+    def is_member(self, group_name, username):
+        return self.connection.execute(SELECT_MEMBERSHIP, (group_name, username)).fetchone() is not None
+
+    def group_page(self, prefix, after, count):
+        # Borne supérieure des noms commençant par `prefix` (le préfixe dont le dernier
+        # caractère est incrémenté) : la recherche reste un parcours d'index par plage
+        end = prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else None
+        with self.atomic():
+            rows = self.connection.execute(SELECT_GROUP_PAGE, (prefix, after or "", end, end, count)).fetchall()
+            if not rows:
+                return []
+            members = {}
+            for group_name, username in self.connection.execute(SELECT_MEMBERS_RANGE, (rows[0][0], rows[-1][0])):
+                members.setdefault(group_name, []).append(username)
+        return [(group_name, self._group(admin, members.get(group_name, []))) for group_name, admin in rows]
+
+    def users_version(self):
+        return self._version("users")
+
+    def user_version(self, username):
+        return self._version("users", "user", username)
+
+    def groups_version(self):
+        return self._version("groups")
+
+    def group_version(self, group_name):
+        return self._version("groups", "group", group_name)
+
+    def group_changes(self, since, count):
+        with self.atomic():
+            current = self._version("groups")[0]
+            oldest = self.connection.execute(SELECT_OLDEST_CHANGE).fetchone()[0]
+            # Les modifications disponibles sont celles qui suivent la version `floor`
+            floor = current if oldest is None else oldest - 1
+            if since > current or since < floor:
+                return None
+            rows = self.connection.execute(SELECT_CHANGES, (since, count)).fetchall()
+        return [
+            (version, "del" if data is None else "put", group_name, None if data is None else loads(data))
+            for version, group_name, data in rows
+        ]
+
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """
+    Retourne le moteur de stockage configuré, instancié une seule fois par processus.
+
+    Le réglage `SPOTYNOV_STORAGE` indique le chemin de la classe (`BACKEND`) et ses
+    arguments (`OPTIONS`) ; à défaut, les fichiers JSON historiques sont utilisés.
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                config = getattr(settings, "SPOTYNOV_STORAGE", {})
+                backend_class = import_string(config.get("BACKEND", DEFAULT_BACKEND))
+                _storage = backend_class(**config.get("OPTIONS", {}))
+    return _storage
+
+
+@receiver(setting_changed)
+def reset_storage(setting, **kwargs):
+    global _storage
+    if setting == "SPOTYNOV_STORAGE":
+        _storage = None
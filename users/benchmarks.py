@@ -0,0 +1,193 @@
+import contextlib
+import io
+import random
+import time
+import tracemalloc
+from .backends import get_storage
+from .loadtest import LOADTEST_PASSWORD, seed_storage
+from .models import UserManager, GroupManager
+from .utils import save_spotify_token
+
+# Nombre de membres des groupes créés pour les mesures ; un utilisateur sur deux n'a pas de groupe
+BENCHMARK_GROUP_SIZE = 5
+
+# Écarts absolus en deçà desquels une mesure n'est jamais une régression (bruit de mesure)
+TIME_SLACK_US = 5.0
+MEMORY_SLACK_KIB = 16.0
+
+
+def _random_users(context, count):
+    return [f"loadtest-user-{context['rng'].randrange(context['users'])}" for _ in range(count)]
+
+
+def _random_groups(context, count):
+    return [f"loadtest-group-{context['rng'].randrange(context['groups'])}" for _ in range(count)]
+
+
+def _free_users(context, count):
+    return context["free_users"][:count]
+
+
+def _prepare_create_user(context, count):
+    return [(f"benchmark-user-{index}", LOADTEST_PASSWORD) for index in range(count)]
+
+
+def _cleanup_create_user(calls):
+    for username, _ in calls:
+        UserManager.delete_user(username)
+
+
+def _prepare_authenticate_user(context, count):
+    return [(username, LOADTEST_PASSWORD) for username in _random_users(context, count)]
+
+
+def _prepare_lookup(context, count):
+    return [(username,) for username in _random_users(context, count)]
+
+
+def _prepare_get_group(context, count):
+    return [(group_name,) for group_name in _random_groups(context, count)]
+
+
+def _prepare_create_group(context, count):
+    return [(f"benchmark-group-{index}", username) for index, username in enumerate(_free_users(context, count))]
+
+
+def _cleanup_create_group(calls):
+    for _, username in calls:
+        GroupManager.leave_group(username)
+
+
+def _prepare_join_group(context, count):
+    return list(zip(_random_groups(context, count), _free_users(context, count)))
+
+
+def _cleanup_join_group(calls):
+    for _, username in calls:
+        GroupManager.leave_group(username)
+
+
+def _prepare_leave_group(context, count):
+    calls = []
+    for group_name, username in zip(_random_groups(context, count), _free_users(context, count)):
+        GroupManager.join_group(group_name, username)
+        calls.append((username,))
+    return calls
+
+
+def _prepare_save_spotify_token(context, count):
+    return [
+        (username, f"access-{username}", f"refresh-{username}", 3600) for username in _random_users(context, count)
+    ]
+
+
+# Fonctions mesurées : fonction appelée, préparation des appels (non mesurée) et remise
+# en état du stockage après les appels (non mesurée)
+BENCHMARKS = {
+    "create_user": (UserManager.create_user, _prepare_create_user, _cleanup_create_user),
+    "user_exists": (UserManager.user_exists, _prepare_lookup, None),
+    "authenticate_user": (UserManager.authenticate_user, _prepare_authenticate_user, None),
+    "get_spotify_tokens": (UserManager.get_spotify_tokens, _prepare_lookup, None),
+    "get_group": (GroupManager.get_group, _prepare_get_group, None),
+    "get_user_group": (GroupManager.get_user_group, _prepare_lookup, None),
+    "create_group": (GroupManager.create_group, _prepare_create_group, _cleanup_create_group),
+    "join_group": (GroupManager.join_group, _prepare_join_group, _cleanup_join_group),
+    "leave_group": (GroupManager.leave_group, _prepare_leave_group, None),
+    "save_spotify_token": (save_spotify_token, _prepare_save_spotify_token, None),
+}
+
+
+def benchmark_context(size, operations, seed=0):
+    """
+    Remplit le stockage configuré pour une série de mesures.
+
+    Le stockage reçoit `size` utilisateurs et `size / (2 × BENCHMARK_GROUP_SIZE)` groupes
+    (voir `loadtest.seed_storage`) : la moitié des utilisateurs n'a pas de groupe.
+
+    **Retour** :
+    - Le contexte passé aux fonctions de préparation de `BENCHMARKS`.
+    """
+    groups = max(1, size // (2 * BENCHMARK_GROUP_SIZE))
+    free_users = seed_storage(get_storage(), size, groups, BENCHMARK_GROUP_SIZE)
+    if len(free_users) < operations:
+        raise ValueError("Pas assez d'utilisateurs sans groupe pour le nombre d'appels demandé")
+    return {"users": size, "groups": groups, "free_users": free_users, "rng": random.Random(seed)}
+
+
+def _call_all(function, calls):
+    # `save_spotify_token` écrit des traces sur la sortie standard
+    with contextlib.redirect_stdout(io.StringIO()):
+        for arguments in calls:
+            function(*arguments)
+
+
+def run_benchmark(name, context, operations, repeat=3):
+    """
+    Mesure une fonction de `BENCHMARKS` sur `operations` appels.
+
+    La durée retenue est la meilleure de `repeat` séries, ramenée à un appel. Le pic de
+    mémoire est mesuré par `tracemalloc` sur une série distincte (le suivi des allocations
+    ralentit les appels) : c'est l'écart maximum entre la mémoire allouée pendant la série
+    et celle allouée à son début.
+
+    **Retour** :
+    - Dictionnaire `time_us` (microsecondes par appel) et `peak_kib` (kibioctets).
+    """
+    function, prepare, cleanup = BENCHMARKS[name]
+
+    def series(measure):
+        calls = prepare(context, operations)
+        try:
+            return measure(calls)
+        finally:
+            if cleanup is not None:
+                cleanup(calls)
+
+    def timed(calls):
+        start = time.perf_counter()
+        _call_all(function, calls)
+        return time.perf_counter() - start
+
+    def traced(calls):
+        tracemalloc.start()
+        try:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            _call_all(function, calls)
+            return tracemalloc.get_traced_memory()[1] - current
+        finally:
+            tracemalloc.stop()
+
+    best = min(series(timed) for _ in range(repeat))
+    peak = series(traced)
+    return {"time_us": round(best / operations * 1e6, 2), "peak_kib": round(peak / 1024, 1)}
+
+
+def compare(results, baseline, time_tolerance, memory_tolerance):
+    """
+    Compare des mesures à celles de référence.
+
+    Une mesure régresse si elle dépasse la référence de plus de la tolérance (proportion)
+    et de plus de `TIME_SLACK_US` ou `MEMORY_SLACK_KIB`. Les mesures sans référence sont
+    ignorées.
+
+    **Paramètres** :
+    - `results` / `baseline` (dict) : Mesures par moteur, fonction et taille :
+      `{"json": {"create_user": {"1000": {"time_us": ..., "peak_kib": ...}}}}`.
+
+    **Retour** :
+    - La liste des régressions `(backend, name, size, metric, baseline, current)`.
+    """
+    limits = {"time_us": (time_tolerance, TIME_SLACK_US), "peak_kib": (memory_tolerance, MEMORY_SLACK_KIB)}
+    regressions = []
+    for backend, functions in results.items():
+        for name, sizes in functions.items():
+            for size, measures in sizes.items():
+                reference = baseline.get(backend, {}).get(name, {}).get(size)
+                if reference is None:
+                    continue
+                for metric, (tolerance, slack) in limits.items():
+                    current, expected = measures[metric], reference[metric]
+                    if current > expected * (1 + tolerance) and current - expected > slack:
+                        regressions.append((backend, name, size, metric, expected, current))
+    return regressions
@@ -0,0 +1,71 @@
+from django.conf import settings
+from .backends import get_storage
+from .models import UserManager, GroupManager
+from .signals import deferred_signals
+
+# Nombre maximum d'éléments par requête groupée (réglage `SPOTYNOV_BULK_MAX_ITEMS`)
+DEFAULT_BULK_MAX_ITEMS = 1000
+
+# Opérations groupées : champs requis de chaque élément, fonction appliquée et code HTTP
+# d'un élément réussi (les mêmes que les vues unitaires correspondantes)
+BULK_OPERATIONS = {
+    "create_user": (("username", "password"), UserManager.create_user, 201),
+    "create_group": (("group_name", "username"), GroupManager.create_group, 201),
+    "join_group": (("group_name", "username"), GroupManager.join_group, 200),
+    "leave_group": (("username",), GroupManager.leave_group, 200),
+}
+
+
+def validate_item(item, fields):
+    """
+    Retourne les arguments de l'opération pour un élément, ou `None` s'il est invalide.
+    """
+    if not isinstance(item, dict):
+        return None
+    values = [item.get(field) for field in fields]
+    if not all(isinstance(value, str) and value for value in values):
+        return None
+    return values
+
+
+def apply_bulk(operation, items):
+    """
+    Applique une opération à une liste d'éléments, en une seule écriture du stockage.
+
+    Tous les éléments sont validés avant d'être appliqués dans l'ordre de la liste, au
+    sein d'une même section `batch()` du stockage : un seul ajout au journal par fichier
+    avec le moteur JSON, une seule transaction avec SQLite. Chaque élément est traité par
+    la méthode unitaire correspondante (mêmes vérifications, mêmes messages) ; l'échec d'un
+    élément n'empêche pas l'application des suivants.
+
+    Les signaux des méthodes unitaires (`user_created`, `member_joined`…) ne sont envoyés
+    qu'une fois la section `batch()` persistée (`deferred_signals`), et jamais si elle échoue.
+
+    **Paramètres** :
+    - `operation` (str) : Clé de `BULK_OPERATIONS`.
+    - `items` (list) : Éléments, chacun un dictionnaire des champs requis par l'opération.
+
+    **Retour** :
+    - La liste des résultats, dans l'ordre des éléments : `index`, `status` (code HTTP de
+      l'élément) et le message (`message` ou `error`) de la méthode unitaire.
+    """
+    fields, apply, success_status = BULK_OPERATIONS[operation]
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        arguments = validate_item(item, fields)
+        if arguments is None:
+            results[index] = {"index": index, "status": 400, "error": f"Champs requis : {', '.join(fields)}."}
+        else:
+            valid.append((index, arguments))
+
+    if valid:
+        with deferred_signals(), get_storage().batch():
+            for index, arguments in valid:
+                result = apply(*arguments)
+                results[index] = {"index": index, "status": 400 if "error" in result else success_status, **result}
+    return results
+
+
+def bulk_max_items():
+    return getattr(settings, "SPOTYNOV_BULK_MAX_ITEMS", DEFAULT_BULK_MAX_ITEMS)
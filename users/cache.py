@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from .metrics import count
+
+
+class TTLCache:
+    """
+    Cache mémoire borné, avec éviction LRU et expiration des entrées.
+
+    Les entrées sont conservées au plus `ttl` secondes ; au-delà de `max_size` entrées,
+    la moins récemment utilisée est évincée. Le cache est partagé entre les threads d'un
+    même processus et compte ses succès et ses échecs (également reportés dans les mesures
+    du processus et de la requête en cours, sous l'étiquette `name`).
+
+    **Méthodes** :
+    - `get(key, default)`: Retourne la valeur en cache, ou `default` si absente ou expirée.
+    - `lookup(key)`: Retourne la valeur en cache, même expirée, et si elle est encore fraîche.
+    - `set(key, value, ttl)`: Ajoute ou remplace une entrée.
+    - `invalidate(key)`: Supprime une entrée.
+    - `clear()`: Vide le cache.
+    - `stats()`: Retourne la taille du cache et ses compteurs.
+    """
+    def __init__(self, max_size=1024, ttl=60.0, name="default"):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                hit = False
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                hit = True
+        count("cache_hits" if hit else "cache_misses", cache=self.name)
+        return entry[1] if hit else default
+
+    def lookup(self, key):
+        """
+        Retourne `(valeur, fraîche)` pour une clé.
+
+        Contrairement à `get`, une entrée expirée n'est pas supprimée : elle est retournée avec
+        `fraîche` à `False` afin d'être revalidée auprès de sa source. `(None, False)` est
+        retourné si la clé est absente.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                fresh = False
+            else:
+                self._entries.move_to_end(key)
+                fresh = entry[0] > time.monotonic()
+                if fresh:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        count("cache_hits" if fresh else "cache_misses", cache=self.name)
+        return (entry[1] if entry is not None else None), fresh
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,35 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def version_headers(version):
+    """
+    Retourne les en-têtes `ETag` et `Last-Modified` correspondant à une version
+    `(numéro, date de modification)` du stockage.
+    """
+    number, modified = version
+    headers = {"ETag": quote_etag(str(number))}
+    if modified is not None:
+        headers["Last-Modified"] = http_date(modified)
+    return headers
+
+
+def not_modified(request, version):
+    """
+    Répond aux en-têtes `If-None-Match` / `If-Modified-Since` d'une requête.
+
+    **Retour** :
+    - Une réponse 304 (ou 412) portant les en-têtes de la version, si le client possède déjà
+      cette version.
+    - `None` sinon : la vue construit alors la réponse complète.
+    """
+    number, modified = version
+    response = get_conditional_response(
+        request,
+        etag=quote_etag(str(number)),
+        last_modified=int(modified) if modified is not None else None,
+    )
+    if response is not None:
+        for header, value in version_headers(version).items():
+            response.headers[header] = value
+    return response
@@ -0,0 +1,245 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.dispatch import receiver
+from .serialization import dumps
+from .signals import member_joined, member_left, playback_changed
+
+# Valeurs par défaut du réglage `SPOTYNOV_EVENTS`
+DEFAULT_EVENTS_SETTINGS = {
+    "BUFFER_SIZE": 256,
+    "HEARTBEAT": 15,
+}
+
+
+def events_settings():
+    return {**DEFAULT_EVENTS_SETTINGS, **getattr(settings, "SPOTYNOV_EVENTS", {})}
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class GroupChannel:
+    """
+    Canal d'événements d'un groupe, partagé par tous ses abonnés d'un worker.
+
+    Chaque événement reçoit un numéro croissant et est conservé dans un tampon circulaire
+    de `buffer_size` événements. Les abonnés ne possèdent pas de file propre : ils lisent
+    le tampon à partir du dernier numéro reçu, puis attendent la publication suivante.
+
+    Tous les abonnés d'une même boucle d'événements attendent le même `Future` : une
+    publication coûte un réveil par boucle, quel que soit le nombre d'abonnés. Un abonné
+    trop lent pour lequel des événements ont quitté le tampon repart d'un état complet.
+
+    Le canal tient à jour les membres, l'administrateur et la dernière lecture du groupe :
+    l'état envoyé à un nouvel abonné ne nécessite pas de lecture du stockage, sauf pour le
+    premier abonné d'un groupe sans événement récent.
+
+    La publication peut se faire depuis n'importe quel thread (vues synchrones, boucle
+    de synchronisation).
+
+    **Méthodes** :
+    - `publish(event, data, group=None, playback=None)`: Publie un événement.
+    - `snapshot()`: Retourne l'état du groupe et le numéro du dernier événement.
+    - `remember(seq, group)`: Enregistre le groupe lu dans le stockage.
+    - `since(seq)`: Retourne les événements postérieurs à `seq`.
+    - `wait(seq, timeout)`: Attend un événement postérieur à `seq`.
+    """
+    def __init__(self, group_name, buffer_size):
+        self.group_name = group_name
+        self.seq = 0
+        self.group = None
+        self.playback = None
+        self.subscribers = 0
+        self.deleted = False
+        self._events = deque(maxlen=buffer_size)
+        self._waiters = {}
+        self._lock = threading.Lock()
+
+    def publish(self, event, data, group=None, playback=None):
+        with self._lock:
+            self.seq += 1
+            self._events.append((self.seq, event, data))
+            if group is not None:
+                self.group = {"members": list(group["members"]), "admin": group.get("admin")}
+            if playback is not None:
+                self.playback = playback
+            waiters, self._waiters = self._waiters, {}
+        for loop, future in waiters.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_wake, future)
+
+    def snapshot(self):
+        """
+        Retourne `(seq, state)` : le numéro du dernier événement et l'état du groupe à cet
+        instant (`None` si les membres ne sont pas encore connus du canal).
+        """
+        with self._lock:
+            if self.group is None:
+                return self.seq, None
+            return self.seq, {"group": self.group_name, **self.group, "playback": self.playback}
+
+    def remember(self, seq, group):
+        """
+        Enregistre les membres lus dans le stockage, si aucun événement n'a été publié
+        depuis `seq`.
+        """
+        with self._lock:
+            if self.seq == seq and self.group is None:
+                self.group = {"members": list(group["members"]), "admin": group.get("admin")}
+
+    def since(self, seq):
+        """
+        Retourne les événements `(seq, event, data)` postérieurs à `seq`, ou `None` si
+        certains ne sont plus dans le tampon.
+        """
+        with self._lock:
+            if seq >= self.seq:
+                return []
+            if not self._events or self._events[0][0] > seq + 1:
+                return None
+            return list(itertools.islice(self._events, seq + 1 - self._events[0][0], None))
+
+    async def wait(self, seq, timeout):
+        """
+        Attend qu'un événement postérieur à `seq` soit publié, au plus `timeout` secondes.
+
+        **Retour** :
+        - `True` si un événement a été publié, `False` à l'expiration du délai.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.seq > seq:
+                return True
+            future = self._waiters.get(loop)
+            if future is None:
+                future = self._waiters[loop] = loop.create_future()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def subscribe(self):
+        with self._lock:
+            self.subscribers += 1
+
+    def unsubscribe(self):
+        with self._lock:
+            self.subscribers -= 1
+            unused = self.deleted and not self.subscribers
+        if unused:
+            discard_channel(self.group_name, self)
+
+
+_channels = {}
+_channels_lock = threading.Lock()
+
+
+def get_channel(group_name):
+    """
+    Retourne le canal d'un groupe, créé au premier abonnement ou à la première publication
+    (ou remplacé si le groupe a été supprimé puis recréé).
+    """
+    with _channels_lock:
+        channel = _channels.get(group_name)
+        if channel is None or channel.deleted:
+            channel = _channels[group_name] = GroupChannel(group_name, events_settings()["BUFFER_SIZE"])
+        return channel
+
+
+def discard_channel(group_name, channel):
+    with _channels_lock:
+        if _channels.get(group_name) is channel:
+            del _channels[group_name]
+
+
+def format_event(seq, event, data):
+    """
+    Formate un événement au format Server-Sent Events.
+    """
+    return f"id: {seq}\nevent: {event}\ndata: {dumps(data).decode()}\n\n"
+
+
+async def stream_group_events(channel, load_group, last_event_id=None):
+    """
+    Générateur asynchrone des événements d'un groupe, au format Server-Sent Events.
+
+    Le flux commence par les événements manqués depuis `last_event_id` (reconnexion d'un
+    client `EventSource`) s'ils sont encore dans le tampon, sinon par un événement `state`.
+    Un commentaire est envoyé toutes les `HEARTBEAT` secondes sans événement pour garder la
+    connexion ouverte. Le flux se termine après l'événement `group_deleted`.
+
+    **Paramètres** :
+    - `channel` (GroupChannel) : Canal du groupe.
+    - `load_group` : Coroutine retournant le groupe depuis le stockage (ou `None`).
+    - `last_event_id` (int, optionnel) : Dernier événement reçu par le client.
+    """
+    heartbeat = events_settings()["HEARTBEAT"]
+    channel.subscribe()
+    try:
+        seq = last_event_id if last_event_id is not None else channel.seq
+        resync = last_event_id is None
+        while True:
+            events = None if resync else channel.since(seq)
+            if events is None:
+                seq, state = channel.snapshot()
+                if state is None:
+                    # Le numéro est relevé avant la lecture du groupe : un événement publié
+                    # entre les deux est renvoyé ensuite, sans jamais être perdu
+                    group = await load_group()
+                    if group is None:
+                        yield format_event(seq, "group_deleted", {"group": channel.group_name})
+                        return
+                    channel.remember(seq, group)
+                    state = {
+                        "group": channel.group_name, "members": group["members"],
+                        "admin": group.get("admin"), "playback": channel.playback,
+                    }
+                yield format_event(seq, "state", state)
+                resync = False
+                continue
+
+            for seq, event, data in events:
+                yield format_event(seq, event, data)
+                if event == "group_deleted":
+                    return
+
+            if not await channel.wait(seq, heartbeat):
+                yield ": keep-alive\n\n"
+    finally:
+        channel.unsubscribe()
+
+
+@receiver(member_joined)
+def publish_member_joined(sender, group_name, username, group, **kwargs):
+    get_channel(group_name).publish("member_joined", {
+        "username": username, "members": list(group["members"]), "admin": group.get("admin"),
+    }, group=group)
+
+
+@receiver(member_left)
+def publish_member_left(sender, group_name, username, group, **kwargs):
+    channel = get_channel(group_name)
+    if group is None:
+        channel.deleted = True
+        channel.publish("group_deleted", {"group": group_name, "username": username})
+        if not channel.subscribers:
+            discard_channel(group_name, channel)
+        return
+
+    channel.publish("member_left", {
+        "username": username, "members": list(group["members"]), "admin": group.get("admin"),
+    }, group=group)
+
+
+@receiver(playback_changed)
+def publish_playback(sender, group_name, playback, **kwargs):
+    # Horodatage du serveur : les clients extrapolent la position depuis cet instant
+    playback = {**playback, "timestamp": int(time.time() * 1000)}
+    get_channel(group_name).publish("playback", playback, playback=playback)
@@ -0,0 +1,163 @@
+import base64
+import binascii
+from django.conf import settings
+from .backends import get_storage
+from .models import GroupManager
+from .serialization import dumps
+from .streaming import iter_json_object
+
+# Valeurs par défaut du réglage `SPOTYNOV_GROUP_LIST`
+DEFAULT_GROUP_LIST_SETTINGS = {
+    "DEFAULT_LIMIT": 100,
+    "MAX_LIMIT": 1000,
+}
+
+# Champs sélectionnables avec le paramètre `fields`
+GROUP_FIELDS = {
+    "members": lambda group: group.get("members", []),
+    "admin": lambda group: group.get("admin"),
+    "member_count": lambda group: len(group.get("members", [])),
+}
+
+# Paramètres qui font passer `GroupListView` du dictionnaire complet à la forme paginée
+QUERY_PARAMS = ("limit", "cursor", "prefix", "fields")
+
+
+def group_list_settings():
+    return {**DEFAULT_GROUP_LIST_SETTINGS, **getattr(settings, "SPOTYNOV_GROUP_LIST", {})}
+
+
+def encode_cursor(group_name):
+    """
+    Retourne le curseur opaque désignant la position qui suit le groupe `group_name`.
+    """
+    return base64.urlsafe_b64encode(group_name.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Curseur invalide")
+
+
+def parse_query(params):
+    """
+    Valide les paramètres de pagination de `GroupListView`.
+
+    **Retour** :
+    - Dictionnaire `prefix`, `after`, `limit` et `fields` (`None` pour les champs stockés).
+
+    **Exceptions** :
+    - `ValueError` : Si un paramètre est invalide (message destiné au client).
+    """
+    config = group_list_settings()
+    try:
+        limit = int(params.get("limit", config["DEFAULT_LIMIT"]))
+    except ValueError:
+        raise ValueError("Paramètre limit invalide")
+    if limit <= 0:
+        raise ValueError("Paramètre limit invalide")
+
+    fields = None
+    if params.get("fields"):
+        fields = [field for field in params["fields"].split(",") if field]
+        unknown = [field for field in fields if field not in GROUP_FIELDS]
+        if unknown:
+            raise ValueError(f"Champs inconnus : {', '.join(unknown)}")
+
+    cursor = params.get("cursor")
+    return {
+        "prefix": params.get("prefix", ""),
+        "after": decode_cursor(cursor) if cursor else None,
+        "limit": min(limit, config["MAX_LIMIT"]),
+        "fields": fields,
+    }
+
+
+def select_fields(group, fields):
+    if fields is None:
+        return group
+    return {field: GROUP_FIELDS[field](group) for field in fields}
+
+
+def stream_all_groups():
+    """
+    Génère l'encodage JSON du dictionnaire complet des groupes (forme historique).
+    """
+    return iter_json_object(get_storage().iter_groups())
+
+
+def stream_group_page(prefix, after, limit, fields):
+    """
+    Génère l'encodage JSON d'une page de groupes : `{"groups": {...}, "next_cursor": ...}`.
+
+    Un groupe de plus que `limit` est lu pour savoir s'il existe une page suivante ;
+    `next_cursor` vaut `None` sur la dernière page.
+    """
+    state = {"next_cursor": None}
+
+    def groups():
+        last = None
+        for index, (group_name, group) in enumerate(get_storage().iter_groups(prefix, after, limit + 1)):
+            if index == limit:
+                state["next_cursor"] = encode_cursor(last)
+                return
+            last = group_name
+            yield group_name, select_fields(group, fields)
+
+    yield b'{"groups":'
+    yield from iter_json_object(groups())
+    yield b',"next_cursor":%s}' % dumps(state["next_cursor"])
+
+
+def parse_changes_query(params):
+    """
+    Valide les paramètres de `GroupChangesView`.
+
+    **Retour** :
+    - Dictionnaire `since` (`None` pour demander un état complet) et `limit`.
+
+    **Exceptions** :
+    - `ValueError` : Si un paramètre est invalide (message destiné au client).
+    """
+    config = group_list_settings()
+    try:
+        since = int(params["since"]) if params.get("since") else None
+        limit = int(params.get("limit", config["DEFAULT_LIMIT"]))
+    except ValueError:
+        raise ValueError("Paramètre since ou limit invalide")
+    if limit <= 0 or (since is not None and since < 0):
+        raise ValueError("Paramètre since ou limit invalide")
+    return {"since": since, "limit": min(limit, config["MAX_LIMIT"])}
+
+
+def stream_group_changes(since, limit):
+    """
+    Génère l'encodage JSON du flux des modifications de groupes postérieures à `since`.
+
+    Si elles sont toutes conservées : `{"changes": [...], "cursor": ..., "has_more": ...}`,
+    chaque modification étant `{"seq", "op", "group", "value"}`. Sinon (ou sans `since`) :
+    `{"snapshot": {...}, "cursor": ...}` avec l'ensemble des groupes.
+
+    Le curseur d'un état complet est la version relevée avant sa lecture : une modification
+    concurrente peut y figurer et être renvoyée par l'appel suivant, ce qui est sans effet
+    puisque chaque modification porte l'état complet du groupe.
+    """
+    changes = GroupManager.get_group_changes(since, limit + 1) if since is not None else None
+    if changes is None:
+        cursor = GroupManager.get_groups_version()[0]
+        yield b'{"snapshot":'
+        yield from iter_json_object(get_storage().iter_groups())
+        yield b',"cursor":%d}' % cursor
+        return
+
+    page = changes[:limit]
+    yield dumps({
+        "changes": [
+            {"seq": seq, "op": op, "group": group_name, "value": group}
+            for seq, op, group_name, group in page
+        ],
+        "cursor": page[-1][0] if page else since,
+        "has_more": len(changes) > limit,
+    })
@@ -0,0 +1,155 @@
+import threading
+import time
+from django.conf import settings
+from .personality import PERSONALITY_CACHE, TOP_GENRES, cached_etags, fetch_histories, update_cache
+from .ratelimit import BACKGROUND
+from .spotify import get_spotify_client
+from .tokens import token_manager
+
+# Nombre maximum de membres dont l'historique est collecté simultanément
+DEFAULT_GROUP_BATCH_SIZE = 50
+
+
+class GroupTaste:
+    """
+    Profil musical agrégé d'un groupe.
+
+    Le profil est la somme des contributions de ses membres (voir `personality.contribution`) :
+    l'arrivée ou le départ d'un membre ajoute ou retranche sa seule contribution, sans
+    recalculer celles des autres.
+
+    **Méthodes** :
+    - `add(username, contribution)`: Ajoute la contribution d'un membre.
+    - `remove(username)`: Retranche la contribution d'un membre.
+    - `profile(group_name, members)`: Retourne le profil du groupe.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.members = {}
+        self.tracks = 0
+        self.sums = {}
+        self.counts = {}
+        self.genres = {}
+
+    def add(self, username, contribution):
+        self.remove(username)
+        self.members[username] = (contribution, time.monotonic())
+        self.tracks += contribution["tracks"]
+        for name, value in contribution["sums"].items():
+            self.sums[name] = self.sums.get(name, 0.0) + value
+            self.counts[name] = self.counts.get(name, 0) + contribution["counts"][name]
+        for genre, count in contribution["genres"].items():
+            self.genres[genre] = self.genres.get(genre, 0) + count
+
+    def remove(self, username):
+        if username not in self.members:
+            return
+
+        contribution, _ = self.members.pop(username)
+        self.tracks -= contribution["tracks"]
+        for name, value in contribution["sums"].items():
+            self.counts[name] -= contribution["counts"][name]
+            self.sums[name] -= value
+            if not self.counts[name]:
+                del self.counts[name], self.sums[name]
+        for genre, count in contribution["genres"].items():
+            self.genres[genre] -= count
+            if not self.genres[genre]:
+                del self.genres[genre]
+
+    def outdated(self, members, ttl):
+        """Retourne les membres sans contribution, ou dont la contribution a plus de `ttl` secondes."""
+        now = time.monotonic()
+        return [
+            member for member in members
+            if member not in self.members or self.members[member][1] + ttl <= now
+        ]
+
+    def profile(self, group_name, members):
+        averages = {name: self.sums[name] / self.counts[name] for name in self.sums}
+        top_genres = sorted(self.genres.items(), key=lambda item: item[1], reverse=True)[:TOP_GENRES]
+        return {
+            "group": group_name,
+            "member_count": len(members),
+            "analysed_members": len(self.members),
+            "unavailable_members": [member for member in members if member not in self.members],
+            "track_count": self.tracks,
+            "popularity_average": averages.get("popularity"),
+            "duration_average": averages.get("duration_ms"),
+            "averages": averages,
+            "genres": dict(top_genres),
+        }
+
+
+_tastes = {}
+_tastes_lock = threading.Lock()
+
+
+def member_contributions(usernames):
+    """
+    Retourne la contribution de chaque membre, par nom d'utilisateur.
+
+    Les profils encore frais de `PERSONALITY_CACHE` sont réutilisés ; les autres historiques
+    sont collectés ensemble (`fetch_histories`), avec le token enregistré de chaque membre.
+    Les membres sans token ou dont la collecte échoue sont absents du résultat.
+    """
+    contributions, entries, gets = {}, {}, {}
+    client = get_spotify_client()
+
+    def getter(username):
+        def get(path, params, headers):
+            return token_manager.call(username, lambda token: client.get(
+                path, token, params=params, headers=headers, priority=BACKGROUND
+            ))
+        return get
+
+    for username in usernames:
+        entry, fresh = PERSONALITY_CACHE.lookup(username)
+        if fresh:
+            contributions[username] = entry["contribution"]
+        else:
+            entries[username] = entry
+            gets[username] = getter(username)
+
+    etags = {username: cached_etags(entry) for username, entry in entries.items()}
+    for username, history in fetch_histories(gets, etags).items():
+        if isinstance(history, Exception):
+            continue
+        entry, _ = update_cache(username, entries[username], history)
+        contributions[username] = entry["contribution"]
+    return contributions
+
+
+def get_group_taste(group_name, members):
+    """
+    Retourne le profil musical d'un groupe, en ne traitant que les changements de membres.
+
+    Le profil agrégé est conservé en mémoire par groupe. À chaque appel, il est comparé à la
+    liste actuelle des membres : la contribution des membres partis est retranchée, et
+    seules celles des nouveaux membres (ou des membres dont le profil a expiré) sont
+    collectées, par lots de `SPOTYNOV_GROUP_BATCH_SIZE` membres en parallèle.
+
+    **Paramètres** :
+    - `group_name` (str) : Nom du groupe.
+    - `members` (list) : Membres actuels du groupe.
+    """
+    with _tastes_lock:
+        taste = _tastes.setdefault(group_name, GroupTaste())
+
+    batch_size = getattr(settings, "SPOTYNOV_GROUP_BATCH_SIZE", DEFAULT_GROUP_BATCH_SIZE)
+    with taste.lock:
+        current = set(members)
+        for member in [member for member in taste.members if member not in current]:
+            taste.remove(member)
+
+        outdated = taste.outdated(members, PERSONALITY_CACHE.ttl)
+        for start in range(0, len(outdated), batch_size):
+            for username, contribution in member_contributions(outdated[start:start + batch_size]).items():
+                taste.add(username, contribution)
+
+        return taste.profile(group_name, members)
+
+
+def discard_group_taste(group_name):
+    with _tastes_lock:
+        _tastes.pop(group_name, None)
@@ -0,0 +1,411 @@
+import hashlib
+import os
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import requests
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from rest_framework_simplejwt.tokens import AccessToken
+from .serialization import dumps
+
+# Mot de passe de tous les utilisateurs créés par `seed_storage`
+LOADTEST_PASSWORD = "loadtest"
+
+# Percentiles des latences rapportés par `summarize`
+REPORT_PERCENTILES = (50, 95, 99)
+
+# Moteurs de stockage sélectionnables par les commandes `loadtest` et `benchmark`
+STORAGE_BACKENDS = {
+    "json": "users.backends.JSONBackend",
+    "sqlite": "users.backends.SQLiteBackend",
+}
+
+# Titre joué par l'administrateur de chaque groupe sur le faux serveur
+FAKE_TRACK_DURATION_MS = 200000
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    """
+    Réponses du faux serveur Spotify (voir `FakeSpotifyServer`).
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        server = self.server
+        server.count(method, url.path)
+        time.sleep(server.delay())
+        if random.random() < server.error_rate:
+            self._send(503, dumps({"error": {"status": 503, "message": "Service unavailable"}}))
+            return
+
+        route = server.routes.get((method, url.path))
+        if route is None:
+            self._send(404, dumps({"error": {"status": 404, "message": "Not found"}}))
+            return
+        route(self, {key: values[0] for key, values in parse_qs(url.query).items()})
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def token(self, params):
+        self._send(200, dumps({"access_token": f"fake-{random.getrandbits(64):x}", "expires_in": 3600}))
+
+    def player(self, params):
+        self._send(200, dumps({
+            "is_playing": True,
+            "progress_ms": int(time.time() * 1000) % FAKE_TRACK_DURATION_MS,
+            "item": {"uri": "spotify:track:fake", "duration_ms": FAKE_TRACK_DURATION_MS},
+        }))
+
+    def play(self, params):
+        self._send(204)
+
+    def top_tracks(self, params):
+        offset = int(params.get("offset", 0))
+        limit = int(params.get("limit", 20))
+        etag = f'"fake-{offset}-{limit}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers={"ETag": etag})
+            return
+        tracks = self.server.tracks
+        self._send(200, dumps({"items": tracks[offset:offset + limit], "total": len(tracks)}), {"ETag": etag})
+
+    def audio_features(self, params):
+        self._send(200, dumps({"audio_features": [
+            {
+                "id": track_id, "danceability": 0.5, "energy": 0.6, "valence": 0.4, "acousticness": 0.2,
+                "instrumentalness": 0.1, "liveness": 0.15, "speechiness": 0.05, "tempo": 120.0, "loudness": -6.0,
+            }
+            for track_id in params.get("ids", "").split(",") if track_id
+        ]}))
+
+    def artists(self, params):
+        self._send(200, dumps({"artists": [
+            {"id": artist_id, "genres": ["pop", f"genre-{artist_id}"]}
+            for artist_id in params.get("ids", "").split(",") if artist_id
+        ]}))
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    """
+    Faux serveur Spotify local, pour les tests de charge.
+
+    Il répond aux routes utilisées par les vues (service de tokens, lecteur, titres les plus
+    écoutés, caractéristiques audio, artistes) après un délai tiré entre `latency - jitter`
+    et `latency + jitter` millisecondes, et répond 503 à une fraction `error_rate` des
+    requêtes. Le serveur écoute sur un port libre de `127.0.0.1` ; les vues l'utilisent si
+    les réglages `SPOTIFY_API_URL` et `SPOTIFY_TOKEN_URL` valent `api_url` et `token_url`.
+
+    **Paramètres** :
+    - `latency` / `jitter` (float) : Délai de réponse moyen et sa variation, en millisecondes.
+    - `error_rate` (float) : Proportion des requêtes en erreur (entre 0 et 1).
+    - `tracks` (int) : Nombre de titres les plus écoutés de chaque utilisateur.
+
+    **Méthodes** :
+    - `start()`: Démarre le serveur dans un thread.
+    - `stop()`: Arrête le serveur.
+    - `stats()`: Retourne le nombre de requêtes reçues par route.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, tracks=50):
+        super().__init__(("127.0.0.1", 0), FakeSpotifyHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.tracks = [
+            {
+                "id": f"track{index}", "uri": f"spotify:track:track{index}",
+                "popularity": index * 7 % 100, "duration_ms": 150000 + index * 1000 % 120000,
+                "artists": [{"id": f"artist{index % 40}"}],
+            }
+            for index in range(tracks)
+        ]
+        self.routes = {
+            ("POST", "/api/token"): FakeSpotifyHandler.token,
+            ("GET", "/v1/me/player"): FakeSpotifyHandler.player,
+            ("PUT", "/v1/me/player/play"): FakeSpotifyHandler.play,
+            ("GET", "/v1/me/top/tracks"): FakeSpotifyHandler.top_tracks,
+            ("GET", "/v1/audio-features"): FakeSpotifyHandler.audio_features,
+            ("GET", "/v1/artists"): FakeSpotifyHandler.artists,
+        }
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-spotify", daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def api_url(self):
+        return f"{self.base_url}/v1"
+
+    @property
+    def token_url(self):
+        return f"{self.base_url}/api/token"
+
+    def delay(self):
+        return max(0.0, random.uniform(self.latency - self.jitter, self.latency + self.jitter)) / 1000
+
+    def count(self, method, path):
+        with self._lock:
+            self._counts[f"{method} {path}"] = self._counts.get(f"{method} {path}", 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_api_server():
+    """
+    Démarre l'application Django (`WSGI_APPLICATION`) sur un port libre de `127.0.0.1`,
+    dans un serveur multi-thread.
+
+    **Retour** :
+    - Le serveur (à arrêter par `shutdown()` et `server_close()`) et son adresse de base.
+    """
+    server = ThreadedWSGIServer(("127.0.0.1", 0), QuietWSGIRequestHandler)
+    server.set_app(get_internal_wsgi_application())
+    threading.Thread(target=server.serve_forever, name="loadtest-api", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def storage_settings(backend, directory):
+    """
+    Retourne le réglage `SPOTYNOV_STORAGE` d'un stockage `backend` (clé de `STORAGE_BACKENDS`)
+    dont les fichiers sont créés dans `directory`.
+    """
+    if backend == "sqlite":
+        options = {"name": os.path.join(directory, "spotynov.sqlite3")}
+    else:
+        options = {
+            "users_file": os.path.join(directory, "users.json"),
+            "groups_file": os.path.join(directory, "groups.json"),
+        }
+    return {"BACKEND": STORAGE_BACKENDS[backend], "OPTIONS": options}
+
+
+def seed_storage(storage, users, groups, group_size):
+    """
+    Remplace le contenu du stockage par `users` utilisateurs et `groups` groupes.
+
+    Les groupes `loadtest-group-<i>` réunissent chacun `group_size` utilisateurs distincts,
+    le premier en étant l'administrateur ; les utilisateurs restants n'appartiennent à aucun
+    groupe. Chaque utilisateur a le mot de passe `LOADTEST_PASSWORD` et un token Spotify
+    valide pour dix ans.
+
+    **Retour** :
+    - La liste des noms d'utilisateurs sans groupe.
+    """
+    password = hashlib.sha256(LOADTEST_PASSWORD.encode()).hexdigest()
+    expires_at = time.time() + 10 * 365 * 24 * 3600
+    usernames = [f"loadtest-user-{index}" for index in range(users)]
+    with storage.atomic():
+        storage.save_users({
+            username: {
+                "password": password,
+                "spotify_access_token": f"token-{username}",
+                "spotify_refresh_token": f"refresh-{username}",
+                "spotify_token_expires_at": expires_at,
+            }
+            for username in usernames
+        })
+        storage.save_groups({
+            f"loadtest-group-{index}": {
+                "members": usernames[index * group_size:(index + 1) * group_size],
+                "admin": usernames[index * group_size],
+            }
+            for index in range(groups)
+        })
+    return usernames[groups * group_size:]
+
+
+class LoadPlan:
+    """
+    Requêtes envoyées par le test de charge, une méthode par scénario (`ENDPOINTS`).
+
+    Chaque scénario reçoit `send(name, method, path, **kwargs)`, qui envoie une requête à
+    l'API et mesure sa durée sous le nom `name`. Le scénario `join` fait rejoindre un
+    groupe à un utilisateur sans groupe puis le lui fait quitter (mesures `join` et
+    `leave`) : le contenu du stockage reste le même tout au long du test.
+
+    **Paramètres** :
+    - `users` (int) : Nombre d'utilisateurs créés par `seed_storage`.
+    - `groups` (int) : Nombre de groupes créés par `seed_storage`.
+    - `free_users` (list) : Utilisateurs sans groupe retournés par `seed_storage`.
+    - `group_size` (int) : Nombre de membres de chaque groupe créé par `seed_storage`.
+    - `page_size` (int) : Taille des pages de la liste des groupes.
+    """
+    def __init__(self, users, groups, free_users, group_size=5, page_size=100):
+        self.users = users
+        self.groups = groups
+        self.group_size = group_size
+        self.page_size = page_size
+        self.free_users = queue.Queue()
+        for username in free_users:
+            self.free_users.put(username)
+
+    def random_user(self):
+        return f"loadtest-user-{random.randrange(self.users)}"
+
+    def random_group(self):
+        return f"loadtest-group-{random.randrange(self.groups)}"
+
+    @staticmethod
+    def authorization(username):
+        """Retourne l'en-tête `Authorization` d'un token JWT de `username`."""
+        token = AccessToken()
+        token["username"] = username
+        return {"Authorization": f"Bearer {token}"}
+
+    def login(self, send):
+        send("login", "POST", "login/", json={"username": self.random_user(), "password": LOADTEST_PASSWORD})
+
+    def groups_page(self, send):
+        send("groups", "GET", "groups/", params={"limit": self.page_size})
+
+    def join(self, send):
+        username = self.free_users.get()
+        try:
+            send("join", "POST", "groups/join/", json={"group_name": self.random_group(), "username": username})
+            send("leave", "POST", "groups/leave/", json={"username": username})
+        finally:
+            self.free_users.put(username)
+
+    def personality(self, send):
+        # Le profil n'est servi qu'à l'utilisateur lui-même (token JWT)
+        username = self.random_user()
+        send("personality", "GET", f"users/{username}/personality/", headers=self.authorization(username))
+
+    def sync(self, send):
+        # Seul l'administrateur du groupe (son premier membre) peut synchroniser sa lecture
+        index = random.randrange(self.groups)
+        send("sync", "POST", "groups/sync/", json={"group_name": f"loadtest-group-{index}"},
+             headers=self.authorization(f"loadtest-user-{index * self.group_size}"))
+
+
+# Scénarios disponibles et méthode de `LoadPlan` correspondante
+ENDPOINTS = {
+    "login": LoadPlan.login,
+    "groups": LoadPlan.groups_page,
+    "join": LoadPlan.join,
+    "personality": LoadPlan.personality,
+    "sync": LoadPlan.sync,
+}
+
+
+def run_endpoint(plan, endpoint, base_url, concurrency, duration):
+    """
+    Exécute un scénario en boucle depuis `concurrency` threads pendant `duration` secondes.
+
+    Chaque thread utilise sa propre session HTTP (connexions conservées).
+
+    **Retour** :
+    - La durée réelle du test et la liste des mesures `(name, seconds, status)` ; `status`
+      vaut 0 si la requête n'a pas abouti.
+    """
+    scenario = ENDPOINTS[endpoint]
+    results = []
+    results_lock = threading.Lock()
+
+    def worker(deadline):
+        measures = []
+        with requests.Session() as session:
+            def send(name, method, path, **kwargs):
+                start = time.perf_counter()
+                try:
+                    status = session.request(method, f"{base_url}/api/{path}", **kwargs).status_code
+                except requests.RequestException:
+                    status = 0
+                measures.append((name, time.perf_counter() - start, status))
+
+            while time.monotonic() < deadline:
+                scenario(plan, send)
+        with results_lock:
+            results.extend(measures)
+
+    start = time.monotonic()
+    threads = [
+        threading.Thread(target=worker, args=(start + duration,), name=f"loadtest-{endpoint}-{index}")
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - start, results
+
+
+def percentile(values, rank):
+    """
+    Percentile `rank` (méthode du rang le plus proche) d'une liste de valeurs triées.
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, -(-len(values) * rank // 100) - 1))]
+
+
+def summarize(elapsed, measures):
+    """
+    Regroupe les mesures de `run_endpoint` par nom.
+
+    **Retour** :
+    - Dictionnaire associant à chaque nom `requests`, `errors` (statut 0 ou ≥ 400),
+      `throughput` (requêtes par seconde) et les latences `p50`, `p95`, `p99` et `max`
+      en millisecondes.
+    """
+    by_name = {}
+    for name, seconds, status in measures:
+        by_name.setdefault(name, []).append((seconds, status))
+
+    summary = {}
+    for name, entries in by_name.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in entries)
+        summary[name] = {
+            "requests": len(entries),
+            "errors": sum(1 for _, status in entries if status == 0 or status >= 400),
+            "throughput": len(entries) / elapsed if elapsed else 0.0,
+            **{f"p{rank}": percentile(latencies, rank) for rank in REPORT_PERCENTILES},
+            "max": latencies[-1],
+        }
+    return summary
@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from users.benchmarks import BENCHMARKS, benchmark_context, compare, run_benchmark
+from users.loadtest import STORAGE_BACKENDS, storage_settings
+
+# Mesures de référence, versionnées avec le code
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             "benchmark_baseline.json")
+
+
+class Command(BaseCommand):
+    """
+    Micro-benchmarks des gestionnaires d'utilisateurs, de groupes et de tokens.
+
+    Chaque fonction de `users.benchmarks.BENCHMARKS` est appelée `--operations` fois sur un
+    stockage temporaire de chaque taille de `--sizes`, pour chaque moteur de `--backends`.
+    La durée par appel et le pic de mémoire sont comparés aux mesures de référence
+    (`users/benchmark_baseline.json`) : la commande échoue si l'un d'eux dépasse la
+    référence de plus de `--time-tolerance` ou `--memory-tolerance`.
+
+    Les durées dépendent de la machine : la référence doit être produite (`--update-baseline`)
+    sur la machine qui exécute la comparaison.
+
+    **Utilisation** :
+    `python manage.py benchmark [--backends json,sqlite] [--sizes 1000,10000,100000]
+    [--functions create_user,...] [--operations N] [--repeat N] [--time-tolerance R]
+    [--memory-tolerance R] [--baseline F] [--update-baseline]`
+    """
+    help = "Mesure les gestionnaires du stockage et les compare aux mesures de référence."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backends", default=",".join(STORAGE_BACKENDS), help="Moteurs de stockage mesurés.")
+        parser.add_argument("--sizes", default="1000,10000,100000", help="Nombres d'utilisateurs du stockage.")
+        parser.add_argument("--functions", default=",".join(BENCHMARKS), help="Fonctions mesurées.")
+        parser.add_argument("--operations", type=int, default=200, help="Nombre d'appels par série.")
+        parser.add_argument("--repeat", type=int, default=3, help="Nombre de séries chronométrées.")
+        parser.add_argument("--time-tolerance", type=float, default=0.5, help="Hausse de durée tolérée (proportion).")
+        parser.add_argument(
+            "--memory-tolerance", type=float, default=0.25, help="Hausse du pic de mémoire tolérée (proportion).",
+        )
+        parser.add_argument("--baseline", default=BASELINE_FILE, help="Fichier des mesures de référence.")
+        parser.add_argument(
+            "--update-baseline", action="store_true", help="Enregistre les mesures comme nouvelle référence.",
+        )
+
+    def handle(self, *args, **options):
+        backends = self.parse_list(options["backends"], STORAGE_BACKENDS, "Moteurs")
+        functions = self.parse_list(options["functions"], BENCHMARKS, "Fonctions")
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",") if size]
+        except ValueError:
+            raise CommandError("--sizes doit être une liste d'entiers.")
+
+        results = {}
+        for backend in backends:
+            for size in sizes:
+                self.stdout.write(f"{backend}, {size} utilisateurs…")
+                with tempfile.TemporaryDirectory(prefix="spotynov-benchmark-") as directory:
+                    with override_settings(SPOTYNOV_STORAGE=storage_settings(backend, directory)):
+                        try:
+                            context = benchmark_context(size, options["operations"])
+                        except ValueError as error:
+                            raise CommandError(str(error))
+                        for name in functions:
+                            results.setdefault(backend, {}).setdefault(name, {})[str(size)] = run_benchmark(
+                                name, context, options["operations"], options["repeat"]
+                            )
+
+        baseline = self.load_baseline(options["baseline"])
+        self.write_report(results, baseline.get("results", {}))
+
+        if options["update_baseline"]:
+            merged = baseline.get("results", {})
+            for backend, measures in results.items():
+                for name, sizes_measures in measures.items():
+                    merged.setdefault(backend, {}).setdefault(name, {}).update(sizes_measures)
+            with open(options["baseline"], "w", encoding="utf-8") as file:
+                json.dump({"operations": options["operations"], "results": merged}, file, indent=2, sort_keys=True)
+                file.write("\n")
+            self.stdout.write(self.style.SUCCESS(f"Mesures de référence enregistrées dans {options['baseline']}."))
+            return
+
+        if not baseline:
+            self.stdout.write(self.style.WARNING(f"Aucune mesure de référence dans {options['baseline']}."))
+        elif baseline.get("operations") != options["operations"]:
+            self.stdout.write(self.style.WARNING(
+                f"Les mesures de référence portent sur {baseline.get('operations')} appels par série."
+            ))
+        regressions = compare(results, baseline.get("results", {}),
+                              options["time_tolerance"], options["memory_tolerance"])
+        if regressions:
+            for backend, name, size, metric, expected, current in regressions:
+                self.stderr.write(f"Régression {backend} {name} ({size}) : {metric} {expected} → {current}")
+            raise CommandError(f"{len(regressions)} régression(s) par rapport aux mesures de référence.")
+        self.stdout.write(self.style.SUCCESS("Aucune régression."))
+
+    @staticmethod
+    def parse_list(value, known, label):
+        names = [name for name in value.split(",") if name]
+        unknown = [name for name in names if name not in known]
+        if unknown:
+            raise CommandError(f"{label} inconnus : {', '.join(unknown)}")
+        return names
+
+    @staticmethod
+    def load_baseline(path):
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def write_report(self, results, baseline):
+        self.stdout.write(f"{'moteur':<7} {'fonction':<19} {'taille':>7} {'µs/appel':>10} {'réf.':>10} "
+                          f"{'pic Kio':>9} {'réf.':>9}")
+        for backend, measures in results.items():
+            for name, sizes_measures in measures.items():
+                for size, current in sizes_measures.items():
+                    reference = baseline.get(backend, {}).get(name, {}).get(size, {})
+                    self.stdout.write(
+                        f"{backend:<7} {name:<19} {size:>7} {current['time_us']:>10.2f} "
+                        f"{reference.get('time_us', '-'):>10} {current['peak_kib']:>9.1f} "
+                        f"{reference.get('peak_kib', '-'):>9}"
+                    )
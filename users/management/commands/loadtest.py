@@ -0,0 +1,109 @@
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from users.backends import get_storage
+from users.loadtest import (
+    ENDPOINTS, REPORT_PERCENTILES, STORAGE_BACKENDS, FakeSpotifyServer, LoadPlan, run_endpoint, seed_storage,
+    start_api_server, storage_settings, summarize,
+)
+
+
+class Command(BaseCommand):
+    """
+    Test de charge HTTP de l'API contre un faux serveur Spotify local.
+
+    Le stockage est remplacé, le temps du test, par des fichiers temporaires remplis de
+    `--users` utilisateurs et `--groups` groupes de `--group-size` membres. L'API est servie
+    dans le processus par un serveur WSGI multi-thread, et les appels à Spotify sont dirigés
+    vers un faux serveur (`users.loadtest.FakeSpotifyServer`) dont la latence et le taux
+    d'erreurs sont réglables. Le régulateur des appels Spotify est désactivé, sauf si
+    `--spotify-rate` est indiqué.
+
+    Chaque scénario de `--endpoints` est exécuté à son tour pendant `--duration` secondes
+    par `--concurrency` clients. Le débit et les percentiles de latence sont affichés pour
+    chaque route.
+
+    **Utilisation** :
+    `python manage.py loadtest [--backend json|sqlite] [--users N] [--groups N] [--group-size N]
+    [--endpoints login,groups,join,personality,sync] [--concurrency N] [--duration S]
+    [--latency MS] [--jitter MS] [--error-rate R] [--tracks N] [--spotify-rate N]`
+    """
+    help = "Mesure le débit et la latence des routes de l'API sous charge."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=sorted(STORAGE_BACKENDS), default="json", help="Moteur de stockage.")
+        parser.add_argument("--users", type=int, default=1000, help="Nombre d'utilisateurs créés.")
+        parser.add_argument("--groups", type=int, default=100, help="Nombre de groupes créés.")
+        parser.add_argument("--group-size", type=int, default=5, help="Nombre de membres de chaque groupe.")
+        parser.add_argument(
+            "--endpoints", default=",".join(ENDPOINTS),
+            help=f"Scénarios exécutés, séparés par des virgules ({', '.join(ENDPOINTS)}).",
+        )
+        parser.add_argument("--concurrency", type=int, default=8, help="Nombre de clients simultanés.")
+        parser.add_argument("--duration", type=float, default=10.0, help="Durée de chaque scénario (s).")
+        parser.add_argument("--latency", type=float, default=50.0, help="Latence moyenne de Spotify (ms).")
+        parser.add_argument("--jitter", type=float, default=10.0, help="Variation de la latence de Spotify (ms).")
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Proportion de réponses 503 de Spotify.")
+        parser.add_argument("--tracks", type=int, default=50, help="Nombre de titres écoutés par utilisateur.")
+        parser.add_argument(
+            "--spotify-rate", type=float, default=None,
+            help="Débit du régulateur des appels Spotify (requêtes/s) ; désactivé par défaut.",
+        )
+
+    def handle(self, *args, **options):
+        endpoints = [endpoint for endpoint in options["endpoints"].split(",") if endpoint]
+        unknown = [endpoint for endpoint in endpoints if endpoint not in ENDPOINTS]
+        if unknown:
+            raise CommandError(f"Scénarios inconnus : {', '.join(unknown)}")
+        if options["groups"] < 1 or options["group_size"] < 1:
+            raise CommandError("Il faut au moins un groupe d'au moins un membre.")
+        if options["users"] < options["groups"] * options["group_size"] + options["concurrency"]:
+            raise CommandError("--users doit dépasser groups × group-size d'au moins --concurrency utilisateurs.")
+
+        spotify = FakeSpotifyServer(options["latency"], options["jitter"], options["error_rate"], options["tracks"])
+        spotify.start()
+        rate = options["spotify_rate"]
+        with tempfile.TemporaryDirectory(prefix="spotynov-loadtest-") as directory:
+            overrides = {
+                "SPOTYNOV_STORAGE": storage_settings(options["backend"], directory),
+                "SPOTIFY_API_URL": spotify.api_url,
+                "SPOTIFY_TOKEN_URL": spotify.token_url,
+                "SPOTIFY_RATE_LIMIT": {"RATE": rate, "BURST": max(1, rate)} if rate else {"RATE": 1e9, "BURST": 1e9},
+            }
+            with override_settings(**overrides):
+                self.stdout.write(
+                    f"Création de {options['users']} utilisateurs et {options['groups']} groupes "
+                    f"({options['backend']})…"
+                )
+                free_users = seed_storage(get_storage(), options["users"], options["groups"], options["group_size"])
+                plan = LoadPlan(options["users"], options["groups"], free_users, options["group_size"])
+
+                server, base_url = start_api_server()
+                try:
+                    summary = {}
+                    for endpoint in endpoints:
+                        self.stdout.write(f"Scénario {endpoint} ({options['duration']} s)…")
+                        summary.update(summarize(*run_endpoint(
+                            plan, endpoint, base_url, options["concurrency"], options["duration"]
+                        )))
+                finally:
+                    server.shutdown()
+                    server.server_close()
+                    spotify.stop()
+
+        self.write_report(summary, spotify.stats())
+
+    def write_report(self, summary, upstream):
+        percentiles = [f"p{rank}" for rank in REPORT_PERCENTILES]
+        header = f"{'route':<12} {'requêtes':>9} {'erreurs':>8} {'req/s':>9}"
+        header += "".join(f" {name + ' ms':>9}" for name in percentiles + ["max"])
+        self.stdout.write(header)
+        for name, stats in summary.items():
+            line = f"{name:<12} {stats['requests']:>9} {stats['errors']:>8} {stats['throughput']:>9.1f}"
+            line += "".join(f" {stats[name]:>9.1f}" for name in percentiles + ["max"])
+            self.stdout.write(line)
+
+        self.stdout.write("Appels reçus par le faux serveur Spotify :")
+        for route, count in sorted(upstream.items()):
+            self.stdout.write(f"  {route} : {count}")
+        self.stdout.write(self.style.SUCCESS("Test de charge terminé."))
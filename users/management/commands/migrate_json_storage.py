@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from users.backends import JSONBackend, SQLiteBackend, USERS_FILE, GROUPS_FILE
+
+
+class Command(BaseCommand):
+    """
+    Copie les utilisateurs et les groupes des fichiers JSON vers une base SQLite.
+
+    La migration est faite en une seule fois : le contenu des tables est remplacé par celui
+    de `users.json` et `groups.json` (journaux compris). Il suffit ensuite de sélectionner
+    `users.backends.SQLiteBackend` dans le réglage `SPOTYNOV_STORAGE`.
+
+    **Utilisation** :
+    `python manage.py migrate_json_storage [--users-file F] [--groups-file F] [--database F]`
+    """
+    help = "Migre users.json et groups.json vers le stockage SQLite."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users-file", default=USERS_FILE, help="Fichier JSON des utilisateurs.")
+        parser.add_argument("--groups-file", default=GROUPS_FILE, help="Fichier JSON des groupes.")
+        parser.add_argument("--database", default=None, help="Base SQLite cible (par défaut celle de DATABASES).")
+
+    def handle(self, *args, **options):
+        source = JSONBackend(options["users_file"], options["groups_file"])
+        target = SQLiteBackend(options["database"])
+
+        users = source.load_users()
+        groups = source.load_groups()
+        with target.atomic():
+            target.save_users(users)
+            target.save_groups(groups)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(users)} utilisateurs et {len(groups)} groupes migrés vers {target.name}."
+        ))
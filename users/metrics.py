@@ -0,0 +1,197 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+
+# Valeurs par défaut du réglage `SPOTYNOV_METRICS`
+DEFAULT_METRICS_SETTINGS = {
+    "SERVER_TIMING": True,
+    "BUCKETS": (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+}
+
+# Descriptions des compteurs exposés par `render_prometheus`
+COUNTERS = {
+    "upstream_calls": "Appels envoyés à Spotify.",
+    "upstream_retries": "Nouvelles tentatives d'appels à Spotify (429, erreurs réseau ou 5xx).",
+    "cache_hits": "Succès des caches mémoire.",
+    "cache_misses": "Échecs des caches mémoire.",
+    "file_bytes_read": "Octets lus dans les fichiers du stockage JSON.",
+}
+
+
+def metrics_settings():
+    return {**DEFAULT_METRICS_SETTINGS, **getattr(settings, "SPOTYNOV_METRICS", {})}
+
+
+class RequestMetrics:
+    """
+    Mesures d'une requête : durée cumulée de chaque phase et compteurs.
+
+    Les mesures sont rattachées à la requête par une variable de contexte : elles suivent
+    la requête dans les coroutines et dans les threads du pool partagé (voir
+    `playback.ContextThreadPoolExecutor`). Les phases exécutées en parallèle s'additionnent.
+    """
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_count(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def server_timing(self, total):
+        """
+        Retourne la valeur de l'en-tête `Server-Timing` : durée de chaque phase et de la
+        requête (`total`) en millisecondes, puis les compteurs non nuls.
+        """
+        with self._lock:
+            entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.phases.items()]
+            entries.append(f"total;dur={total * 1000:.3f}")
+            entries.extend(f'{name};desc="{value}"' for name, value in self.counters.items() if value)
+        return ", ".join(entries)
+
+
+_current = ContextVar("spotynov_request_metrics", default=None)
+
+
+def current_metrics():
+    return _current.get()
+
+
+def start_request():
+    """
+    Rattache de nouvelles mesures au contexte courant.
+
+    **Retour** :
+    - Les mesures et le jeton à passer à `end_request`.
+    """
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+class Histogram:
+    """
+    Histogramme cumulatif au format Prometheus, une série par combinaison d'étiquettes.
+    """
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def count(name, value=1, **labels):
+    """
+    Incrémente un compteur de `COUNTERS`, pour le processus et pour la requête en cours.
+    """
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_count(name, value)
+
+
+def observe(name, seconds, **labels):
+    """
+    Ajoute une durée à l'histogramme `name` du processus.
+    """
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(metrics_settings()["BUCKETS"])
+        histogram.observe(seconds, tuple(sorted(labels.items())))
+
+
+@contextmanager
+def phase(name):
+    """
+    Mesure la durée du bloc et l'ajoute à la phase `name` de la requête en cours.
+
+    Hors requête (boucle de synchronisation, commandes), le bloc n'est pas mesuré.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_phase(name, time.perf_counter() - start)
+
+
+def record_request(metrics, view, total):
+    """
+    Ajoute les mesures d'une requête terminée aux histogrammes du processus : durée de la
+    requête par vue, et durée de chaque phase.
+    """
+    observe("request_duration_seconds", total, view=view)
+    for name, seconds in metrics.phases.items():
+        observe("request_phase_seconds", seconds, phase=name)
+
+
+def _labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    values = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in pairs
+    )
+    return "{" + values + "}"
+
+
+def render_prometheus(extra=None):
+    """
+    Retourne les mesures du processus au format texte de Prometheus.
+
+    **Paramètres** :
+    - `extra` (dict) : Mesures tenues ailleurs (régulateur, regroupement des requêtes),
+      ajoutées à l'exposition : `{name: (type, description, value)}`.
+    """
+    lines = []
+    with _lock:
+        for name, description in COUNTERS.items():
+            metric = f"spotynov_{name}_total"
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} counter"]
+            series = [(labels, value) for (counter, labels), value in _counters.items() if counter == name]
+            lines += [f"{metric}{_labels(labels)} {value}" for labels, value in series or [((), 0)]]
+
+        for name, histogram in sorted(_histograms.items()):
+            metric = f"spotynov_{name}"
+            lines += [f"# HELP {metric} Durée en secondes.", f"# TYPE {metric} histogram"]
+            for labels, (buckets, total, observations) in sorted(histogram.series.items()):
+                for bound, value in zip(histogram.buckets, buckets):
+                    lines.append(f"{metric}_bucket{_labels(labels, le=bound)} {value}")
+                lines.append(f"{metric}_bucket{_labels(labels, le='+Inf')} {observations}")
+                lines.append(f"{metric}_sum{_labels(labels)} {total}")
+                lines.append(f"{metric}_count{_labels(labels)} {observations}")
+
+    for name, (kind, description, value) in (extra or {}).items():
+        metric = f"spotynov_{name}"
+        lines += [f"# HELP {metric} {description}", f"# TYPE {metric} {kind}", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,57 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .metrics import end_request, metrics_settings, record_request, start_request
+
+
+class TimingMiddleware:
+    """
+    Mesure la durée de chaque requête et de ses phases.
+
+    Les mesures de la requête (`metrics.RequestMetrics`) sont rattachées à son contexte
+    pendant tout son traitement : authentification JWT (`jwt`), lecture des fichiers du
+    stockage (`parse_users`, `parse_groups`), attente de Spotify (`upstream`) et encodage
+    de la réponse (`render`), ainsi que les compteurs (appels à Spotify, nouvelles
+    tentatives, succès des caches, octets lus).
+
+    À la fin de la requête, les durées sont ajoutées aux histogrammes du processus (exposés
+    par `MetricsView`) et renvoyées au client dans l'en-tête `Server-Timing`, sauf si
+    `SERVER_TIMING` vaut `False` dans le réglage `SPOTYNOV_METRICS`. Le corps d'une réponse
+    en flux est produit après la mesure : il n'est pas compté.
+
+    Placé en tête de `MIDDLEWARE`, il fonctionne sous WSGI comme sous ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = metrics_settings()["SERVER_TIMING"]
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics, token = start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics, token = start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, total):
+        match = getattr(request, "resolver_match", None)
+        record_request(metrics, (match.url_name if match else None) or "unmatched", total)
+        if self.server_timing:
+            response["Server-Timing"] = metrics.server_timing(total)
+        return response
@@ -1,7 +1,8 @@
-import json
 import hashlib
 import os
 import random
+from .backends import get_storage
+from .signals import user_created, user_deleted, member_joined, member_left
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 USERS_FILE = os.path.join(BASE_DIR, "users.json")
@@ -9,30 +10,34 @@ GROUPS_FILE = "groups.json"
 
 class UserManager:
     """
-    Gestion des utilisateurs via un fichier JSON.
+    Gestion des utilisateurs via le moteur de stockage configuré.
     
-    Cette classe permet de gérer les utilisateurs en les stockant dans un fichier JSON.
+    Cette classe permet de gérer les utilisateurs en les stockant dans un fichier JSON
+    (par défaut) ou dans une base SQLite, selon le réglage `SPOTYNOV_STORAGE`.
     Elle offre des fonctionnalités pour la création, l'authentification et la récupération 
     des tokens Spotify des utilisateurs.
     
+    Avec le moteur JSON, les utilisateurs sont servis depuis une copie mémoire indexée par
+    nom d'utilisateur, et chaque création ajoute un enregistrement au journal `users.json.log`
+    au lieu de réécrire le fichier complet.
+    
     **Méthodes** :
-    - `load_users()`: Charge les utilisateurs depuis `users.json`.
-    - `save_users(users)`: Sauvegarde les utilisateurs dans `users.json`.
+    - `load_users()`: Retourne tous les utilisateurs.
+    - `save_users(users)`: Remplace tous les utilisateurs.
     - `create_user(username, password)`: Crée un nouvel utilisateur avec un mot de passe hashé.
+    - `delete_user(username)`: Supprime un utilisateur.
+    - `user_exists(username)`: Vérifie qu'un utilisateur existe.
     - `authenticate_user(username, password)`: Vérifie l'identité d'un utilisateur.
     - `get_spotify_tokens(username)`: Récupère les tokens Spotify d'un utilisateur.
+    - `get_user_version(username)`: Retourne la version de l'enregistrement d'un utilisateur.
     """
     @staticmethod
     def load_users():
-        if os.path.exists(USERS_FILE):
-            with open(USERS_FILE, "r") as f:
-                return json.load(f)
-        return {}
+        return get_storage().load_users()
 
     @staticmethod
     def save_users(users):
-        with open(USERS_FILE, "w") as f:
-            json.dump(users, f, indent=4)
+        get_storage().save_users(users)
 
     @staticmethod
     def create_user(username, password):
@@ -44,24 +49,59 @@ class UserManager:
         - `password` (str) : Mot de passe en clair, qui sera hashé avant stockage.
         
         **Processus** :
-        1. Charge la liste des utilisateurs existants.
-        2. Vérifie si l'utilisateur existe déjà.
-        3. Hash le mot de passe et stocke l'utilisateur.
-        4. Sauvegarde la nouvelle liste des utilisateurs.
+        1. Vérifie si l'utilisateur existe déjà.
+        2. Hash le mot de passe et stocke l'utilisateur.
         
         **Retour** :
         - Message de succès si l'utilisateur est créé.
         - Message d'erreur si l'utilisateur existe déjà.
         """
-        users = UserManager.load_users()
-        if username in users:
-            return {"error": "Utilisateur déjà existant."}
+        storage = get_storage()
+        with storage.atomic():
+            if storage.get_user(username) is not None:
+                return {"error": "Utilisateur déjà existant."}
 
-        hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        users[username] = {"password": hashed_password}
-        UserManager.save_users(users)
+            hashed_password = hashlib.sha256(password.encode()).hexdigest()
+            storage.put_user(username, {"password": hashed_password})
+
+        user_created.send(sender=UserManager, username=username)
         return {"message": "Utilisateur créé avec succès."}
 
+    @staticmethod
+    def delete_user(username):
+        """
+        Supprime un utilisateur.
+        
+        **Paramètres** :
+        - `username` (str) : Nom d'utilisateur à supprimer.
+        
+        **Retour** :
+        - Message de succès si l'utilisateur est supprimé.
+        - Message d'erreur si l'utilisateur n'existe pas.
+        """
+        storage = get_storage()
+        with storage.atomic():
+            if storage.get_user(username) is None:
+                return {"error": "Utilisateur introuvable."}
+
+            storage.delete_user(username)
+
+        user_deleted.send(sender=UserManager, username=username)
+        return {"message": "Utilisateur supprimé avec succès."}
+
+    @staticmethod
+    def user_exists(username):
+        """
+        Vérifie qu'un utilisateur existe, sans contrôler de mot de passe.
+        
+        **Paramètres** :
+        - `username` (str) : Nom d'utilisateur recherché.
+        
+        **Retour** :
+        - `True` si l'utilisateur existe, `False` sinon.
+        """
+        return get_storage().get_user(username) is not None
+
     @staticmethod
     def authenticate_user(username, password):
         """
@@ -72,7 +112,7 @@ class UserManager:
         - `password` (str) : Mot de passe en clair à comparer avec le hash stocké.
         
         **Processus** :
-        1. Charge la liste des utilisateurs.
+        1. Récupère l'utilisateur dans le stockage.
         2. Vérifie si l'utilisateur existe.
         3. Hash le mot de passe fourni et compare avec celui enregistré.
         4. Retourne l'utilisateur si l'authentification est réussie.
@@ -81,12 +121,12 @@ class UserManager:
         - Dictionnaire contenant `username` si l'authentification réussit.
         - `None` si l'authentification échoue.
         """
-        users = UserManager.load_users()
-        if username not in users:
+        user = get_storage().get_user(username)
+        if user is None:
             return None  
 
         hashed_password = hashlib.sha256(password.encode()).hexdigest()
-        if users[username]["password"] != hashed_password:
+        if user.get("password") != hashed_password:
             return None  
 
         return {"username": username}
@@ -100,76 +140,128 @@ class UserManager:
         - `username` (str) : Nom d'utilisateur dont on veut récupérer les tokens Spotify.
         
         **Processus** :
-        1. Charge la liste des utilisateurs.
+        1. Récupère l'utilisateur dans le stockage.
         2. Vérifie si l'utilisateur possède des tokens Spotify.
         3. Retourne les tokens ou `None` si absents.
         
         **Retour** :
-        - Un dictionnaire contenant `access_token` et `refresh_token` si disponibles.
+        - Un dictionnaire contenant `access_token`, `refresh_token` et `expires_at`
+          (timestamp, ou `None` si inconnu) si disponibles.
         - `None` si les tokens n'existent pas.
         """
-        users = UserManager.load_users()
-        if username in users and "spotify_access_token" in users[username]:
+        user = get_storage().get_user(username)
+        if user is not None and "spotify_access_token" in user:
             return {
-                "access_token": users[username]["spotify_access_token"],
-                "refresh_token": users[username]["spotify_refresh_token"]
+                "access_token": user["spotify_access_token"],
+                "refresh_token": user["spotify_refresh_token"],
+                "expires_at": user.get("spotify_token_expires_at"),
             }
         return None
 
+    @staticmethod
+    def get_user_version(username):
+        """
+        Retourne la version `(numéro, date de modification)` de l'enregistrement d'un
+        utilisateur, sans le charger (voir `BaseBackend`).
+        """
+        return get_storage().user_version(username)
+
 class GroupManager:
     """
-    Gestion des groupes via un fichier JSON.
+    Gestion des groupes via le moteur de stockage configuré.
     
     Cette classe permet de créer, gérer et supprimer des groupes d'utilisateurs.
-    Les groupes sont stockés dans un fichier JSON.
+    Les groupes sont stockés dans un fichier JSON (par défaut) ou dans une base SQLite,
+    selon le réglage `SPOTYNOV_STORAGE`.
+    
+    Les deux moteurs indexent les membres par utilisateur : la recherche du groupe d'un
+    utilisateur, la vérification d'appartenance et le retrait d'un membre ne parcourent pas
+    l'ensemble des groupes. Avec le moteur JSON, chaque modification n'ajoute que le groupe
+    concerné au journal `groups.json.log`.
     
     **Méthodes** :
-    - `load_groups()`: Charge les groupes depuis `groups.json`.
-    - `save_groups(groups)`: Sauvegarde les groupes dans `groups.json`.
+    - `load_groups()`: Retourne tous les groupes.
+    - `save_groups(groups)`: Remplace tous les groupes.
+    - `get_group(group_name)`: Retourne un groupe.
     - `get_user_group(username)`: Trouve le groupe auquel appartient un utilisateur.
     - `leave_group(username)`: Permet à un utilisateur de quitter un groupe.
     - `create_group(group_name, creator)`: Crée un groupe avec un administrateur.
     - `join_group(group_name, username)`: Ajoute un utilisateur à un groupe existant.
+    - `get_groups_version()`: Retourne la version de l'ensemble des groupes.
+    - `get_group_version(group_name)`: Retourne la version d'un groupe.
+    - `get_group_changes(since, count)`: Retourne les modifications postérieures à une version.
     """
     @staticmethod
     def load_groups():
         """
-        Charge les groupes depuis le fichier `groups.json`.
+        Retourne tous les groupes.
         
         **Processus** :
-        1. Vérifie si `groups.json` existe, sinon le crée.
-        2. Lit et charge le contenu JSON du fichier.
-        3. Retourne les groupes sous forme de dictionnaire.
+        1. Avec le moteur JSON, lit `groups.json` et rejoue son journal au premier appel,
+           puis uniquement les enregistrements ajoutés par un autre processus.
+        2. Retourne les groupes sous forme de dictionnaire.
         
         **Retour** :
         - Un dictionnaire contenant les groupes et leurs membres.
-        - Un dictionnaire vide si le fichier est inexistant ou corrompu.
+        - Un dictionnaire vide si le stockage est vide ou corrompu.
         """
-        if not os.path.exists(GROUPS_FILE):
-            with open(GROUPS_FILE, "w") as f:
-                json.dump({}, f)
-
-        try:
-            with open(GROUPS_FILE, "r") as f:
-                data = f.read().strip()
-                return json.loads(data) if data else {}
-        except json.JSONDecodeError:
-            return {}
+        return get_storage().load_groups()
 
     @staticmethod
     def save_groups(groups):
         """
-        Sauvegarde les groupes dans `groups.json`.
+        Remplace tous les groupes.
         
         **Processus** :
-        1. Ouvre `groups.json` en mode écriture.
-        2. Écrit les groupes avec une indentation pour lisibilité.
+        1. Remplace les groupes et reconstruit l'index des membres.
+        2. Avec le moteur JSON, réécrit `groups.json` et vide son journal.
+        """
+        get_storage().save_groups(groups)
+
+    @staticmethod
+    def get_group(group_name):
+        """
+        Retourne un groupe sans charger les autres.
         
-        **Erreurs possibles** :
-        - Affiche un message si l'écriture échoue.
+        **Paramètres** :
+        - `group_name` (str) : Nom du groupe recherché.
+        
+        **Retour** :
+        - Un dictionnaire contenant `members` et `admin`.
+        - `None` si le groupe n'existe pas.
         """
-        with open(GROUPS_FILE, "w") as f:
-            json.dump(groups, f, indent=4)
+        return get_storage().get_group(group_name)
+
+    @staticmethod
+    def get_groups_version():
+        """
+        Retourne la version `(numéro, date de modification)` de l'ensemble des groupes, sans
+        les charger.
+        """
+        return get_storage().groups_version()
+
+    @staticmethod
+    def get_group_version(group_name):
+        """
+        Retourne la version `(numéro, date de modification)` d'un groupe, sans le charger.
+        """
+        return get_storage().group_version(group_name)
+
+    @staticmethod
+    def get_group_changes(since, count):
+        """
+        Retourne les modifications de groupes postérieures à une version des groupes.
+        
+        **Paramètres** :
+        - `since` (int) : Version des groupes déjà connue du client.
+        - `count` (int) : Nombre maximum de modifications retournées.
+        
+        **Retour** :
+        - Une liste de tuples `(version, op, nom, groupe)`, dans l'ordre des versions ; `op`
+          vaut `put` (groupe créé ou modifié) ou `del` (groupe supprimé, `groupe` vaut `None`).
+        - `None` si les modifications postérieures à `since` ne sont plus toutes conservées.
+        """
+        return get_storage().group_changes(since, count)
 
     @staticmethod
     def get_user_group(username):
@@ -183,11 +275,7 @@ class GroupManager:
         - Le nom du groupe si l'utilisateur en fait partie.
         - `None` si l'utilisateur n'appartient à aucun groupe.
         """
-        groups = GroupManager.load_groups()
-        for group, data in groups.items():
-            if "members" in data and username in data["members"]:
-                return group
-        return None
+        return get_storage().get_user_group(username)
 
     @staticmethod
     def leave_group(username):
@@ -201,21 +289,25 @@ class GroupManager:
         - Message confirmant le départ de l'utilisateur.
         - Message d'erreur si l'utilisateur n'appartient à aucun groupe.
         """
-        groups = GroupManager.load_groups()
-        user_group = GroupManager.get_user_group(username)
+        storage = get_storage()
+        with storage.atomic():
+            user_group = storage.get_user_group(username)
 
-        if not user_group:
-            return {"error": "L'utilisateur n'appartient à aucun groupe."}
+            if not user_group:
+                return {"error": "L'utilisateur n'appartient à aucun groupe."}
 
-        groups[user_group]["members"].remove(username)
+            group = dict(storage.get_group(user_group))
+            group["members"] = [member for member in group["members"] if member != username]
 
-        if not groups[user_group]["members"]:
-            del groups[user_group]
-        elif "admin" in groups[user_group] and groups[user_group]["admin"] == username:
-            groups[user_group]["admin"] = random.choice(groups[user_group]["members"])
-
-        GroupManager.save_groups(groups)
+            if not group["members"]:
+                storage.delete_group(user_group)
+                group = None
+            else:
+                if "admin" in group and group["admin"] == username:
+                    group["admin"] = random.choice(group["members"])
+                storage.put_group(user_group, group)
 
+        member_left.send(sender=GroupManager, group_name=user_group, username=username, group=group)
         return {"message": f"{username} a quitté le groupe '{user_group}'."}
 
     @staticmethod
@@ -231,17 +323,15 @@ class GroupManager:
         - Message confirmant la création du groupe.
         - Message d'erreur si le groupe existe déjà.
         """
-        groups = GroupManager.load_groups()
-
-        if group_name in groups:
-            return {"error": "Ce groupe existe déjà."}
+        storage = get_storage()
+        with storage.atomic():
+            if storage.get_group(group_name) is not None:
+                return {"error": "Ce groupe existe déjà."}
 
-        groups[group_name] = {
-            "members": [creator],
-            "admin": creator
-        }
-        GroupManager.save_groups(groups)
+            group = {"members": [creator], "admin": creator}
+            storage.put_group(group_name, group)
 
+        member_joined.send(sender=GroupManager, group_name=group_name, username=creator, group=group)
         return {"message": f"Groupe '{group_name}' créé avec succès.", "admin": creator}
 
     @staticmethod
@@ -257,15 +347,18 @@ class GroupManager:
         - Message confirmant l'ajout de l'utilisateur.
         - Message d'erreur si le groupe n'existe pas ou si l'utilisateur est déjà membre.
         """
-        groups = GroupManager.load_groups()
-
-        if group_name not in groups:
-            return {"error": "Ce groupe n'existe pas."}
+        storage = get_storage()
+        with storage.atomic():
+            group = storage.get_group(group_name)
+            if group is None:
+                return {"error": "Ce groupe n'existe pas."}
 
-        if username in groups[group_name]["members"]:
-            return {"error": f"L'utilisateur {username} est déjà dans le groupe."}
+            if storage.is_member(group_name, username):
+                return {"error": f"L'utilisateur {username} est déjà dans le groupe."}
 
-        groups[group_name]["members"].append(username)
-        GroupManager.save_groups(groups)
+            group = dict(group)
+            group["members"] = group.get("members", []) + [username]
+            storage.put_group(group_name, group)
 
+        member_joined.send(sender=GroupManager, group_name=group_name, username=username, group=group)
         return {"message": f"{username} a rejoint le groupe '{group_name}'."}
\ No newline at end of file
@@ -0,0 +1,452 @@
+import asyncio
+from bisect import bisect_right
+from collections import Counter
+import requests
+from django.conf import settings
+from django.dispatch import receiver
+from .cache import TTLCache
+from .playback import get_executor, DEFAULT_SYNC_CONCURRENCY
+from .ratelimit import BACKGROUND
+from .spotify import AsyncRequestError
+from .signals import user_deleted
+
+try:
+    import numpy as np
+except ImportError:  # Statistiques calculées en Python pur, plus lentement
+    np = None
+
+PERSONALITY_CACHE_SETTINGS = getattr(settings, "SPOTYNOV_PERSONALITY_CACHE", {})
+
+# Profils musicaux déjà calculés, par nom d'utilisateur :
+# `{"etags": {...}, "profile": {...}, "contribution": {...}}`
+PERSONALITY_CACHE = TTLCache(
+    max_size=PERSONALITY_CACHE_SETTINGS.get("MAX_SIZE", 10000),
+    ttl=PERSONALITY_CACHE_SETTINGS.get("TTL", 3600),
+    name="personality",
+)
+
+# En-tête indiquant au client l'origine de la réponse : `HIT`, `REVALIDATED`, `MISS` ou
+# `BYPASS` (profil calculé avec un token fourni par l'appelant, jamais mis en cache)
+CACHE_STATUS_HEADER = "X-Cache"
+
+TOP_TRACKS_PATH = "/me/top/tracks"
+AUDIO_FEATURES_PATH = "/audio-features"
+ARTISTS_PATH = "/artists"
+
+# Périodes d'écoute analysées (court, moyen et long terme)
+TIME_RANGES = ("short_term", "medium_term", "long_term")
+
+# Tailles maximales acceptées par Spotify pour une page de titres et un lot d'identifiants
+PAGE_SIZE = 50
+AUDIO_FEATURES_BATCH = 100
+ARTISTS_BATCH = 50
+
+# Caractéristiques audio décrites dans le profil
+AUDIO_FEATURES = (
+    "danceability", "energy", "valence", "acousticness", "instrumentalness",
+    "liveness", "speechiness", "tempo", "loudness",
+)
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10
+TOP_GENRES = 20
+
+
+class UpstreamError(Exception):
+    """
+    Réponse inattendue de Spotify pendant la collecte de l'historique d'écoute.
+
+    `response` vaut `None` si l'utilisateur n'a pas de token Spotify.
+    """
+    def __init__(self, response):
+        super().__init__("Réponse inattendue de Spotify")
+        self.response = response
+
+
+# Erreurs interrompant la collecte de l'historique d'un utilisateur
+FETCH_ERRORS = (UpstreamError, requests.RequestException, AsyncRequestError)
+
+
+def _page_params(time_range, offset=0):
+    return {"time_range": time_range, "limit": PAGE_SIZE, "offset": offset}
+
+
+def _batches(ids, size):
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
+
+
+def _json(response):
+    if response is None or response.status_code != 200:
+        raise UpstreamError(response)
+    return response.json()
+
+
+def _collect(etags):
+    """
+    Décrit la collecte de l'historique d'écoute d'un utilisateur.
+
+    Ce générateur produit, à chaque étape, la liste des requêtes `(path, params, headers)`
+    à envoyer en parallèle, et reçoit la liste de leurs réponses :
+    1. la première page des trois périodes (conditionnelle si `etags` est fourni) ;
+    2. toutes les pages restantes des trois périodes ;
+    3. les caractéristiques audio (par lots de 100) et les artistes (par lots de 50).
+
+    Il retourne `None` si Spotify confirme (304) que les trois périodes sont inchangées.
+    """
+    responses = yield [
+        (TOP_TRACKS_PATH, _page_params(time_range), {"If-None-Match": etags[time_range]})
+        if etags.get(time_range) else (TOP_TRACKS_PATH, _page_params(time_range), None)
+        for time_range in TIME_RANGES
+    ]
+    firsts = dict(zip(TIME_RANGES, responses))
+
+    if etags and all(response is not None and response.status_code == 304 for response in firsts.values()):
+        return None
+
+    # Une période inchangée doit être relue si une autre a changé : le profil est recalculé
+    unchanged = [
+        time_range for time_range, response in firsts.items()
+        if response is not None and response.status_code == 304
+    ]
+    if unchanged:
+        responses = yield [(TOP_TRACKS_PATH, _page_params(time_range), None) for time_range in unchanged]
+        firsts.update(zip(unchanged, responses))
+
+    pages = {time_range: [_json(response)] for time_range, response in firsts.items()}
+    new_etags = {time_range: response.headers.get("ETag") for time_range, response in firsts.items()}
+
+    remaining = [
+        (time_range, _page_params(time_range, offset))
+        for time_range in TIME_RANGES
+        for offset in range(PAGE_SIZE, pages[time_range][0].get("total", 0), PAGE_SIZE)
+    ]
+    responses = yield [(TOP_TRACKS_PATH, params, None) for _, params in remaining]
+    for (time_range, _), response in zip(remaining, responses):
+        pages[time_range].append(_json(response))
+
+    # Les fichiers locaux n'ont pas d'identifiant Spotify : ils sont ignorés
+    ranges = {
+        time_range: [
+            track for page in pages[time_range] for track in page.get("items", [])
+            if track and track.get("id")
+        ]
+        for time_range in TIME_RANGES
+    }
+    tracks = {track["id"]: track for time_range in TIME_RANGES for track in ranges[time_range]}
+    artist_ids = list(dict.fromkeys(
+        artist["id"] for track in tracks.values() for artist in track.get("artists", []) if artist.get("id")
+    ))
+
+    feature_batches = _batches(list(tracks), AUDIO_FEATURES_BATCH)
+    artist_batches = _batches(artist_ids, ARTISTS_BATCH)
+    responses = yield (
+        [(AUDIO_FEATURES_PATH, {"ids": ",".join(batch)}, None) for batch in feature_batches]
+        + [(ARTISTS_PATH, {"ids": ",".join(batch)}, None) for batch in artist_batches]
+    )
+
+    # Caractéristiques audio et genres sont facultatifs : un lot en échec est ignoré
+    features, artists = {}, {}
+    for response in responses[:len(feature_batches)]:
+        if response is not None and response.status_code == 200:
+            features.update((item["id"], item) for item in response.json().get("audio_features", []) if item)
+    for response in responses[len(feature_batches):]:
+        if response is not None and response.status_code == 200:
+            artists.update((item["id"], item) for item in response.json().get("artists", []) if item)
+
+    return {
+        "ranges": {time_range: [track["id"] for track in ranges[time_range]] for time_range in TIME_RANGES},
+        "tracks": tracks,
+        "audio_features": features,
+        "artists": artists,
+        "etags": new_etags,
+    }
+
+
+def _advance(steps, pending, results):
+    """
+    Fait avancer chaque collecte avec les réponses (ou l'erreur réseau) de son étape
+    précédente, et retourne les requêtes de l'étape suivante par clé.
+    """
+    requests_by_key = {}
+    for key, responses in pending.items():
+        try:
+            if isinstance(responses, Exception):
+                requests_by_key[key] = steps[key].throw(responses)
+            else:
+                requests_by_key[key] = steps[key].send(responses)
+        except StopIteration as done:
+            results[key] = done.value
+        except FETCH_ERRORS as error:
+            results[key] = error
+    return requests_by_key
+
+
+def fetch_histories(gets, etags=None):
+    """
+    Collecte l'historique d'écoute complet de plusieurs utilisateurs.
+
+    Les collectes avancent ensemble : les requêtes de l'étape courante de tous les
+    utilisateurs sont envoyées simultanément sur le pool des collectes
+    (`playback.get_executor(BACKGROUND)`), distinct de celui des commandes de lecture.
+
+    **Paramètres** :
+    - `gets` (dict) : Par clé (nom d'utilisateur), fonction `get(path, params, headers)`
+      retournant la réponse de Spotify, ou `None` si l'utilisateur n'a pas de token.
+    - `etags` (dict) : Par clé, ETag de la première page de chaque période, pour une
+      revalidation.
+
+    **Retour** :
+    - Dictionnaire associant à chaque clé l'historique collecté, `None` si Spotify confirme
+      qu'il est inchangé, ou l'erreur (`UpstreamError` ou erreur réseau) ayant interrompu
+      sa collecte.
+    """
+    executor = get_executor(BACKGROUND)
+    etags = etags or {}
+    steps = {key: _collect(etags.get(key) or {}) for key in gets}
+    pending = dict.fromkeys(steps)
+    results = {}
+
+    def responses(futures):
+        try:
+            return [future.result() for future in futures]
+        except FETCH_ERRORS as error:
+            return error
+
+    while pending:
+        futures = {
+            key: [executor.submit(gets[key], *request) for request in batch]
+            for key, batch in _advance(steps, pending, results).items()
+        }
+        pending = {key: responses(key_futures) for key, key_futures in futures.items()}
+    return results
+
+
+def fetch_history(get, etags=None):
+    """
+    Collecte l'historique d'écoute complet d'un utilisateur (voir `fetch_histories`).
+
+    **Retour** :
+    - L'historique collecté, ou `None` si Spotify confirme qu'il est inchangé.
+
+    **Exceptions** :
+    - `UpstreamError` : Si Spotify refuse de retourner les titres les plus écoutés.
+    - `requests.RequestException` : Si Spotify est injoignable.
+    """
+    result = fetch_histories({None: get}, {None: etags})[None]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+async def afetch_histories(gets, etags=None):
+    """
+    Équivalent asynchrone de `fetch_histories` : chaque `get` retourne une coroutine, et au
+    plus `SPOTIFY_SYNC_CONCURRENCY` requêtes sont en cours à la fois.
+    """
+    semaphore = asyncio.Semaphore(getattr(settings, "SPOTIFY_SYNC_CONCURRENCY", DEFAULT_SYNC_CONCURRENCY))
+    etags = etags or {}
+    steps = {key: _collect(etags.get(key) or {}) for key in gets}
+    pending = dict.fromkeys(steps)
+    results = {}
+
+    async def send(get, request):
+        async with semaphore:
+            return await get(*request)
+
+    async def responses(key, batch):
+        try:
+            return await asyncio.gather(*(send(gets[key], request) for request in batch))
+        except FETCH_ERRORS as error:
+            return error
+
+    while pending:
+        requests_by_key = _advance(steps, pending, results)
+        values = await asyncio.gather(*(responses(key, batch) for key, batch in requests_by_key.items()))
+        pending = dict(zip(requests_by_key, values))
+    return results
+
+
+async def afetch_history(get, etags=None):
+    """
+    Équivalent asynchrone de `fetch_history`.
+    """
+    result = (await afetch_histories({None: get}, {None: etags}))[None]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def _percentile(ordered, q):
+    # Interpolation linéaire, comme `numpy.percentile`
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _histogram(ordered):
+    # Intervalles de même largeur entre le minimum et le maximum, comme `numpy.histogram`
+    low, high = ordered[0], ordered[-1]
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    width = (high - low) / HISTOGRAM_BINS
+    edges = [low + width * index for index in range(HISTOGRAM_BINS)] + [high]
+    counts = [0] * HISTOGRAM_BINS
+    for value in ordered:
+        counts[min(bisect_right(edges, value) - 1, HISTOGRAM_BINS - 1)] += 1
+    return edges, counts
+
+
+def describe(columns):
+    """
+    Décrit chaque série de valeurs : moyenne, percentiles et distribution.
+
+    Avec NumPy, les moyennes et percentiles de toutes les séries sont calculés en une
+    opération sur une matrice (titres × séries), les valeurs manquantes valant `NaN`.
+
+    **Paramètres** :
+    - `columns` (dict) : Valeurs par nom de série ; `None` pour une valeur manquante.
+
+    **Retour** :
+    - Dictionnaire `{série: {"count", "mean", "percentiles", "distribution"}}`, sans les
+      séries vides.
+    """
+    names = [name for name, values in columns.items() if any(value is not None for value in values)]
+    if not names:
+        return {}
+
+    summary = {}
+    if np is not None:
+        matrix = np.array(
+            [[np.nan if value is None else value for value in columns[name]] for name in names], dtype=float
+        ).T
+        present = ~np.isnan(matrix)
+        means = np.nanmean(matrix, axis=0)
+        percentiles = np.nanpercentile(matrix, PERCENTILES, axis=0)
+        for index, name in enumerate(names):
+            counts, edges = np.histogram(matrix[present[:, index], index], bins=HISTOGRAM_BINS)
+            summary[name] = {
+                "count": int(present[:, index].sum()),
+                "mean": float(means[index]),
+                "percentiles": {f"p{q}": float(percentiles[row, index]) for row, q in enumerate(PERCENTILES)},
+                "distribution": {"edges": edges.tolist(), "counts": counts.tolist()},
+            }
+        return summary
+
+    for name in names:
+        ordered = sorted(value for value in columns[name] if value is not None)
+        edges, counts = _histogram(ordered)
+        summary[name] = {
+            "count": len(ordered),
+            "mean": sum(ordered) / len(ordered),
+            "percentiles": {f"p{q}": _percentile(ordered, q) for q in PERCENTILES},
+            "distribution": {"edges": edges, "counts": counts},
+        }
+    return summary
+
+
+def analyse_history(username, history):
+    """
+    Calcule le profil musical d'un utilisateur à partir de son historique d'écoute.
+
+    **Retour** :
+    - Dictionnaire avec `username`, `popularity_average` et `duration_average` (sur
+      l'ensemble des titres distincts), le nombre de titres par période, la description
+      statistique de la popularité, de la durée et des caractéristiques audio, et
+      l'histogramme des genres les plus représentés.
+    - Un message si l'utilisateur n'a aucun titre.
+    """
+    tracks = list(history["tracks"].values())
+    if not tracks:
+        return {"message": "Aucun titre liké"}
+
+    features = history["audio_features"]
+    columns = {
+        "popularity": [track.get("popularity") for track in tracks],
+        "duration_ms": [track.get("duration_ms") for track in tracks],
+    }
+    for name in AUDIO_FEATURES:
+        columns[name] = [features.get(track["id"], {}).get(name) for track in tracks]
+    statistics = describe(columns)
+
+    genres = genre_counts(history)
+
+    return {
+        "username": username,
+        "popularity_average": statistics.get("popularity", {}).get("mean"),
+        "duration_average": statistics.get("duration_ms", {}).get("mean"),
+        "track_count": len(tracks),
+        "time_ranges": {time_range: len(ids) for time_range, ids in history["ranges"].items()},
+        "statistics": statistics,
+        "genres": dict(genres.most_common(TOP_GENRES)),
+    }
+
+
+def genre_counts(history):
+    """
+    Compte les genres des artistes de chaque titre distinct de l'historique.
+    """
+    return Counter(
+        genre
+        for track in history["tracks"].values()
+        for artist in track.get("artists", [])
+        for genre in history["artists"].get(artist.get("id"), {}).get("genres", [])
+    )
+
+
+def contribution(profile, genres):
+    """
+    Retourne la contribution additive d'un profil à un profil de groupe.
+
+    Les moyennes du profil sont converties en sommes (moyenne × nombre de valeurs) : les
+    contributions de plusieurs membres s'ajoutent et se retranchent sans recalcul.
+
+    **Paramètres** :
+    - `profile` (dict) : Profil retourné par `analyse_history`.
+    - `genres` (Counter) : Nombre de titres par genre (sans limite de `TOP_GENRES`).
+    """
+    statistics = profile.get("statistics", {})
+    return {
+        "tracks": profile.get("track_count", 0),
+        "sums": {name: summary["mean"] * summary["count"] for name, summary in statistics.items()},
+        "counts": {name: summary["count"] for name, summary in statistics.items()},
+        "genres": dict(genres),
+    }
+
+
+def cached_etags(entry):
+    """
+    Retourne les ETag d'une entrée expirée, pour revalider le profil auprès de Spotify.
+    """
+    return entry.get("etags") if entry is not None else None
+
+
+def update_cache(username, entry, history):
+    """
+    Met à jour le cache d'un utilisateur avec son historique d'écoute.
+
+    **Paramètres** :
+    - `username` (str) : Nom d'utilisateur.
+    - `entry` (dict) : Entrée expirée ayant servi à la revalidation, ou `None`.
+    - `history` (dict) : Historique collecté, ou `None` si Spotify l'a confirmé inchangé.
+
+    **Retour** :
+    - `(entrée, statut)` où `statut` vaut `REVALIDATED` ou `MISS`.
+    """
+    if history is None and entry is not None:
+        PERSONALITY_CACHE.set(username, entry)
+        return entry, "REVALIDATED"
+
+    profile = analyse_history(username, history)
+    entry = {
+        "etags": history["etags"],
+        "profile": profile,
+        "contribution": contribution(profile, genre_counts(history)),
+    }
+    PERSONALITY_CACHE.set(username, entry)
+    return entry, "MISS"
+
+
+@receiver(user_deleted)
+def invalidate_personality(sender, username, **kwargs):
+    PERSONALITY_CACHE.invalidate(username)
@@ -0,0 +1,111 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+from .ratelimit import BACKGROUND, INTERACTIVE
+from .spotify import get_spotify_client
+from .tokens import token_manager
+
+# Nombre maximum de commandes de lecture envoyées en parallèle par worker
+DEFAULT_SYNC_CONCURRENCY = 16
+
+# Nombre maximum de requêtes de collecte d'historique envoyées en parallèle par worker
+DEFAULT_BACKGROUND_CONCURRENCY = 8
+
+# Réglage de la taille et préfixe des threads du pool de chaque priorité
+EXECUTOR_SETTINGS = {
+    INTERACTIVE: ("SPOTIFY_SYNC_CONCURRENCY", DEFAULT_SYNC_CONCURRENCY, "spotify-sync"),
+    BACKGROUND: ("SPOTIFY_BACKGROUND_CONCURRENCY", DEFAULT_BACKGROUND_CONCURRENCY, "spotify-background"),
+}
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """
+    Pool de threads qui exécute chaque tâche dans une copie du contexte de l'appelant :
+    les appels à Spotify faits pour une requête sont comptés dans ses mesures
+    (voir `metrics.RequestMetrics`).
+    """
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def get_executor(priority=INTERACTIVE):
+    """
+    Retourne le pool de threads partagé des envois vers Spotify d'une priorité.
+
+    Sa taille (`SPOTIFY_SYNC_CONCURRENCY` pour les commandes de lecture,
+    `SPOTIFY_BACKGROUND_CONCURRENCY` pour les collectes d'historique) borne le nombre de
+    requêtes simultanées d'un worker, quel que soit le nombre de groupes synchronisés en
+    même temps. Chaque priorité a son propre pool : des collectes qui attendent leur tour
+    auprès du régulateur (`RateLimiter.acquire`) n'occupent pas les threads des commandes
+    de lecture, qui atteignent donc le régulateur et y passent en premier.
+
+    **Paramètres** :
+    - `priority` (int) : `INTERACTIVE` ou `BACKGROUND`.
+    """
+    executor = _executors.get(priority)
+    if executor is None:
+        with _executor_lock:
+            executor = _executors.get(priority)
+            if executor is None:
+                setting, default, prefix = EXECUTOR_SETTINGS[priority]
+                executor = _executors[priority] = ContextThreadPoolExecutor(
+                    max_workers=getattr(settings, setting, default), thread_name_prefix=prefix,
+                )
+    return executor
+
+
+def play_for_member(member, track_uri, position_ms):
+    """
+    Lance un titre sur le compte Spotify d'un membre, avec son propre token (renouvelé
+    par `token_manager` s'il arrive à expiration).
+
+    **Paramètres** :
+    - `member` (str) : Nom d'utilisateur du membre.
+    - `track_uri` (str) : URI Spotify du titre à lancer.
+    - `position_ms` (int) : Position de lecture en millisecondes.
+
+    **Retour** :
+    - Dictionnaire décrivant le résultat : `member`, `status` (`synced`, `no_token` ou
+      `error`), `status_code` de Spotify et `latency_ms` de l'appel.
+    """
+    start = time.perf_counter()
+    try:
+        response = token_manager.call(member, lambda token: get_spotify_client().put(
+            "/me/player/play", token, json={"uris": [track_uri], "position_ms": position_ms}
+        ))
+        if response is None:
+            return {"member": member, "status": "no_token", "status_code": None, "latency_ms": 0.0}
+        status_code = response.status_code
+        result = "synced" if status_code < 300 else "error"
+    except requests.RequestException:
+        status_code = None
+        result = "error"
+
+    latency_ms = round((time.perf_counter() - start) * 1000, 1)
+    return {"member": member, "status": result, "status_code": status_code, "latency_ms": latency_ms}
+
+
+def sync_members(members, track_uri, position_ms):
+    """
+    Envoie la commande de lecture à tous les membres en parallèle.
+
+    Les appels sont répartis sur le pool partagé (`get_executor()`) : la durée totale est
+    celle de l'appel le plus lent plutôt que la somme des appels.
+
+    **Paramètres** :
+    - `members` (list) : Noms d'utilisateur des membres à synchroniser.
+    - `track_uri` (str) : URI Spotify du titre à lancer.
+    - `position_ms` (int) : Position de lecture en millisecondes.
+
+    **Retour** :
+    - Liste des résultats de `play_for_member`, dans l'ordre des membres.
+    """
+    executor = get_executor()
+    futures = [executor.submit(play_for_member, member, track_uri, position_ms) for member in members]
+    return [future.result() for future in futures]
@@ -0,0 +1,225 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# Priorités des appels à Spotify : les plus petites passent en premier
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# Valeurs par défaut du réglage `SPOTIFY_RATE_LIMIT`
+DEFAULT_RATE_LIMIT_SETTINGS = {
+    "RATE": 10,
+    "BURST": 20,
+    "MAX_WAIT": 30,
+    "RETRIES": 3,
+}
+
+# Attente appliquée après un 429 sans en-tête `Retry-After`
+DEFAULT_RETRY_AFTER = 1.0
+
+# Intervalle de réveil d'une requête asynchrone qui n'est pas en tête de file
+ASYNC_POLL_INTERVAL = 0.05
+
+
+class RateLimitExceeded(requests.RequestException):
+    """
+    Levée quand une requête attend son tour plus de `max_wait` secondes.
+
+    Les vues la traitent comme une erreur réseau : Spotify est considéré injoignable.
+    """
+
+
+class RateLimiter:
+    """
+    Régulateur des appels à Spotify, partagé par tous les threads d'un processus.
+
+    Les requêtes consomment un jeton d'un seau rempli à `rate` jetons par seconde (au plus
+    `burst`). Quand Spotify répond 429, plus aucune requête ne part avant la fin du délai
+    `Retry-After` (`throttle()`). Les requêtes en attente forment une file ordonnée par
+    priorité puis par ordre d'arrivée : une synchronisation (`INTERACTIVE`) passe devant une
+    collecte d'historique (`BACKGROUND`).
+
+    **Paramètres** :
+    - `rate` (float) : Débit maximal, en requêtes par seconde.
+    - `burst` (int) : Nombre de requêtes pouvant partir d'un coup.
+    - `max_wait` (float) : Attente maximale d'une requête, en secondes.
+    - `retries` (int) : Nombre de nouvelles tentatives après un 429.
+
+    **Méthodes** :
+    - `acquire(priority)`: Attend le tour d'une requête.
+    - `aacquire(priority)`: Équivalent asynchrone de `acquire`.
+    - `throttle(retry_after)`: Suspend les requêtes pendant `retry_after` secondes.
+    - `stats()`: Retourne la profondeur de la file et les compteurs du régulateur.
+    """
+    def __init__(self, rate=10, burst=20, max_wait=30, retries=3):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_wait = max_wait
+        self.retries = retries
+        self.throttled = 0
+        self.rejected = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _poll(self, ticket):
+        """
+        Tente de faire partir la requête `ticket` (verrou tenu).
+
+        Retourne `0` si elle part, le délai avant qu'elle puisse partir si elle est en tête
+        de file, ou `None` si d'autres requêtes la précèdent.
+        """
+        if self._queue[0] != ticket:
+            return None
+
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+        if wait > 0:
+            return wait
+
+        self._tokens -= 1
+        heapq.heappop(self._queue)
+        self._condition.notify_all()
+        return 0
+
+    def _enqueue(self, priority):
+        ticket = (priority, next(self._counter))
+        heapq.heappush(self._queue, ticket)
+        return ticket
+
+    def _dequeue(self, ticket):
+        self._queue.remove(ticket)
+        heapq.heapify(self._queue)
+        self.rejected += 1
+        self._condition.notify_all()
+
+    def acquire(self, priority=INTERACTIVE):
+        """
+        Attend qu'une requête puisse partir.
+
+        **Exceptions** :
+        - `RateLimitExceeded` : Si l'attente dépasse `max_wait` secondes.
+        """
+        deadline = time.monotonic() + self.max_wait
+        with self._condition:
+            ticket = self._enqueue(priority)
+            while True:
+                wait = self._poll(ticket)
+                if wait == 0:
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._dequeue(ticket)
+                    raise RateLimitExceeded("File d'attente Spotify saturée")
+                self._condition.wait(remaining if wait is None else min(wait, remaining))
+
+    async def aacquire(self, priority=INTERACTIVE):
+        """
+        Équivalent asynchrone de `acquire` : l'attente ne bloque pas la boucle d'événements.
+        """
+        deadline = time.monotonic() + self.max_wait
+        with self._condition:
+            ticket = self._enqueue(priority)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._poll(ticket)
+                if wait == 0:
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise RateLimitExceeded("File d'attente Spotify saturée")
+                await asyncio.sleep(min(ASYNC_POLL_INTERVAL if wait is None else wait, remaining))
+        except BaseException:
+            with self._condition:
+                if ticket in self._queue:
+                    self._dequeue(ticket)
+            raise
+
+    def throttle(self, retry_after):
+        """
+        Suspend les requêtes de tout le processus pendant `retry_after` secondes.
+        """
+        with self._condition:
+            self.throttled += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self._tokens = min(self._tokens, 0.0)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "queue_depth": len(self._queue),
+                "interactive_waiting": sum(1 for priority, _ in self._queue if priority == INTERACTIVE),
+                "background_waiting": sum(1 for priority, _ in self._queue if priority != INTERACTIVE),
+                "tokens": round(self._tokens, 2),
+                "blocked_for": round(max(0.0, self._blocked_until - now), 3),
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+            }
+
+
+def retry_after(response):
+    """
+    Retourne le délai (en secondes) demandé par l'en-tête `Retry-After` d'un 429.
+    """
+    try:
+        return max(0.0, float(response.headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Retourne le régulateur partagé du processus, configuré par le réglage `SPOTIFY_RATE_LIMIT`.
+
+    **Exceptions** :
+    - `ImproperlyConfigured` : Si `RATE` n'est pas strictement positif ou si `BURST` est
+      inférieur à 1.
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                config = {**DEFAULT_RATE_LIMIT_SETTINGS, **getattr(settings, "SPOTIFY_RATE_LIMIT", {})}
+                if not config["RATE"] > 0:
+                    raise ImproperlyConfigured("SPOTIFY_RATE_LIMIT['RATE'] doit être strictement positif.")
+                if not config["BURST"] >= 1:
+                    raise ImproperlyConfigured("SPOTIFY_RATE_LIMIT['BURST'] doit être au moins 1.")
+                _limiter = RateLimiter(
+                    rate=config["RATE"],
+                    burst=config["BURST"],
+                    max_wait=config["MAX_WAIT"],
+                    retries=config["RETRIES"],
+                )
+    return _limiter
+
+
+@receiver(setting_changed)
+def reset_rate_limiter(setting, **kwargs):
+    global _limiter
+    if setting == "SPOTIFY_RATE_LIMIT":
+        _limiter = None
@@ -0,0 +1,287 @@
+import asyncio
+import itertools
+import threading
+import time
+from datetime import timedelta
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import requests
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from .serialization import dumps, loads
+
+try:
+    import httpx
+except ImportError:  # Client asynchrone indisponible (voir `spotify.AsyncSpotifyClient`)
+    httpx = None
+
+# Valeurs par défaut du réglage `SPOTIFY_RECORDING`
+DEFAULT_RECORDING_SETTINGS = {
+    "MODE": None,
+    "FILE": "spotify_fixtures.jsonl",
+    "EMULATE_TIMING": False,
+}
+
+RECORD = "record"
+REPLAY = "replay"
+
+# En-têtes de réponse conservés dans les enregistrements
+RECORDED_HEADERS = ("content-type", "etag", "retry-after", "cache-control", "last-modified")
+
+# En-têtes de requête qui distinguent deux réponses à une même URL
+MATCHED_HEADERS = ("if-none-match",)
+
+# Champs secrets masqués dans les corps enregistrés (formulaires et réponses du service de tokens)
+SECRET_FIELDS = ("client_id", "client_secret", "code", "refresh_token", "access_token")
+REDACTED = "<redacted>"
+
+
+def recording_settings():
+    return {**DEFAULT_RECORDING_SETTINGS, **getattr(settings, "SPOTIFY_RECORDING", {})}
+
+
+def _redact_form(body):
+    return urlencode([
+        (key, REDACTED if key in SECRET_FIELDS else value) for key, value in parse_qsl(body, keep_blank_values=True)
+    ])
+
+
+def _redact_json(body):
+    try:
+        data = loads(body)
+    except ValueError:
+        return body
+    if not isinstance(data, dict) or not any(field in data for field in SECRET_FIELDS):
+        return body
+    return dumps({key: REDACTED if key in SECRET_FIELDS else value for key, value in data.items()}).decode()
+
+
+def _text(body):
+    if body is None:
+        return ""
+    return body.decode("utf-8", "replace") if isinstance(body, bytes) else body
+
+
+class Cassette:
+    """
+    Fichier JSONL d'échanges HTTP avec Spotify, enregistrés puis rejoués hors ligne.
+
+    Chaque ligne décrit un échange : `method`, `path` (chemin et paramètres, sans l'hôte),
+    `headers` de requête distinctifs (`MATCHED_HEADERS`), `request_body`, `status`,
+    `response_headers` (`RECORDED_HEADERS`), `body`, `elapsed_ms` (durée de l'échange) et
+    `recorded_at`. Les secrets (`SECRET_FIELDS`) et l'en-tête `Authorization` ne sont jamais
+    écrits.
+
+    Au rejeu, un échange est retrouvé par sa méthode, son chemin et ses en-têtes distinctifs
+    (ni le token ni le corps de la requête, dont la position de lecture varie d'une exécution
+    à l'autre) : les échanges d'une même clé sont rendus dans l'ordre de l'enregistrement,
+    puis à nouveau depuis le premier.
+
+    **Méthodes** :
+    - `record(...)`: Ajoute un échange au fichier.
+    - `next(method, url, headers)`: Retourne l'échange suivant d'une clé, ou `None`.
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._exchanges = None
+
+    @staticmethod
+    def key(method, url, headers):
+        parts = urlsplit(str(url))
+        path = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        matched = tuple((name, headers.get(name)) for name in MATCHED_HEADERS if headers.get(name))
+        return method.upper(), path, matched
+
+    def record(self, method, url, headers, request_body, status, response_headers, body, elapsed):
+        method, path, matched = self.key(method, url, headers)
+        request_body = _text(request_body)
+        line = dumps({
+            "method": method,
+            "path": path,
+            "headers": dict(matched),
+            "request_body": _redact_json(request_body) if request_body.startswith("{") else _redact_form(request_body),
+            "status": status,
+            "response_headers": {
+                name: response_headers[name] for name in RECORDED_HEADERS if name in response_headers
+            },
+            "body": _redact_json(_text(body)),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "recorded_at": time.time(),
+        })
+        with self._lock:
+            with open(self.path, "ab") as file:
+                file.write(line + b"\n")
+
+    def _load(self):
+        exchanges = {}
+        try:
+            with open(self.path, "rb") as file:
+                for line in file:
+                    if line.strip():
+                        exchange = loads(line)
+                        key = (exchange["method"], exchange["path"], tuple(exchange.get("headers", {}).items()))
+                        exchanges.setdefault(key, []).append(exchange)
+        except FileNotFoundError:
+            pass
+        return {key: itertools.cycle(records) for key, records in exchanges.items()}
+
+    def next(self, method, url, headers):
+        with self._lock:
+            if self._exchanges is None:
+                self._exchanges = self._load()
+            records = self._exchanges.get(self.key(method, url, headers))
+            return next(records) if records is not None else None
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Adaptateur `requests` qui enregistre chaque échange dans une cassette.
+
+    Les nouvelles tentatives de l'adaptateur ont lieu avant l'enregistrement : seule la
+    réponse finale est écrite, avec la durée totale de l'échange.
+    """
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        self.cassette.record(
+            request.method, request.url, request.headers, request.body,
+            response.status_code, response.headers, response.content, time.perf_counter() - start,
+        )
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Adaptateur `requests` qui répond à partir d'une cassette, sans accès au réseau.
+
+    Avec `emulate_timing`, chaque réponse est rendue après la durée de l'échange enregistré.
+    Une requête absente de la cassette lève `requests.ConnectionError` (Spotify injoignable).
+    """
+    def __init__(self, cassette, emulate_timing=False):
+        super().__init__()
+        self.cassette = cassette
+        self.emulate_timing = emulate_timing
+
+    def send(self, request, **kwargs):
+        exchange = self.cassette.next(request.method, request.url, request.headers)
+        if exchange is None:
+            raise requests.ConnectionError(f"Aucun échange enregistré pour {request.method} {request.url}",
+                                           request=request)
+        if self.emulate_timing:
+            time.sleep(exchange["elapsed_ms"] / 1000)
+
+        response = requests.Response()
+        response.status_code = exchange["status"]
+        response.headers = CaseInsensitiveDict(exchange["response_headers"])
+        response._content = exchange["body"].encode()
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(milliseconds=exchange["elapsed_ms"])
+        return response
+
+    def close(self):
+        pass
+
+
+if httpx is not None:
+    class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+        """
+        Équivalent de `RecordingAdapter` pour le client asynchrone : enveloppe le transport
+        `httpx` qui envoie réellement les requêtes.
+        """
+        def __init__(self, cassette, transport):
+            self.cassette = cassette
+            self.transport = transport
+
+        async def handle_async_request(self, request):
+            start = time.perf_counter()
+            response = await self.transport.handle_async_request(request)
+            content = await response.aread()
+            elapsed = time.perf_counter() - start
+            self.cassette.record(
+                request.method, request.url, request.headers, request.content,
+                response.status_code, response.headers, content, elapsed,
+            )
+            return httpx.Response(response.status_code, headers=response.headers, content=content)
+
+        async def aclose(self):
+            await self.transport.aclose()
+
+    class AsyncReplayTransport(httpx.AsyncBaseTransport):
+        """
+        Équivalent de `ReplayAdapter` pour le client asynchrone.
+        """
+        def __init__(self, cassette, emulate_timing=False):
+            self.cassette = cassette
+            self.emulate_timing = emulate_timing
+
+        async def handle_async_request(self, request):
+            exchange = self.cassette.next(request.method, request.url, request.headers)
+            if exchange is None:
+                raise httpx.ConnectError(f"Aucun échange enregistré pour {request.method} {request.url}",
+                                         request=request)
+            if self.emulate_timing:
+                await asyncio.sleep(exchange["elapsed_ms"] / 1000)
+            return httpx.Response(exchange["status"], headers=exchange["response_headers"],
+                                  content=exchange["body"].encode())
+
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette():
+    """
+    Retourne la cassette du fichier `FILE` du réglage `SPOTIFY_RECORDING` (une par fichier).
+    """
+    path = str(recording_settings()["FILE"])
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            cassette = _cassettes[path] = Cassette(path)
+        return cassette
+
+
+def http_adapter(**kwargs):
+    """
+    Retourne l'adaptateur `requests` du client Spotify selon le mode `MODE` du réglage
+    `SPOTIFY_RECORDING` : `"record"`, `"replay"` ou `None` (appels directs).
+
+    **Paramètres** :
+    - `kwargs` : Arguments de `HTTPAdapter` (pool de connexions, nouvelles tentatives),
+      ignorés au rejeu.
+    """
+    config = recording_settings()
+    if config["MODE"] == RECORD:
+        return RecordingAdapter(get_cassette(), **kwargs)
+    if config["MODE"] == REPLAY:
+        return ReplayAdapter(get_cassette(), config["EMULATE_TIMING"])
+    return HTTPAdapter(**kwargs)
+
+
+def async_transport(transport):
+    """
+    Équivalent de `http_adapter` pour le client asynchrone : retourne `transport` ou le
+    transport d'enregistrement ou de rejeu qui le remplace.
+    """
+    config = recording_settings()
+    if config["MODE"] == RECORD:
+        return AsyncRecordingTransport(get_cassette(), transport)
+    if config["MODE"] == REPLAY:
+        return AsyncReplayTransport(get_cassette(), config["EMULATE_TIMING"])
+    return transport
+
+
+@receiver(setting_changed)
+def reset_cassettes(setting, **kwargs):
+    if setting == "SPOTIFY_RECORDING":
+        with _cassettes_lock:
+            _cassettes.clear()
@@ -0,0 +1,43 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from .metrics import phase
+from .serialization import dumps, loads
+
+# Conversion des types propres à Django et DRF (Decimal, chaînes traduites, dates…)
+_default = JSONEncoder().default
+
+
+class JSONRenderer(BaseRenderer):
+    """
+    Rendu JSON compact des réponses, par `serialization.dumps` (orjson s'il est installé).
+
+    Remplace `rest_framework.renderers.JSONRenderer` dans `DEFAULT_RENDERER_CLASSES` ; les
+    types que l'encodeur ne connaît pas sont convertis comme par l'encodeur de DRF. La durée
+    de l'encodage est mesurée dans la phase `render` de la requête.
+    """
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        with phase("render"):
+            return dumps(data, default=_default)
+
+
+class JSONParser(BaseParser):
+    """
+    Lecture des corps JSON par `serialization.loads` (orjson s'il est installé).
+
+    Remplace `rest_framework.parsers.JSONParser` dans `DEFAULT_PARSER_CLASSES`.
+    """
+    media_type = "application/json"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as error:
+            raise ParseError(f"JSON parse error - {error}")
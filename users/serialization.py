@@ -0,0 +1,36 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # Encodage et décodage par le module `json` standard, plus lents
+    orjson = None
+
+
+def dumps(value, default=None):
+    """
+    Encode une valeur en JSON compact (sans espaces, UTF-8) et retourne des octets.
+
+    Avec ou sans orjson, les octets produits sont identiques, à l'exception des nombres à
+    virgule écrits en notation exponentielle (`1e16` au lieu de `1e+16`, `0.00001` au lieu
+    de `1e-05`), qui restent égaux une fois décodés. Les dates UTC se terminent par `Z`,
+    comme avec l'encodeur de DRF.
+
+    **Paramètres** :
+    - `default` : Fonction appelée pour les objets que l'encodeur ne sait pas représenter ;
+      elle retourne une valeur encodable ou lève `TypeError`.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+    return json.dumps(value, default=default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def loads(data):
+    """
+    Décode un document JSON (octets ou chaîne).
+
+    **Exceptions** :
+    - `ValueError` : Si le document est invalide.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
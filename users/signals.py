@@ -0,0 +1,60 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.dispatch import Signal
+
+# Signaux mis en attente par `deferred_signals()` dans le contexte courant
+_deferred = ContextVar("spotynov_deferred_signals", default=None)
+
+
+class DeferrableSignal(Signal):
+    """
+    Signal dont l'envoi peut être retardé jusqu'à la fin d'une section `deferred_signals()`.
+    """
+    def send(self, sender, **named):
+        pending = _deferred.get()
+        if pending is not None:
+            pending.append((self, sender, named))
+            return []
+        return super().send(sender, **named)
+
+
+@contextmanager
+def deferred_signals():
+    """
+    Retarde les signaux émis dans la section jusqu'à sa sortie.
+
+    Les signaux sont envoyés dans leur ordre d'émission si la section se termine normalement,
+    et abandonnés si elle lève une exception : englobant une section `batch()` du stockage,
+    les récepteurs ne sont prévenus que des écritures effectivement persistées.
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+
+    pending = []
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+    for signal, sender, named in pending:
+        signal.send(sender, **named)
+
+
+# Émis après la création d'un utilisateur (argument : `username`)
+user_created = DeferrableSignal()
+
+# Émis après la suppression d'un utilisateur (argument : `username`)
+user_deleted = DeferrableSignal()
+
+# Émis après l'arrivée d'un membre dans un groupe, y compris son créateur
+# (arguments : `group_name`, `username`, `group`)
+member_joined = DeferrableSignal()
+
+# Émis après le départ d'un membre (arguments : `group_name`, `username`, `group` ;
+# `group` vaut `None` si le groupe a été supprimé faute de membres)
+member_left = DeferrableSignal()
+
+# Émis quand la lecture d'un groupe est synchronisée ou s'arrête
+# (arguments : `group_name`, `playback` : `is_playing`, `track_uri`, `position_ms`)
+playback_changed = Signal()
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Regroupe les appels identiques simultanés en un seul.
+
+    Le premier appelant d'une clé exécute l'appel ; ceux qui arrivent avec la même clé
+    pendant son exécution attendent et reçoivent le même résultat (ou la même exception).
+    Rien n'est conservé une fois l'appel terminé : les résultats ne sont jamais périmés.
+
+    **Méthodes** :
+    - `do(key, call)`: Exécute `call()`, ou attend l'exécution en cours pour la même clé.
+    - `stats()`: Retourne le nombre d'appels en cours, exécutés et regroupés.
+    """
+    def __init__(self):
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, call):
+        with self._lock:
+            pending = self._calls.get(key)
+            if pending is None:
+                pending = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+
+        try:
+            pending.result = call()
+        except BaseException as error:
+            pending.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            pending.done.set()
+        return pending.result
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "executed": self.executed, "coalesced": self.coalesced}
+
+
+class AsyncSingleFlight:
+    """
+    Équivalent asynchrone de `SingleFlight`, pour une boucle d'événements.
+
+    L'appel est exécuté dans une tâche protégée (`asyncio.shield`) : l'annulation d'un
+    appelant n'interrompt pas l'appel attendu par les autres.
+    """
+    def __init__(self):
+        self.executed = 0
+        self.coalesced = 0
+        self._calls = {}
+
+    async def do(self, key, call):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"in_flight": len(self._calls), "executed": self.executed, "coalesced": self.coalesced}
@@ -0,0 +1,310 @@
+import asyncio
+import threading
+import weakref
+import requests
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from urllib3.util.retry import Retry
+from .metrics import count, phase
+from .ratelimit import INTERACTIVE, RateLimitExceeded, get_rate_limiter, retry_after
+from .recording import http_adapter, async_transport
+from .singleflight import SingleFlight, AsyncSingleFlight
+
+try:
+    import httpx
+except ImportError:  # Client asynchrone indisponible : seules les vues synchrones fonctionnent
+    httpx = None
+
+# Erreurs réseau levées par le client asynchrone
+AsyncRequestError = httpx.HTTPError if httpx is not None else OSError
+
+
+class AsyncRateLimitExceeded(AsyncRequestError):
+    """
+    Équivalent de `RateLimitExceeded` levé par le client asynchrone.
+    """
+
+# Adresses par défaut de l'API et du service de tokens (réglages `SPOTIFY_API_URL` et
+# `SPOTIFY_TOKEN_URL`)
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+
+def spotify_api_url():
+    return getattr(settings, "SPOTIFY_API_URL", SPOTIFY_API_URL)
+
+
+def spotify_token_url():
+    return getattr(settings, "SPOTIFY_TOKEN_URL", SPOTIFY_TOKEN_URL)
+
+
+# Valeurs par défaut du réglage `SPOTIFY_HTTP`
+DEFAULT_HTTP_SETTINGS = {
+    "POOL_SIZE": 20,
+    "CONNECT_TIMEOUT": 3.05,
+    "READ_TIMEOUT": 10,
+    "RETRIES": 2,
+    "BACKOFF_FACTOR": 0.3,
+    "COALESCE": True,
+}
+
+
+class SpotifyClient:
+    """
+    Client HTTP unique pour tous les appels à Spotify.
+
+    Le client réutilise une `requests.Session` dont le pool de connexions est conservé
+    entre les requêtes (keep-alive) : la poignée de main TCP+TLS n'est faite qu'une fois
+    par connexion. Chaque appel est borné par un délai de connexion et de lecture, et les
+    erreurs réseau ou 5xx sont rejouées avec un délai croissant.
+
+    Les requêtes `POST` ne sont rejouées qu'en cas d'échec de connexion : l'échange d'un
+    code d'autorisation n'est pas idempotent.
+
+    Chaque appel est compté (`upstream_calls`, et `upstream_retries` pour les nouvelles
+    tentatives) et son attente mesurée dans la phase `upstream` de la requête en cours.
+
+    Le réglage `SPOTIFY_RECORDING` permet d'enregistrer les échanges dans un fichier JSONL
+    puis de les rejouer sans réseau (voir `recording.Cassette`).
+
+    Chaque requête attend son tour auprès du régulateur du processus (`limiter`), selon sa
+    priorité (`INTERACTIVE` par défaut, `BACKGROUND` pour les collectes d'historique).
+    Une réponse 429 suspend toutes les requêtes pendant le délai `Retry-After`, puis la
+    requête est rejouée (au plus `limiter.retries` fois).
+
+    Les requêtes GET identiques (même URL, token, paramètres et en-têtes) envoyées
+    simultanément sont regroupées (`flight`) : un seul appel part vers Spotify et tous les
+    appelants reçoivent sa réponse.
+
+    **Paramètres** :
+    - `pool_size` (int) : Nombre de connexions conservées par hôte.
+    - `connect_timeout` / `read_timeout` (float) : Délais maximum en secondes.
+    - `retries` (int) : Nombre de nouvelles tentatives.
+    - `backoff_factor` (float) : Facteur du délai croissant entre deux tentatives.
+    - `limiter` (RateLimiter) : Régulateur des appels ; par défaut celui du processus.
+    - `coalesce` (bool) : Regroupe les requêtes GET identiques simultanées.
+
+    **Méthodes** :
+    - `get(path, token, params, headers, priority)`: Requête GET sur l'API Spotify.
+    - `put(path, token, json, priority)`: Requête PUT sur l'API Spotify.
+    - `post(url, data, headers, priority)`: Requête POST (par exemple vers `spotify_token_url()`).
+    """
+    def __init__(self, pool_size=20, connect_timeout=3.05, read_timeout=10, retries=2, backoff_factor=0.3,
+                 limiter=None, coalesce=True):
+        self._limiter = limiter
+        self.flight = SingleFlight() if coalesce else None
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "PUT", "DELETE"}),
+            raise_on_status=False,
+            # Les 429 sont traités par le régulateur, pour tout le processus
+            respect_retry_after_header=False,
+        )
+        adapter = http_adapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @property
+    def limiter(self):
+        return self._limiter or get_rate_limiter()
+
+    @staticmethod
+    def authorization(token):
+        """Retourne l'en-tête `Authorization` d'un token, préfixé ou non par `Bearer`."""
+        return token if token.startswith("Bearer ") else f"Bearer {token}"
+
+    @staticmethod
+    def url(path):
+        return path if path.startswith("http") else f"{spotify_api_url()}{path}"
+
+    @staticmethod
+    def flight_key(path, token, params, headers):
+        """Clé identifiant les requêtes GET pouvant partager une même réponse."""
+        return (
+            SpotifyClient.url(path),
+            token,
+            tuple(sorted((params or {}).items())),
+            tuple(sorted((headers or {}).items())),
+        )
+
+    def request(self, method, path, token=None, priority=INTERACTIVE, **kwargs):
+        headers = kwargs.pop("headers", None) or {}
+        if token:
+            headers["Authorization"] = self.authorization(token)
+
+        for attempt in range(self.limiter.retries + 1):
+            self.limiter.acquire(priority)
+            count("upstream_calls")
+            if attempt:
+                count("upstream_retries")
+            with phase("upstream"):
+                response = self.session.request(
+                    method, self.url(path), headers=headers, timeout=self.timeout, **kwargs
+                )
+            # Nouvelles tentatives faites par l'adaptateur (erreurs réseau ou 5xx)
+            history = getattr(getattr(response.raw, "retries", None), "history", ())
+            if history:
+                count("upstream_retries", len(history))
+            if response.status_code != 429:
+                break
+            self.limiter.throttle(retry_after(response))
+        return response
+
+    def get(self, path, token, params=None, headers=None, priority=INTERACTIVE):
+        if self.flight is None:
+            return self.request("GET", path, token, priority, params=params, headers=headers)
+        return self.flight.do(
+            self.flight_key(path, token, params, headers),
+            lambda: self.request("GET", path, token, priority, params=params, headers=headers),
+        )
+
+    def put(self, path, token, json=None, priority=INTERACTIVE):
+        return self.request("PUT", path, token, priority, json=json)
+
+    def post(self, url, data=None, headers=None, priority=INTERACTIVE):
+        return self.request("POST", url, priority=priority, data=data, headers=headers)
+
+
+class AsyncSpotifyClient:
+    """
+    Équivalent asynchrone de `SpotifyClient`, basé sur `httpx.AsyncClient`.
+
+    Utilisé par les vues asynchrones (ASGI) : un worker peut attendre des milliers de
+    réponses Spotify simultanément sans bloquer de thread. Les connexions sont conservées
+    dans un pool borné, et les échecs de connexion sont rejoués par le transport `httpx`.
+
+    Un client `httpx` ne peut servir qu'une seule boucle d'événements : utiliser
+    `get_async_spotify_client()` qui en conserve un par boucle. Le régulateur des appels est
+    partagé avec le client synchrone.
+
+    **Méthodes** :
+    - `get(path, token, params, headers, priority)`: Requête GET sur l'API Spotify.
+    - `put(path, token, json, priority)`: Requête PUT sur l'API Spotify.
+    - `post(url, data, headers, priority)`: Requête POST (par exemple vers `spotify_token_url()`).
+    """
+    def __init__(self, pool_size=20, connect_timeout=3.05, read_timeout=10, retries=2, limiter=None,
+                 coalesce=True):
+        if httpx is None:
+            raise ImproperlyConfigured("Le paquet httpx est requis pour les vues asynchrones.")
+        self._limiter = limiter
+        self.flight = AsyncSingleFlight() if coalesce else None
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=async_transport(httpx.AsyncHTTPTransport(retries=retries)),
+        )
+
+    @property
+    def limiter(self):
+        return self._limiter or get_rate_limiter()
+
+    async def request(self, method, path, token=None, priority=INTERACTIVE, **kwargs):
+        headers = kwargs.pop("headers", None) or {}
+        if token:
+            headers["Authorization"] = SpotifyClient.authorization(token)
+
+        for attempt in range(self.limiter.retries + 1):
+            try:
+                await self.limiter.aacquire(priority)
+            except RateLimitExceeded as error:
+                raise AsyncRateLimitExceeded(str(error)) from error
+            count("upstream_calls")
+            if attempt:
+                count("upstream_retries")
+            with phase("upstream"):
+                response = await self.client.request(method, SpotifyClient.url(path), headers=headers, **kwargs)
+            if response.status_code != 429:
+                break
+            self.limiter.throttle(retry_after(response))
+        return response
+
+    async def get(self, path, token, params=None, headers=None, priority=INTERACTIVE):
+        if self.flight is None:
+            return await self.request("GET", path, token, priority, params=params, headers=headers)
+        return await self.flight.do(
+            SpotifyClient.flight_key(path, token, params, headers),
+            lambda: self.request("GET", path, token, priority, params=params, headers=headers),
+        )
+
+    async def put(self, path, token, json=None, priority=INTERACTIVE):
+        return await self.request("PUT", path, token, priority, json=json)
+
+    async def post(self, url, data=None, headers=None, priority=INTERACTIVE):
+        return await self.request("POST", url, priority=priority, data=data, headers=headers)
+
+
+def http_settings():
+    return {**DEFAULT_HTTP_SETTINGS, **getattr(settings, "SPOTIFY_HTTP", {})}
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_spotify_client():
+    """
+    Retourne le client Spotify partagé du processus, configuré par le réglage `SPOTIFY_HTTP`.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = http_settings()
+                _client = SpotifyClient(
+                    pool_size=config["POOL_SIZE"],
+                    connect_timeout=config["CONNECT_TIMEOUT"],
+                    read_timeout=config["READ_TIMEOUT"],
+                    retries=config["RETRIES"],
+                    backoff_factor=config["BACKOFF_FACTOR"],
+                    coalesce=config["COALESCE"],
+                )
+    return _client
+
+
+def get_async_spotify_client():
+    """
+    Retourne le client Spotify asynchrone de la boucle d'événements courante.
+
+    Sous ASGI, il n'existe qu'une boucle par worker et donc un seul client. Sous WSGI, Django
+    exécute chaque vue asynchrone dans sa propre boucle : le client disparaît avec elle.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        config = http_settings()
+        client = AsyncSpotifyClient(
+            pool_size=config["POOL_SIZE"],
+            connect_timeout=config["CONNECT_TIMEOUT"],
+            read_timeout=config["READ_TIMEOUT"],
+            retries=config["RETRIES"],
+            coalesce=config["COALESCE"],
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def coalescing_stats():
+    """
+    Retourne les compteurs de regroupement des requêtes GET des clients Spotify du processus.
+    """
+    flights = [client.flight for client in [_client, *_async_clients.values()] if client and client.flight]
+    return {
+        "in_flight": sum(flight.stats()["in_flight"] for flight in flights),
+        "executed": sum(flight.executed for flight in flights),
+        "coalesced": sum(flight.coalesced for flight in flights),
+    }
+
+
+@receiver(setting_changed)
+def reset_spotify_client(setting, **kwargs):
+    global _client
+    if setting in ("SPOTIFY_HTTP", "SPOTIFY_RECORDING"):
+        _client = None
+        _async_clients.clear()
@@ -0,0 +1,507 @@
+import bisect
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from .metrics import count, phase
+from .serialization import dumps, loads
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou entre processus
+    fcntl = None
+
+# Nombre d'enregistrements du journal au-delà duquel il est fusionné dans l'instantané
+COMPACT_THRESHOLD = 1000
+# Force l'écriture physique (fsync) de chaque ajout au journal
+JOURNAL_FSYNC = True
+# Nombre de modifications de groupes conservées pour le flux des changements
+CHANGE_LOG_SIZE = 10000
+
+
+class JSONStore:
+    """
+    Copie résidente d'un fichier JSON partagée par tout le processus, avec journal des écritures.
+
+    Le fichier (l'instantané) n'est parsé qu'une seule fois : les lectures suivantes servent
+    directement le dictionnaire en mémoire (accès O(1) par clé).
+
+    Chaque modification ajoute un seul enregistrement numéroté et horodaté au journal
+    `<fichier>.log` (une ligne JSON `{"seq", "op", "key", "value", "ts"}`) au lieu de
+    réécrire tout le fichier.
+    Au chargement, l'instantané est lu puis le journal est rejoué. Lorsque le journal dépasse
+    `compact_threshold` enregistrements, il est fusionné en arrière-plan dans un nouvel
+    instantané, écrit dans un fichier temporaire puis renommé.
+
+    Une écriture interrompue (arrêt brutal) ne laisse au pire qu'une ligne incomplète en fin
+    de journal : elle est ignorée à la lecture et tronquée avant l'écriture suivante.
+
+    Avant chaque accès, l'instantané et le journal sont comparés à ceux du dernier chargement :
+    les enregistrements ajoutés par un autre processus sont rejoués, et un instantané remplacé
+    provoque un rechargement complet. Les écritures de plusieurs workers sont sérialisées par
+    un verrou de fichier (`<fichier>.lock`).
+
+    La lecture et le décodage des fichiers sont mesurés dans la phase `parse_<nom du
+    fichier>` de la requête en cours (par exemple `parse_users`), et les octets lus sont
+    comptés (`file_bytes_read`).
+
+    Le numéro du dernier enregistrement ayant modifié une clé sert de version à cette clé,
+    et `seq` de version à l'ensemble du fichier. Les clés qui n'ont pas été modifiées depuis
+    le chargement de l'instantané prennent le numéro de cet instantané : une version peut
+    être surestimée par un worker qui vient de recharger le fichier, jamais sous-estimée.
+
+    L'en-tête du journal écrit par `compact()` identifie l'instantané (date, taille, inode).
+    Un instantané écrit autrement (modifié à la main, restauré…) ne correspond à aucun
+    numéro : au chargement, il reçoit un nouveau numéro et est fusionné avec le journal,
+    sans quoi un client pourrait recevoir une réponse 304 pour des données modifiées.
+
+    **Attributs** :
+    - `path` (str) : Chemin de l'instantané JSON.
+    - `seq` (int) : Numéro du dernier enregistrement appliqué.
+    - `modified` (float) : Date (timestamp) de la dernière modification.
+
+    **Méthodes** :
+    - `data`: Retourne le dictionnaire en mémoire, mis à jour si les fichiers ont changé.
+    - `transaction()`: Contexte de lecture-modification-écriture exclusif.
+    - `batch()`: Comme `transaction()`, avec un seul ajout au journal pour toutes les écritures.
+    - `put(key, value)`: Enregistre la valeur d'une clé.
+    - `delete(key)`: Supprime une clé.
+    - `replace(data)`: Remplace tout le contenu et réécrit l'instantané.
+    - `compact()`: Fusionne le journal dans l'instantané.
+    - `version(key=None)`: Retourne la version et la date de modification d'une clé ou du fichier.
+    """
+    def __init__(self, path, compact_threshold=COMPACT_THRESHOLD, fsync=JOURNAL_FSYNC):
+        self.path = path
+        self.phase = f"parse_{os.path.splitext(os.path.basename(path))[0]}"
+        self.journal_path = f"{path}.log"
+        self.lock_path = f"{path}.lock"
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.lock = threading.RLock()
+        self.seq = 0
+        self.modified = None
+        self._versions = {}
+        self._base = (0, None)
+        self._data = None
+        self._snapshot_stamp = None
+        self._unverified = None
+        self._journal_ino = None
+        self._journal_offset = 0
+        self._journal_records = 0
+        self._depth = 0
+        self._pending = None
+        self._compacting = False
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    @contextmanager
+    def _file_lock(self, shared=False):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        if self._data is None or self._stamp(self.path) != self._snapshot_stamp:
+            self._load()
+            if self._unverified is not None and self._pending is None:
+                self._rebase()
+            return
+
+        journal = self._stamp(self.journal_path)
+        if journal is None:
+            if self._journal_ino is not None:
+                self._load()
+        elif journal[2] != self._journal_ino or journal[1] < self._journal_offset:
+            self._load()
+        elif journal[1] > self._journal_offset:
+            self._replay()
+
+    def _load(self):
+        # Verrou partagé : une fusion concurrente ne peut pas remplacer les fichiers entre
+        # la lecture de l'instantané et celle du journal
+        with self._file_lock(shared=True) if self._depth == 0 else nullcontext():
+            snapshot_stamp = self._stamp(self.path)
+            data = {}
+            if snapshot_stamp is not None:
+                with phase(self.phase):
+                    try:
+                        with open(self.path, "rb") as f:
+                            content = f.read().strip()
+                        count("file_bytes_read", len(content))
+                        data = loads(content) if content else {}
+                    except (ValueError, IOError):
+                        data = {}
+
+            self._data = data if isinstance(data, dict) else {}
+            self._snapshot_stamp = snapshot_stamp
+            self.seq = 0
+            self.modified = snapshot_stamp[0] / 1e9 if snapshot_stamp else None
+            self._versions = {}
+            self._base = (0, self.modified)
+            self._journal_ino = None
+            self._journal_offset = 0
+            self._journal_records = 0
+            # Vérifié par l'en-tête du journal s'il a été écrit par `compact()`
+            self._unverified = snapshot_stamp
+            self._on_load()
+            self._replay()
+
+    def _rebase(self):
+        """
+        Attribue un nouveau numéro à un instantané écrit hors de `compact()`, et l'enregistre
+        dans un nouvel en-tête du journal pour que tous les workers le partagent.
+        """
+        with self.transaction():
+            # Un autre worker a peut-être déjà numéroté cet instantané
+            if self._unverified is None:
+                return
+            self._unverified = None
+            self._renumber()
+
+    def _replay(self):
+        with phase(self.phase):
+            self._replay_journal()
+
+    def _replay_journal(self):
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            self._journal_ino = os.fstat(f.fileno()).st_ino
+            f.seek(self._journal_offset)
+            chunk = f.read()
+        count("file_bytes_read", len(chunk))
+
+        # Une dernière ligne sans retour à la ligne est une écriture en cours ou interrompue
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            try:
+                record = loads(line)
+            except ValueError:
+                continue
+            if "base" in record:
+                self.seq = max(self.seq, record["base"])
+                self._base = (self.seq, self.modified)
+                if self._unverified is not None and record.get("snapshot") == list(self._unverified):
+                    self._unverified = None
+                continue
+            self._apply(record)
+            self.seq = record["seq"]
+            self._journal_records += 1
+        self._journal_offset += end
+
+    def _on_load(self):
+        """Point d'extension appelé après le chargement de l'instantané."""
+
+    def _apply(self, record):
+        if record["op"] == "put":
+            self._data[record["key"]] = record["value"]
+        else:
+            self._data.pop(record["key"], None)
+        modified = record.get("ts", self.modified)
+        self._versions[record["key"]] = (record["seq"], modified)
+        self.modified = modified
+
+    def _append(self, records):
+        lines = b"".join(dumps(record) + b"\n" for record in records)
+
+        # Tronque une éventuelle ligne incomplète laissée par une écriture interrompue
+        journal = self._stamp(self.journal_path)
+        if journal is not None and journal[1] > self._journal_offset:
+            os.truncate(self.journal_path, self._journal_offset)
+
+        with open(self.journal_path, "ab") as f:
+            f.write(lines)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            stat = os.fstat(f.fileno())
+
+        self._journal_ino = stat.st_ino
+        self._journal_offset = stat.st_size
+
+    @property
+    def data(self):
+        with self.lock:
+            self._refresh()
+            return self._data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def version(self, key=None):
+        """
+        Retourne `(version, modified)` d'une clé (y compris supprimée), ou du fichier entier
+        si `key` vaut `None`, sans copier ni sérialiser les données.
+        """
+        with self.lock:
+            self._refresh()
+            if key is None:
+                return self.seq, self.modified
+            return self._versions.get(key, self._base)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Ouvre une section exclusive de lecture-modification-écriture.
+
+        Le verrou du processus et le verrou de fichier sont détenus pendant toute la section,
+        et les écritures des autres workers sont rejouées à l'entrée : les vérifications faites
+        dans la section (existence d'une clé, appartenance…) restent valides jusqu'à l'écriture.
+        """
+        with self.lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield self
+                finally:
+                    self._depth -= 1
+                return
+
+            with self._file_lock():
+                self._depth = 1
+                try:
+                    self._refresh()
+                    yield self
+                finally:
+                    self._depth = 0
+
+        self._maybe_compact()
+
+    @contextmanager
+    def batch(self):
+        """
+        Ouvre une section exclusive dont toutes les écritures sont ajoutées au journal en
+        une seule fois (une écriture et un `fsync`), à la sortie de la section.
+
+        Les écritures sont visibles en mémoire dès leur exécution, mais seulement par le
+        thread qui détient la section. Si la section échoue, elles sont abandonnées : le
+        fichier est rechargé au prochain accès.
+        """
+        with self.transaction():
+            if self._pending is not None:
+                yield self
+                return
+
+            self._pending = []
+            try:
+                yield self
+                if self._pending:
+                    self._append(self._pending)
+                    self._journal_records += len(self._pending)
+            except BaseException:
+                self._data = None
+                raise
+            finally:
+                self._pending = None
+
+    def _write(self, records):
+        with self.transaction():
+            now = time.time()
+            records = [{"seq": self.seq + i, **record, "ts": now} for i, record in enumerate(records, 1)]
+            if self._pending is not None:
+                self._pending.extend(records)
+            else:
+                self._append(records)
+                self._journal_records += len(records)
+            for record in records:
+                self._apply(record)
+            self.seq = records[-1]["seq"]
+
+    def put(self, key, value):
+        self._write([{"op": "put", "key": key, "value": value}])
+
+    def delete(self, key):
+        self._write([{"op": "del", "key": key}])
+
+    def replace(self, data):
+        with self.transaction():
+            self._data = data
+            self._renumber()
+
+    def _renumber(self):
+        # Nouveau numéro sans enregistrement : toutes les clés prennent cette version, datée
+        # comme l'instantané pour que les workers qui le rechargent obtiennent la même
+        self.seq += 1
+        self._versions = {}
+        self.compact()
+        self.modified = self._snapshot_stamp[0] / 1e9
+        self._base = (self.seq, self.modified)
+        self._on_load()
+
+    def compact(self):
+        """
+        Fusionne le journal dans l'instantané.
+
+        L'instantané est écrit dans un fichier temporaire puis renommé, et le journal est
+        remplacé par un en-tête `{"base": seq, "snapshot": [date, taille, inode]}` qui
+        conserve la numérotation et identifie l'instantané. Si le processus
+        s'arrête entre les deux renommages, les enregistrements encore présents dans le journal
+        sont simplement rejoués une seconde fois, ce qui ne change pas le résultat.
+        """
+        with self.transaction():
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(dumps(self._data))
+                f.flush()
+                os.fsync(f.fileno())
+            # Le renommage conserve la date, la taille et l'inode de l'instantané
+            snapshot_stamp = self._stamp(tmp_path)
+            os.replace(tmp_path, self.path)
+
+            tmp_journal = f"{self.journal_path}.tmp"
+            with open(tmp_journal, "wb") as f:
+                f.write(dumps({"base": self.seq, "snapshot": list(snapshot_stamp)}) + b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_journal, self.journal_path)
+
+            self._snapshot_stamp = self._stamp(self.path)
+            journal = self._stamp(self.journal_path)
+            self._journal_ino = journal[2]
+            self._journal_offset = journal[1]
+            self._journal_records = 0
+
+    def _maybe_compact(self):
+        with self.lock:
+            if self._compacting or self._journal_records < self.compact_threshold:
+                return
+            self._compacting = True
+        threading.Thread(target=self._background_compact, daemon=True).start()
+
+    def _background_compact(self):
+        try:
+            with self.transaction():
+                # Un autre worker a peut-être déjà fusionné le journal
+                if self._journal_records >= self.compact_threshold:
+                    self.compact()
+        finally:
+            self._compacting = False
+
+
+class GroupStore(JSONStore):
+    """
+    Copie résidente de `groups.json` accompagnée d'un index inverse des membres.
+
+    En plus du dictionnaire des groupes, la classe maintient :
+    - `members` : pour chaque groupe, l'ensemble de ses membres (test d'appartenance O(1)).
+    - `user_groups` : pour chaque utilisateur, la liste des groupes dont il est membre.
+    - `names` : les noms des groupes triés, pour le parcours paginé par nom.
+    - `changes` : les `change_log_size` derniers enregistrements appliqués, locaux ou rejoués
+      depuis le journal, pour le flux des changements (`changes_since`). Ils ne remontent pas
+      avant l'instantané chargé : les modifications antérieures ne sont plus disponibles.
+
+    Les index sont reconstruits entièrement au chargement de l'instantané, puis mis à jour
+    pour le seul groupe concerné à chaque enregistrement appliqué (local ou rejoué depuis
+    le journal d'un autre worker).
+
+    **Méthodes** :
+    - `group_of(username)`: Retourne le groupe d'un utilisateur, ou `None`.
+    - `is_member(group_name, username)`: Vérifie l'appartenance d'un utilisateur à un groupe.
+    - `page(prefix, after, count)`: Retourne des groupes consécutifs dans l'ordre des noms.
+    - `changes_since(seq, count)`: Retourne les modifications postérieures à `seq`.
+    """
+    def __init__(self, path, change_log_size=CHANGE_LOG_SIZE, **kwargs):
+        super().__init__(path, **kwargs)
+        self.changes = deque(maxlen=change_log_size)
+        self._evicted = 0
+
+    def _on_load(self):
+        self.changes.clear()
+        self._evicted = 0
+        self.members = {}
+        self.user_groups = {}
+        self.names = sorted(self._data)
+        for group_name, group in self._data.items():
+            self._index_group(group_name, group)
+
+    def _apply(self, record):
+        group_name = record["key"]
+        existed = group_name in self._data
+        for username in self.members.pop(group_name, ()):
+            self._unindex_member(group_name, username)
+        super()._apply(record)
+        if record["op"] == "put":
+            self._index_group(group_name, record["value"])
+            if not existed:
+                bisect.insort(self.names, group_name)
+        elif existed:
+            del self.names[bisect.bisect_left(self.names, group_name)]
+
+        if len(self.changes) == self.changes.maxlen:
+            self._evicted = self.changes[0][0]
+        self.changes.append((record["seq"], record["op"], group_name, record.get("value")))
+
+    def _index_group(self, group_name, group):
+        members = group.get("members", []) if isinstance(group, dict) else []
+        self.members[group_name] = set(members)
+        for username in members:
+            self.user_groups.setdefault(username, []).append(group_name)
+
+    def _unindex_member(self, group_name, username):
+        user_groups = self.user_groups.get(username)
+        if user_groups and group_name in user_groups:
+            user_groups.remove(group_name)
+            if not user_groups:
+                del self.user_groups[username]
+
+    def group_of(self, username):
+        with self.lock:
+            self._refresh()
+            user_groups = self.user_groups.get(username)
+            return user_groups[0] if user_groups else None
+
+    def is_member(self, group_name, username):
+        with self.lock:
+            self._refresh()
+            return username in self.members.get(group_name, ())
+
+    def page(self, prefix, after, count):
+        """
+        Retourne au plus `count` paires `(nom, groupe)` dont le nom commence par `prefix` et
+        suit `after` (exclu), dans l'ordre des noms, par recherche dichotomique.
+        """
+        with self.lock:
+            self._refresh()
+            if after is not None and after >= prefix:
+                start = bisect.bisect_right(self.names, after)
+            else:
+                start = bisect.bisect_left(self.names, prefix)
+            page = []
+            for group_name in self.names[start:start + count]:
+                if not group_name.startswith(prefix):
+                    break
+                page.append((group_name, self._data[group_name]))
+            return page
+
+    def changes_since(self, seq, count):
+        """
+        Retourne au plus `count` modifications `(seq, op, nom, groupe)` postérieures à `seq`,
+        dans l'ordre, ou `None` si certaines ne sont plus disponibles (ou si `seq` est
+        inconnu).
+        """
+        with self.lock:
+            self._refresh()
+            if seq > self.seq or seq < max(self._base[0], self._evicted):
+                return None
+            if not self.changes or seq >= self.changes[-1][0]:
+                return []
+            # Les numéros du journal se suivent : la position découle du numéro
+            start = max(0, seq + 1 - self.changes[0][0])
+            return list(itertools.islice(self.changes, start, start + count))
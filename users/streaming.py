@@ -0,0 +1,37 @@
+from django.http import StreamingHttpResponse
+from .serialization import dumps
+
+# Taille (en octets) à partir de laquelle un morceau encodé est envoyé au client
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_object(pairs, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Encode un objet JSON à partir de ses paires `(clé, valeur)`, au fur et à mesure.
+
+    Les paires sont consommées une à une et regroupées en morceaux d'environ `chunk_size`
+    octets : seul le morceau en cours est en mémoire, quelle que soit la taille de l'objet.
+    """
+    buffer = [b"{"]
+    size = 1
+    separator = b""
+    for key, value in pairs:
+        part = b"%s%s:%s" % (separator, dumps(key), dumps(value))
+        buffer.append(part)
+        size += len(part)
+        separator = b","
+        if size >= chunk_size:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    buffer.append(b"}")
+    yield b"".join(buffer)
+
+
+class StreamingJSONResponse(StreamingHttpResponse):
+    """
+    Réponse JSON dont le corps est produit par un itérateur de morceaux déjà encodés
+    (voir `iter_json_object`).
+    """
+    def __init__(self, chunks, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(chunks, **kwargs)
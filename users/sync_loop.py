@@ -0,0 +1,246 @@
+import logging
+import threading
+import time
+import requests
+from django.conf import settings
+from .models import GroupManager
+from .playback import get_executor, play_for_member
+from .signals import playback_changed
+from .spotify import get_spotify_client
+from .tokens import token_manager
+
+logger = logging.getLogger(__name__)
+
+# Valeurs par défaut du réglage `SPOTYNOV_SYNC_LOOP`
+DEFAULT_SYNC_LOOP_SETTINGS = {
+    "MIN_INTERVAL": 1.0,
+    "MAX_INTERVAL": 10.0,
+    "BACKOFF": 1.5,
+    "DRIFT_THRESHOLD_MS": 500,
+    "MAX_LOOPS": 100,
+}
+
+# Poids de la dernière mesure dans la latence moyenne d'un membre
+LATENCY_SMOOTHING = 0.3
+
+
+def sync_loop_settings():
+    return {**DEFAULT_SYNC_LOOP_SETTINGS, **getattr(settings, "SPOTYNOV_SYNC_LOOP", {})}
+
+
+class SyncLoopLimitExceeded(Exception):
+    """
+    Levée quand `MAX_LOOPS` boucles de synchronisation tournent déjà dans ce processus.
+    """
+
+
+class GroupSyncLoop:
+    """
+    Synchronisation continue de la lecture d'un groupe, dans un thread dédié.
+
+    La boucle interroge le lecteur de l'administrateur et n'envoie une commande de lecture
+    aux membres que si le titre change, si la position de l'administrateur s'écarte de plus
+    de `DRIFT_THRESHOLD_MS` de la position attendue (retour en arrière, pause, saut), ou à
+    un membre qui vient de rejoindre le groupe ou dont la dernière commande a échoué (pas de
+    token, erreur de Spotify) : il est relancé à chaque interrogation jusqu'à sa réussite.
+
+    Les positions sont corrigées des temps de transfert : la position de l'administrateur
+    est estimée au milieu de l'aller-retour de sa requête, puis avancée du temps écoulé et
+    de la demi-latence moyenne mesurée pour chaque membre au moment de l'envoi.
+
+    L'intervalle d'interrogation est adaptatif : `MIN_INTERVAL` après un changement, puis
+    multiplié par `BACKOFF` tant que rien ne change (au plus `MAX_INTERVAL`), et raccourci
+    pour interroger dès la fin du titre en cours. Si Spotify est injoignable ou répond de façon
+    inattendue, la boucle attend `MAX_INTERVAL` avant d'interroger à nouveau ; toute autre
+    erreur d'une interrogation est journalisée sans arrêter la boucle.
+
+    **Méthodes** :
+    - `start()`: Démarre la boucle.
+    - `stop()`: Arrête la boucle.
+    - `status()`: Retourne l'état de la boucle.
+    """
+    def __init__(self, group_name):
+        self.group_name = group_name
+        self.config = sync_loop_settings()
+        self.interval = self.config["MIN_INTERVAL"]
+        self.polls = 0
+        self.pushes = 0
+        self.track_uri = None
+        self.synced_members = set()
+        self.latencies = {}
+        self.last_results = []
+        self._anchor = None
+        self._admin_latency_ms = 0.0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"sync-{group_name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    @property
+    def running(self):
+        return self._thread.is_alive() and not self._stopped.is_set()
+
+    def status(self):
+        return {
+            "group": self.group_name,
+            "running": self.running,
+            "interval": round(self.interval, 2),
+            "track_uri": self.track_uri,
+            "polls": self.polls,
+            "pushes": self.pushes,
+            "last_results": self.last_results,
+        }
+
+    def _run(self):
+        try:
+            while not self._stopped.is_set():
+                group = GroupManager.get_group(self.group_name)
+                if group is None:
+                    break
+                try:
+                    self.interval = self._tick(group)
+                except (requests.RequestException, ValueError, KeyError):
+                    # Spotify injoignable ou réponse inattendue : nouvel essai plus tard
+                    self.interval = self.config["MAX_INTERVAL"]
+                except Exception:
+                    logger.exception("Échec de la synchronisation du groupe %s", self.group_name)
+                    self.interval = self.config["MAX_INTERVAL"]
+                self._stopped.wait(self.interval)
+        finally:
+            self._stopped.set()
+            discard_sync_loop(self.group_name, self)
+
+    def _poll_admin(self, admin):
+        """
+        Retourne l'état du lecteur de l'administrateur et l'instant (horloge monotone)
+        auquel `progress_ms` correspond, estimé au milieu de l'aller-retour.
+        """
+        client = get_spotify_client()
+        start = time.monotonic()
+        response = token_manager.call(admin, lambda token: client.get("/me/player", token))
+        end = time.monotonic()
+        self._admin_latency_ms = (end - start) * 1000
+        self.polls += 1
+        if response is None or response.status_code != 200:
+            return None, end
+        return response.json(), (start + end) / 2
+
+    def _tick(self, group):
+        config = self.config
+        player, measured_at = self._poll_admin(group.get("admin"))
+        if not player or not player.get("is_playing") or not player.get("item"):
+            if self._anchor is not None:
+                self._anchor = None
+                self._notify(False, self.track_uri, player.get("progress_ms") if player else None)
+            return config["MAX_INTERVAL"]
+
+        track_uri = player["item"]["uri"]
+        now = time.monotonic()
+        position_ms = player["progress_ms"] + (now - measured_at) * 1000
+
+        members = [member for member in group["members"] if member != group.get("admin")]
+        changed = track_uri != self.track_uri or self._drift(position_ms, now) > config["DRIFT_THRESHOLD_MS"]
+        targets = members if changed else [member for member in members if member not in self.synced_members]
+
+        if targets:
+            results = self._push(targets, track_uri, player["progress_ms"], measured_at)
+            synced = {result["member"] for result in results if result["status"] == "synced"}
+            self.synced_members = (set() if changed else self.synced_members) | synced
+        self.synced_members &= set(members)
+        self.track_uri = track_uri
+        self._anchor = (player["progress_ms"], measured_at)
+        if changed:
+            self._notify(True, track_uri, int(position_ms))
+
+        if changed:
+            interval = config["MIN_INTERVAL"]
+        else:
+            interval = min(self.interval * config["BACKOFF"], config["MAX_INTERVAL"])
+        remaining = (player["item"].get("duration_ms", 0) - position_ms) / 1000
+        if remaining > 0:
+            interval = min(interval, max(config["MIN_INTERVAL"], remaining))
+        return interval
+
+    def _notify(self, is_playing, track_uri, position_ms):
+        playback_changed.send(sender=GroupSyncLoop, group_name=self.group_name, playback={
+            "is_playing": is_playing, "track_uri": track_uri, "position_ms": position_ms,
+        })
+
+    def _drift(self, position_ms, now):
+        """Écart entre la position de l'administrateur et celle attendue depuis la dernière mesure."""
+        if self._anchor is None:
+            return float("inf")
+        anchor_ms, anchor_at = self._anchor
+        return abs(position_ms - (anchor_ms + (now - anchor_at) * 1000))
+
+    def _push(self, members, track_uri, progress_ms, measured_at):
+        def play(member):
+            # Position au moment de l'envoi, avancée de la demi-latence moyenne du membre
+            # (à défaut de mesure, celle de l'administrateur)
+            latency_ms = self.latencies.get(member, self._admin_latency_ms)
+            position_ms = progress_ms + (time.monotonic() - measured_at) * 1000 + latency_ms / 2
+            result = play_for_member(member, track_uri, int(position_ms))
+            if result["status"] == "synced":
+                previous = self.latencies.get(member, result["latency_ms"])
+                self.latencies[member] = previous + LATENCY_SMOOTHING * (result["latency_ms"] - previous)
+            return result
+
+        executor = get_executor()
+        futures = [executor.submit(play, member) for member in members]
+        self.last_results = [future.result() for future in futures]
+        self.pushes += 1
+        return self.last_results
+
+
+_loops = {}
+_loops_lock = threading.Lock()
+
+
+def start_sync_loop(group_name):
+    """
+    Démarre la boucle de synchronisation d'un groupe, si elle ne tourne pas déjà.
+
+    **Retour** :
+    - La boucle du groupe.
+
+    **Exceptions** :
+    - `SyncLoopLimitExceeded` : Si `MAX_LOOPS` boucles d'autres groupes tournent déjà.
+    """
+    with _loops_lock:
+        loop = _loops.get(group_name)
+        if loop is None or not loop.running:
+            running = sum(1 for name, other in _loops.items() if name != group_name and other.running)
+            if running >= sync_loop_settings()["MAX_LOOPS"]:
+                raise SyncLoopLimitExceeded("Trop de synchronisations en cours")
+            loop = _loops[group_name] = GroupSyncLoop(group_name)
+            loop.start()
+        return loop
+
+
+def stop_sync_loop(group_name):
+    """
+    Arrête la boucle de synchronisation d'un groupe.
+
+    **Retour** :
+    - La boucle arrêtée, ou `None` si aucune boucle ne tournait pour ce groupe.
+    """
+    with _loops_lock:
+        loop = _loops.pop(group_name, None)
+    if loop is not None:
+        loop.stop()
+    return loop
+
+
+def get_sync_loop(group_name):
+    with _loops_lock:
+        return _loops.get(group_name)
+
+
+def discard_sync_loop(group_name, loop):
+    with _loops_lock:
+        if _loops.get(group_name) is loop:
+            del _loops[group_name]
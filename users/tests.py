@@ -1,3 +1,1360 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import decimal
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from unittest import mock
+import requests
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import Client, SimpleTestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import USER_CACHE
+from .backends import JSONBackend, SQLiteBackend, get_storage
+from .bulk import apply_bulk
+from .events import GroupChannel, stream_group_events
+from .group_personality import discard_group_taste
+from .loadtest import FakeSpotifyServer, storage_settings
+from .models import GroupManager, UserManager
+from .personality import CACHE_STATUS_HEADER, PERSONALITY_CACHE, fetch_histories
+from .playback import sync_members
+from .ratelimit import BACKGROUND, INTERACTIVE, RateLimitExceeded, RateLimiter, get_rate_limiter
+from . import serialization
+from .renderers import JSONRenderer
+from .serialization import dumps, loads
+from .signals import deferred_signals, member_joined, user_created
+from .singleflight import AsyncSingleFlight, SingleFlight
+from .sync_loop import GroupSyncLoop, get_sync_loop, stop_sync_loop
+from .spotify import SpotifyClient, get_async_spotify_client, get_spotify_client, spotify_token_url
+from .store import GroupStore, JSONStore
+from .tokens import token_manager
+from .utils import save_spotify_token
 
-# Create your tests here.
+
+class StorageTestCase(SimpleTestCase):
+    """
+    Base des tests du stockage : chaque test utilise des fichiers dans un dossier temporaire.
+    """
+    backend = "json"
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(SPOTYNOV_STORAGE=storage_settings(self.backend, self.directory))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def bearer(self, username):
+        token = AccessToken()
+        token["username"] = username
+        return f"Bearer {token}"
+
+
+class ResidentUserStoreTests(StorageTestCase):
+    """
+    Les utilisateurs restent en mémoire entre deux appels ; `users.json` n'est relu que
+    s'il a été modifié, y compris par un autre programme.
+    """
+    def test_not_parsed_again_without_change(self):
+        UserManager.create_user("alice", "secret")
+        users = UserManager.load_users()
+        self.assertTrue(UserManager.user_exists("alice"))
+        self.assertIs(UserManager.load_users(), users)
+
+    def test_reloaded_after_external_edit(self):
+        UserManager.create_user("alice", "secret")
+        store = get_storage().users
+        store.compact()
+        self.assertTrue(UserManager.user_exists("alice"))
+
+        with open(store.path, "wb") as f:
+            f.write(dumps({"bob": {"password": "hash"}}))
+        self.assertTrue(UserManager.user_exists("bob"))
+        self.assertFalse(UserManager.user_exists("alice"))
+
+
+class GroupIndexTests(StorageTestCase):
+    """
+    L'index inverse des membres (`GroupStore.user_groups`, `members`) suit les arrivées,
+    départs et suppressions de groupes, et correspond à un index reconstruit depuis les fichiers.
+    """
+    def assertIndexConsistent(self):
+        store = get_storage().groups
+        reloaded = GroupStore(store.path)
+        reloaded.data
+        for index in (store, reloaded):
+            expected = {}
+            for group_name, group in index.data.items():
+                for username in group["members"]:
+                    expected.setdefault(username, []).append(group_name)
+            self.assertEqual(index.user_groups, expected)
+            self.assertEqual(
+                index.members, {name: set(group["members"]) for name, group in index.data.items()}
+            )
+
+    def test_join_and_leave(self):
+        GroupManager.create_group("rock", "alice")
+        GroupManager.join_group("rock", "bob")
+        self.assertEqual(GroupManager.get_user_group("bob"), "rock")
+        self.assertTrue(get_storage().is_member("rock", "bob"))
+        self.assertIndexConsistent()
+
+        GroupManager.leave_group("bob")
+        self.assertIsNone(GroupManager.get_user_group("bob"))
+        self.assertFalse(get_storage().is_member("rock", "bob"))
+        self.assertIndexConsistent()
+
+    def test_join_twice_is_rejected(self):
+        GroupManager.create_group("rock", "alice")
+        self.assertIn("error", GroupManager.join_group("rock", "alice"))
+        self.assertEqual(GroupManager.get_group("rock")["members"], ["alice"])
+        self.assertIndexConsistent()
+
+    def test_group_deleted_with_its_last_member(self):
+        GroupManager.create_group("rock", "alice")
+        GroupManager.create_group("jazz", "bob")
+        GroupManager.leave_group("alice")
+        self.assertIsNone(GroupManager.get_group("rock"))
+        self.assertIsNone(GroupManager.get_user_group("alice"))
+        self.assertNotIn("rock", get_storage().groups.names)
+        self.assertEqual(GroupManager.get_user_group("bob"), "jazz")
+        self.assertIndexConsistent()
+
+    def test_admin_reassigned_on_leave(self):
+        GroupManager.create_group("rock", "alice")
+        GroupManager.join_group("rock", "bob")
+        GroupManager.leave_group("alice")
+        self.assertEqual(GroupManager.get_group("rock"), {"members": ["bob"], "admin": "bob"})
+        self.assertIndexConsistent()
+
+    def test_save_groups_rebuilds_index(self):
+        GroupManager.create_group("rock", "alice")
+        GroupManager.save_groups({"jazz": {"members": ["alice", "carol"], "admin": "carol"}})
+        self.assertEqual(GroupManager.get_user_group("alice"), "jazz")
+        self.assertEqual(GroupManager.get_user_group("carol"), "jazz")
+        self.assertIndexConsistent()
+
+
+class BackendParityTests(SimpleTestCase):
+    """
+    Les moteurs JSON et SQLite donnent les mêmes résultats pour les mêmes opérations.
+    """
+    def run_scenario(self, backend):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(SPOTYNOV_STORAGE=storage_settings(backend, directory.name)):
+            results = [
+                UserManager.create_user("alice", "secret"),
+                UserManager.create_user("alice", "other"),
+                UserManager.create_user("bob", "secret"),
+                UserManager.create_user("carol", "secret"),
+                UserManager.delete_user("carol"),
+                UserManager.delete_user("carol"),
+                GroupManager.create_group("rock", "alice"),
+                GroupManager.create_group("rock", "bob"),
+                GroupManager.join_group("rock", "bob"),
+                GroupManager.join_group("rock", "bob"),
+                GroupManager.join_group("missing", "bob"),
+                GroupManager.create_group("jazz", "dave"),
+                GroupManager.create_group("rap", "erin"),
+                GroupManager.leave_group("erin"),
+                GroupManager.leave_group("erin"),
+            ]
+            storage = get_storage()
+            return {
+                "results": results,
+                "users": UserManager.load_users(),
+                "groups": GroupManager.load_groups(),
+                "authenticated": UserManager.authenticate_user("alice", "secret") is not None,
+                "rejected": UserManager.authenticate_user("alice", "wrong") is None,
+                "user_groups": {name: GroupManager.get_user_group(name) for name in ("alice", "bob", "dave", "erin")},
+                "membership": [storage.is_member("rock", "bob"), storage.is_member("jazz", "bob")],
+                "page": storage.group_page("", "jazz", 10),
+                "prefix": storage.group_page("r", None, 10),
+                "iterated": list(storage.iter_groups(limit=2)),
+            }
+
+    def test_same_results(self):
+        self.assertEqual(self.run_scenario("json"), self.run_scenario("sqlite"))
+
+    def test_versions_increase_on_write(self):
+        for backend in ("json", "sqlite"):
+            with self.subTest(backend=backend):
+                directory = tempfile.TemporaryDirectory()
+                self.addCleanup(directory.cleanup)
+                with override_settings(SPOTYNOV_STORAGE=storage_settings(backend, directory.name)):
+                    GroupManager.create_group("rock", "alice")
+                    group_version = GroupManager.get_group_version("rock")[0]
+                    groups_version = GroupManager.get_groups_version()[0]
+                    GroupManager.create_group("jazz", "bob")
+                    self.assertEqual(GroupManager.get_group_version("rock")[0], group_version)
+                    GroupManager.join_group("rock", "carol")
+                    self.assertGreater(GroupManager.get_group_version("rock")[0], group_version)
+                    self.assertGreater(GroupManager.get_groups_version()[0], groups_version)
+
+    def test_migrate_json_storage(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source = JSONBackend(
+            os.path.join(directory.name, "users.json"), os.path.join(directory.name, "groups.json")
+        )
+        source.put_user("alice", {"password": "a"})
+        source.put_user("bob", {"password": "b", "spotify_access_token": "token"})
+        source.put_group("rock", {"members": ["alice", "bob"], "admin": "bob"})
+        source.put_group("jazz", {"members": ["carol"], "admin": "carol"})
+        source.delete_group("jazz")
+        database = os.path.join(directory.name, "spotynov.sqlite3")
+
+        call_command(
+            "migrate_json_storage", users_file=source.users.path, groups_file=source.groups.path,
+            database=database, stdout=io.StringIO(),
+        )
+        target = SQLiteBackend(database)
+        self.assertEqual(target.load_users(), source.load_users())
+        self.assertEqual(target.load_groups(), source.load_groups())
+        self.assertEqual(target.get_user_group("alice"), "rock")
+
+
+
+class SerializationTests(SimpleTestCase):
+    """
+    L'encodage par orjson et par le module `json` produit les mêmes octets.
+    """
+    value = {
+        "name": "Beyoncé — 東京 🎵",
+        "escaped": "\u2028\x00\"\\/\t",
+        "price": decimal.Decimal("1.10"),
+        "label": gettext_lazy("Groupe"),
+        "played_at": datetime.datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=datetime.timezone.utc),
+        "added_at": datetime.datetime(2024, 1, 2, 3, 4, 5),
+        "day": datetime.date(2024, 1, 2),
+        "numbers": [0, -1, 2 ** 53, 0.1, 0.75, 123.456, -0.0, True, None],
+        "keys": {1: "a"},
+        "tracks": ("a", "b"),
+    }
+
+    def render(self, value):
+        return JSONRenderer().render(value)
+
+    def test_same_bytes_without_orjson(self):
+        self.assertIsNotNone(serialization.orjson)
+        expected = self.render(self.value)
+        with mock.patch.object(serialization, "orjson", None):
+            self.assertEqual(self.render(self.value), expected)
+            self.assertEqual(serialization.loads(expected), loads(expected))
+        self.assertIn("Beyoncé".encode(), expected)
+        self.assertIn(b'"price":1.1', expected)
+        self.assertIn(b'"played_at":"2024-01-02T03:04:05.123456Z"', expected)
+
+    def test_exponent_floats_decode_to_the_same_value(self):
+        numbers = [1e-05, 1.5e-07, 1e16, 1.2345e21, 5e-324]
+        encoded = dumps(numbers)
+        with mock.patch.object(serialization, "orjson", None):
+            self.assertEqual(loads(dumps(numbers)), loads(encoded))
+        self.assertEqual(loads(encoded), numbers)
+
+class JSONStoreTests(SimpleTestCase):
+    """
+    Journal, reprise après arrêt brutal, fusion et partage des fichiers entre instances.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "users.json")
+
+    def store(self, **kwargs):
+        return JSONStore(self.path, fsync=False, **kwargs)
+
+    def journal(self):
+        with open(f"{self.path}.log", "rb") as f:
+            return f.read()
+
+    def test_replay_after_crash_without_compaction(self):
+        store = self.store()
+        store.put("alice", {"password": "a"})
+        store.put("bob", {"password": "b"})
+        store.delete("alice")
+        # Aucun instantané n'a été écrit : tout est dans le journal
+        self.assertFalse(os.path.exists(self.path))
+
+        recovered = self.store()
+        self.assertEqual(recovered.data, {"bob": {"password": "b"}})
+        self.assertEqual(recovered.seq, 3)
+        self.assertEqual(recovered.version("alice")[0], 3)
+
+    def test_partial_last_line_is_ignored_then_truncated(self):
+        store = self.store()
+        store.put("alice", {"password": "a"})
+        with open(f"{self.path}.log", "ab") as f:
+            f.write(b'{"seq": 2, "op": "put", "key": "bob", "val')
+
+        recovered = self.store()
+        self.assertEqual(recovered.data, {"alice": {"password": "a"}})
+        self.assertEqual(recovered.seq, 1)
+
+        recovered.put("carol", {"password": "c"})
+        lines = self.journal().splitlines()
+        self.assertEqual([loads(line)["key"] for line in lines], ["alice", "carol"])
+        self.assertEqual(self.store().data, {"alice": {"password": "a"}, "carol": {"password": "c"}})
+
+    def test_compaction_resets_the_journal(self):
+        store = self.store()
+        for index in range(5):
+            store.put(f"user-{index}", {"index": index})
+        store.compact()
+
+        self.assertEqual([loads(line)["base"] for line in self.journal().splitlines()], [5])
+        with open(self.path, "rb") as f:
+            self.assertEqual(loads(f.read()), store.data)
+
+        store.put("user-5", {"index": 5})
+        recovered = self.store()
+        self.assertEqual(len(recovered.data), 6)
+        self.assertEqual(recovered.seq, 6)
+
+    def test_compaction_after_threshold(self):
+        store = self.store(compact_threshold=3)
+        for index in range(3):
+            store.put(f"user-{index}", {"index": index})
+        # La fusion a lieu en arrière-plan : elle attend le verrou du store
+        for _ in range(100):
+            with store.transaction():
+                if store._journal_records == 0:
+                    break
+            time.sleep(0.01)
+        self.assertEqual([loads(line)["base"] for line in self.journal().splitlines()], [3])
+        self.assertEqual(self.store().data, store.data)
+
+    def test_batch_is_appended_once(self):
+        store = self.store()
+        with store.batch():
+            store.put("alice", {"password": "a"})
+            store.put("bob", {"password": "b"})
+            self.assertFalse(os.path.exists(f"{self.path}.log"))
+        self.assertEqual(len(self.journal().splitlines()), 2)
+        self.assertEqual(self.store().data, {"alice": {"password": "a"}, "bob": {"password": "b"}})
+
+    def test_failed_batch_is_rolled_back(self):
+        store = self.store()
+        store.put("alice", {"password": "a"})
+        with self.assertRaises(RuntimeError):
+            with store.batch():
+                store.put("bob", {"password": "b"})
+                store.delete("alice")
+                raise RuntimeError
+        self.assertEqual(store.data, {"alice": {"password": "a"}})
+        self.assertEqual(store.seq, 1)
+        self.assertEqual(len(self.journal().splitlines()), 1)
+
+    def test_second_instance_sees_writes(self):
+        first = self.store()
+        second = self.store()
+        first.put("alice", {"password": "a"})
+        self.assertEqual(second.get("alice"), {"password": "a"})
+
+        before = second.version("alice")[0]
+        first.put("alice", {"password": "b"})
+        self.assertGreater(second.version("alice")[0], before)
+        self.assertEqual(second.get("alice"), {"password": "b"})
+
+        second.delete("alice")
+        self.assertIsNone(first.get("alice"))
+
+    def test_second_instance_reloads_after_compaction(self):
+        first = self.store()
+        second = self.store()
+        first.put("alice", {"password": "a"})
+        second.data
+        first.put("bob", {"password": "b"})
+        first.compact()
+        first.put("carol", {"password": "c"})
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.seq, first.seq)
+
+    def test_external_edit_gets_a_new_version(self):
+        store = self.store()
+        store.put("alice", {"password": "a"})
+        store.compact()
+        other = self.store()
+        self.assertEqual(other.version()[0], store.version()[0])
+
+        for value in ("b", "c"):
+            before = store.version("alice")[0]
+            with open(self.path, "wb") as f:
+                f.write(dumps({"alice": {"password": value}}))
+            self.assertEqual(store.get("alice"), {"password": value})
+            self.assertGreater(store.version("alice")[0], before)
+            self.assertEqual(other.version()[0], store.version()[0])
+            self.assertEqual(self.store().version()[0], store.version()[0])
+
+    def test_snapshot_without_journal_is_numbered(self):
+        with open(self.path, "wb") as f:
+            f.write(dumps({"alice": {"password": "a"}}))
+        store = self.store()
+        self.assertEqual(store.version("alice")[0], 1)
+        store.put("bob", {"password": "b"})
+        self.assertEqual(self.store().version()[0], 2)
+
+
+class UserCacheTests(StorageTestCase):
+    """
+    Les utilisateurs résolus par `CustomJWTAuthentication` sont mis en cache, et l'entrée
+    disparaît dès que l'utilisateur est supprimé.
+    """
+    path = "/api/protected/"
+
+    def setUp(self):
+        super().setUp()
+        USER_CACHE.clear()
+        self.addCleanup(USER_CACHE.clear)
+        UserManager.create_user("alice", "secret")
+
+    def test_cached_after_first_request(self):
+        self.assertEqual(self.client.get(self.path, HTTP_AUTHORIZATION=self.bearer("alice")).status_code, 200)
+        self.assertIsNotNone(USER_CACHE.get("alice"))
+
+    def test_invalidated_on_delete(self):
+        authorization = self.bearer("alice")
+        self.assertEqual(self.client.get(self.path, HTTP_AUTHORIZATION=authorization).status_code, 200)
+
+        UserManager.delete_user("alice")
+        self.assertIsNone(USER_CACHE.get("alice"))
+        response = self.client.get(self.path, HTTP_AUTHORIZATION=authorization)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["code"], "user_not_found")
+
+
+class ConditionalGetTests(StorageTestCase):
+    """
+    Une réponse 304 n'est jamais envoyée pour des données modifiées, même hors de l'API.
+    """
+    def test_group_list_after_external_edit(self):
+        GroupManager.create_group("rock", "alice")
+        get_storage().groups.compact()
+        etag = self.client.get("/api/groups/")["ETag"]
+        self.assertEqual(self.client.get("/api/groups/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with open(get_storage().groups.path, "wb") as f:
+            f.write(dumps({"jazz": {"members": ["bob"], "admin": "bob"}}))
+        response = self.client.get("/api/groups/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(loads(b"".join(response.streaming_content)), {"jazz": {"members": ["bob"], "admin": "bob"}})
+
+
+class TokenManagerTests(StorageTestCase):
+    def test_lock_released_when_user_deleted(self):
+        UserManager.create_user("alice", "secret")
+        self.assertIsNone(token_manager.refresh("alice"))
+        self.assertIn("alice", token_manager._locks)
+        UserManager.delete_user("alice")
+        self.assertNotIn("alice", token_manager._locks)
+
+
+class FakeSpotifyTestCase(StorageTestCase):
+    """
+    Base des tests qui appellent Spotify : les appels sont dirigés vers `FakeSpotifyServer`.
+    """
+    def setUp(self):
+        super().setUp()
+        self.spotify = FakeSpotifyServer(tracks=10)
+        self.spotify.start()
+        self.addCleanup(self.spotify.stop)
+        settings_override = override_settings(
+            SPOTIFY_API_URL=self.spotify.api_url, SPOTIFY_TOKEN_URL=self.spotify.token_url
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class SpotifyClientTests(FakeSpotifyTestCase):
+    """
+    Un seul client Spotify est partagé par le processus, et ses connexions sont réutilisées
+    d'une requête à l'autre.
+    """
+    def test_client_is_shared_until_settings_change(self):
+        client = get_spotify_client()
+        self.assertIs(get_spotify_client(), client)
+        with override_settings(SPOTIFY_HTTP={"POOL_SIZE": 2}):
+            self.assertIsNot(get_spotify_client(), client)
+
+    def test_connection_is_kept_alive(self):
+        ports = []
+
+        def player(handler, params):
+            ports.append(handler.client_address[1])
+            handler._send(200, dumps({"is_playing": False}))
+
+        self.spotify.routes[("GET", "/v1/me/player")] = player
+        for _ in range(3):
+            self.assertEqual(get_spotify_client().get("/me/player", "token").status_code, 200)
+        self.assertEqual(len(ports), 3)
+        self.assertEqual(len(set(ports)), 1)
+
+
+
+class RecordingTests(FakeSpotifyTestCase):
+    """
+    Les échanges enregistrés avec Spotify sont rejoués à l'identique sans réseau, et aucun
+    secret n'est écrit dans la cassette.
+    """
+    def setUp(self):
+        super().setUp()
+        self.cassette = os.path.join(self.directory, "spotify_fixtures.jsonl")
+
+    def recording(self, mode, **options):
+        return override_settings(SPOTIFY_RECORDING={"MODE": mode, "FILE": self.cassette, **options})
+
+    def exchanges(self, client):
+        etag = client.get("/me/top/tracks", "secret-token", params={"limit": 2}).headers["ETag"]
+        responses = [
+            client.get("/me/player", "secret-token"),
+            client.get("/me/top/tracks", "secret-token", params={"limit": 2}, headers={"If-None-Match": etag}),
+            client.post(spotify_token_url(), data={
+                "grant_type": "refresh_token", "refresh_token": "secret-refresh",
+                "client_id": "secret-id", "client_secret": "secret-key",
+            }),
+        ]
+        return [(response.status_code, response.headers.get("ETag"), response.content) for response in responses]
+
+    def test_replay_matches_recording(self):
+        with self.recording("record"):
+            recorded = self.exchanges(get_spotify_client())
+        self.assertEqual([status for status, _, _ in recorded], [200, 304, 200])
+
+        with open(self.cassette, "rb") as f:
+            content = f.read()
+        self.assertNotIn(b"secret-", content)
+
+        self.spotify.stop()
+        calls = self.spotify.stats()
+        with self.recording("replay"):
+            replayed = self.exchanges(get_spotify_client())
+        self.assertEqual(replayed[:2], recorded[:2])
+        self.assertEqual(loads(replayed[2][2]), {"access_token": "<redacted>", "expires_in": 3600})
+        self.assertEqual(self.spotify.stats(), calls)
+
+        async def exchanges():
+            client = get_async_spotify_client()
+            response = await client.get("/me/player", "other-token")
+            return response.status_code, response.content
+
+        with self.recording("replay"):
+            self.assertEqual(asyncio.run(exchanges()), (200, recorded[0][2]))
+
+    def test_unknown_request_is_a_connection_error(self):
+        with self.recording("replay"):
+            with self.assertRaises(requests.ConnectionError):
+                get_spotify_client().get("/me/player", "token")
+
+    def test_replay_emulates_timing(self):
+        def player(handler, params):
+            time.sleep(0.2)
+            handler._send(200, dumps({"is_playing": False}))
+
+        self.spotify.routes[("GET", "/v1/me/player")] = player
+        with self.recording("record"):
+            get_spotify_client().get("/me/player", "token")
+        with self.recording("replay", EMULATE_TIMING=True):
+            start = time.perf_counter()
+            self.assertEqual(get_spotify_client().get("/me/player", "token").json(), {"is_playing": False})
+            self.assertGreaterEqual(time.perf_counter() - start, 0.2)
+
+class SyncMembersTests(FakeSpotifyTestCase):
+    """
+    Chaque membre est synchronisé avec son propre token, et l'échec de l'un n'empêche pas
+    la synchronisation des autres.
+    """
+    def test_each_member_uses_own_token(self):
+        for username in ("alice", "bob", "carol", "dave"):
+            UserManager.create_user(username, "secret")
+        for username in ("alice", "bob", "carol"):
+            save_spotify_token(username, f"{username}-token", f"{username}-refresh", 3600)
+        received = []
+
+        def play(handler, params):
+            authorization = handler.headers["Authorization"]
+            received.append(authorization)
+            handler._send(403 if authorization == "Bearer bob-token" else 204)
+
+        self.spotify.routes[("PUT", "/v1/me/player/play")] = play
+        results = sync_members(["alice", "bob", "carol", "dave"], "spotify:track:1", 1000)
+
+        self.assertEqual(
+            [(result["member"], result["status"], result["status_code"]) for result in results],
+            [("alice", "synced", 204), ("bob", "error", 403), ("carol", "synced", 204), ("dave", "no_token", None)],
+        )
+        self.assertEqual(
+            sorted(received), ["Bearer alice-token", "Bearer bob-token", "Bearer carol-token"]
+        )
+
+
+class AsyncViewParityTests(FakeSpotifyTestCase):
+    """
+    Les vues asynchrones répondent comme leurs équivalents synchrones.
+    """
+    def setUp(self):
+        super().setUp()
+        UserManager.create_user("alice", "secret")
+        self.spotify.routes[("POST", "/api/token")] = lambda handler, params: handler._send(200, dumps({
+            "access_token": "alice-token", "refresh_token": "alice-refresh", "expires_in": 3600,
+        }))
+
+    def test_login(self):
+        for password, expected in (("secret", 200), ("wrong", 401), ("", 401)):
+            responses = [
+                self.client.post(path, {"username": "alice", "password": password}, content_type="application/json")
+                for path in ("/api/login/", "/api/async/login/")
+            ]
+            with self.subTest(password=password):
+                self.assertEqual([response.status_code for response in responses], [expected, expected])
+                self.assertEqual(*(sorted(response.json()) for response in responses))
+
+    def test_spotify_callback(self):
+        for query in ("?code=code&state=alice", "?state=alice", "?code=code"):
+            responses = [
+                self.client.get(path + query) for path in ("/api/spotify/callback/", "/api/async/spotify/callback/")
+            ]
+            with self.subTest(query=query):
+                self.assertEqual(responses[0].status_code, responses[1].status_code)
+                self.assertEqual(responses[0].json(), responses[1].json())
+        self.assertEqual(UserManager.get_spotify_tokens("alice")["access_token"], "alice-token")
+
+
+class UserPersonalityViewTests(FakeSpotifyTestCase):
+    """
+    Le profil d'un utilisateur n'est servi depuis le cache, ou calculé avec son token
+    enregistré, qu'à l'utilisateur lui-même ; un token Spotify de l'appelant ne touche pas au cache.
+    """
+    paths = ("/api/users/alice/personality/", "/api/async/users/alice/personality/")
+
+    def setUp(self):
+        super().setUp()
+        PERSONALITY_CACHE.clear()
+        self.addCleanup(PERSONALITY_CACHE.clear)
+        UserManager.create_user("alice", "secret")
+        UserManager.create_user("bob", "secret")
+        save_spotify_token("alice", "alice-token", "alice-refresh", 3600)
+
+    def test_authentication_required(self):
+        for path in self.paths:
+            with self.subTest(path=path):
+                self.client.get(path, HTTP_AUTHORIZATION=self.bearer("alice"))
+                self.assertEqual(self.client.get(path).status_code, 401)
+
+    def test_other_user_is_refused(self):
+        for path in self.paths:
+            with self.subTest(path=path):
+                self.client.get(path, HTTP_AUTHORIZATION=self.bearer("alice"))
+                self.assertEqual(self.client.get(path, HTTP_AUTHORIZATION=self.bearer("bob")).status_code, 403)
+
+    def test_own_profile_is_cached(self):
+        for path in self.paths:
+            with self.subTest(path=path):
+                PERSONALITY_CACHE.clear()
+                first = self.client.get(path, HTTP_AUTHORIZATION=self.bearer("alice"))
+                self.assertEqual(first.status_code, 200)
+                self.assertEqual(first[CACHE_STATUS_HEADER], "MISS")
+                second = self.client.get(path, HTTP_AUTHORIZATION=self.bearer("alice"))
+                self.assertEqual(second[CACHE_STATUS_HEADER], "HIT")
+                self.assertEqual(second.json(), first.json())
+
+    def test_caller_token_bypasses_cache(self):
+        for path in self.paths:
+            with self.subTest(path=path):
+                PERSONALITY_CACHE.clear()
+                response = self.client.get(path, HTTP_AUTHORIZATION="caller-token")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response[CACHE_STATUS_HEADER], "BYPASS")
+                self.assertEqual(PERSONALITY_CACHE.lookup("alice"), (None, False))
+
+
+class GroupPersonalityViewTests(FakeSpotifyTestCase):
+    """
+    Le profil d'un groupe n'est servi qu'à ses membres, avant tout appel à Spotify.
+    """
+    path = "/api/groups/rock/personality/"
+
+    def setUp(self):
+        super().setUp()
+        for username in ("alice", "mallory"):
+            UserManager.create_user(username, "secret")
+        save_spotify_token("alice", "alice-token", "alice-refresh", 3600)
+        # N'importe qui peut créer un groupe au nom d'un autre utilisateur
+        GroupManager.create_group("rock", "alice")
+        self.addCleanup(discard_group_taste, "rock")
+
+    def test_anonymous_caller_is_refused(self):
+        self.assertEqual(self.client.get(self.path).status_code, 401)
+        self.assertEqual(self.spotify.stats(), {})
+
+    def test_other_user_is_refused(self):
+        self.assertEqual(self.client.get(self.path, HTTP_AUTHORIZATION=self.bearer("mallory")).status_code, 403)
+        self.assertEqual(self.spotify.stats(), {})
+
+    def test_member_gets_profile(self):
+        response = self.client.get(self.path, HTTP_AUTHORIZATION=self.bearer("alice"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["analysed_members"], 1)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def wait_for_queue(self, limiter, depth):
+        for _ in range(200):
+            if limiter.stats()["queue_depth"] == depth:
+                return
+            time.sleep(0.005)
+        self.fail(f"File d'attente de profondeur {limiter.stats()['queue_depth']} au lieu de {depth}")
+
+    def test_interactive_requests_pass_first(self):
+        limiter = RateLimiter(rate=5, burst=1, max_wait=5)
+        limiter.acquire()
+        order = []
+
+        def acquire(name, priority):
+            limiter.acquire(priority)
+            order.append(name)
+
+        threads = []
+        for depth, (name, priority) in enumerate(
+            [("background-1", BACKGROUND), ("background-2", BACKGROUND), ("interactive", INTERACTIVE)], 1
+        ):
+            thread = threading.Thread(target=acquire, args=(name, priority))
+            thread.start()
+            threads.append(thread)
+            self.wait_for_queue(limiter, depth)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, ["interactive", "background-1", "background-2"])
+
+    def test_throttle_blocks_all_requests(self):
+        limiter = RateLimiter(rate=1000, burst=10, max_wait=5)
+        limiter.throttle(0.2)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        self.assertEqual(limiter.stats()["throttled"], 1)
+
+    def test_wait_beyond_max_wait_is_rejected(self):
+        limiter = RateLimiter(rate=1000, burst=10, max_wait=0.05)
+        limiter.throttle(1)
+        with self.assertRaises(RateLimitExceeded):
+            limiter.acquire()
+        stats = limiter.stats()
+        self.assertEqual((stats["rejected"], stats["queue_depth"]), (1, 0))
+
+    def test_invalid_settings(self):
+        for config in ({"RATE": 0}, {"RATE": -1}, {"BURST": 0}, {"BURST": 0.5}):
+            with self.subTest(config=config), override_settings(SPOTIFY_RATE_LIMIT=config):
+                with self.assertRaises(ImproperlyConfigured):
+                    get_rate_limiter()
+
+    def test_client_waits_after_429(self):
+        spotify = FakeSpotifyServer()
+        responses = [429, 200]
+
+        def player(handler, params):
+            status = responses.pop(0)
+            handler._send(status, dumps({}), {"Retry-After": "0.2"} if status == 429 else None)
+
+        spotify.routes[("GET", "/v1/me/player")] = player
+        spotify.start()
+        self.addCleanup(spotify.stop)
+        limiter = RateLimiter(rate=1000, burst=10, max_wait=5, retries=1)
+        client = SpotifyClient(limiter=limiter, coalesce=False)
+
+        start = time.monotonic()
+        response = client.get(f"{spotify.api_url}/me/player", "token")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        self.assertEqual(limiter.stats()["throttled"], 1)
+        self.assertEqual(spotify.stats(), {"GET /v1/me/player": 2})
+
+
+class ExecutorPriorityTests(FakeSpotifyTestCase):
+    """
+    Les collectes d'historique qui attendent le régulateur n'occupent pas les threads des
+    commandes de lecture : une synchronisation passe avant les collectes en attente.
+    """
+    def test_sync_push_is_not_queued_behind_collections(self):
+        UserManager.create_user("member", "secret")
+        save_spotify_token("member", "member-token", "member-refresh", 3600)
+        served_before_push = []
+
+        def gets_served():
+            return sum(calls for route, calls in self.spotify.stats().items() if route.startswith("GET"))
+
+        def play(handler, params):
+            served_before_push.append(gets_served())
+            handler._send(204)
+
+        self.spotify.routes[("PUT", "/v1/me/player/play")] = play
+        client = get_spotify_client()
+        gets = {
+            username: lambda path, params, headers, token=f"{username}-token": client.get(
+                path, token, params=params, headers=headers, priority=BACKGROUND
+            )
+            for username in (f"user-{index}" for index in range(8))
+        }
+
+        with override_settings(SPOTIFY_RATE_LIMIT={"RATE": 40, "BURST": 1}):
+            collection = threading.Thread(target=fetch_histories, args=(gets,))
+            collection.start()
+            self.addCleanup(collection.join)
+            limiter = get_rate_limiter()
+            for _ in range(200):
+                if limiter.stats()["background_waiting"] >= 7:
+                    break
+                time.sleep(0.005)
+            self.assertGreaterEqual(limiter.stats()["background_waiting"], 7)
+
+            before = gets_served()
+            results = sync_members(["member"], "spotify:track:1", 0)
+            collection.join()
+
+        self.assertEqual(results[0]["status"], "synced")
+        # Au plus la requête qui détenait déjà le jeton suivant est passée avant la commande
+        self.assertLessEqual(served_before_push[0] - before, 2)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def run_concurrently(self, flight, key, call, callers=5):
+        results = []
+
+        def caller():
+            try:
+                results.append(flight.do(key, call))
+            except Exception as error:
+                results.append(error)
+
+        threads = [threading.Thread(target=caller) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for _ in range(200):
+            if flight.stats()["coalesced"] == callers - 1:
+                break
+            time.sleep(0.005)
+        return threads, results
+
+    def test_identical_calls_are_coalesced(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(1)
+            release.wait(5)
+            return {"value": 42}
+
+        threads, results = self.run_concurrently(flight, "key", call)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"value": 42}] * 5)
+        self.assertEqual(flight.stats(), {"in_flight": 0, "executed": 1, "coalesced": 4})
+
+    def test_error_is_raised_to_every_caller(self):
+        flight = SingleFlight()
+        release = threading.Event()
+
+        def call():
+            release.wait(5)
+            raise ValueError("Spotify")
+
+        threads, results = self.run_concurrently(flight, "key", call)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_results_are_not_kept(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do("key", lambda: 1), 1)
+        self.assertEqual(flight.do("key", lambda: 2), 2)
+        self.assertEqual(flight.do("other", lambda: 3), 3)
+        self.assertEqual(flight.stats(), {"in_flight": 0, "executed": 3, "coalesced": 0})
+
+    def test_async_calls_are_coalesced(self):
+        async def scenario():
+            flight = AsyncSingleFlight()
+            calls = []
+
+            async def call():
+                calls.append(1)
+                await asyncio.sleep(0.05)
+                return "value"
+
+            async def failing():
+                await asyncio.sleep(0.05)
+                raise ValueError("Spotify")
+
+            results = await asyncio.gather(*(flight.do("key", call) for _ in range(5)))
+            errors = await asyncio.gather(*(flight.do("error", failing) for _ in range(3)), return_exceptions=True)
+            return calls, results, errors, flight.stats()
+
+        calls, results, errors, stats = asyncio.run(scenario())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 5)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+        self.assertEqual(stats, {"in_flight": 0, "executed": 2, "coalesced": 6})
+
+
+class GroupSyncLoopTests(FakeSpotifyTestCase):
+    def setUp(self):
+        super().setUp()
+        for username in ("admin", "linked", "unlinked"):
+            UserManager.create_user(username, "secret")
+        save_spotify_token("admin", "admin-token", "admin-refresh", 3600)
+        save_spotify_token("linked", "linked-token", "linked-refresh", 3600)
+        GroupManager.create_group("rock", "admin")
+        GroupManager.join_group("rock", "linked")
+        GroupManager.join_group("rock", "unlinked")
+
+    def test_failed_members_are_retried(self):
+        loop = GroupSyncLoop("rock")
+        loop._tick(GroupManager.get_group("rock"))
+        self.assertEqual(loop.synced_members, {"linked"})
+        self.assertEqual(
+            {result["member"]: result["status"] for result in loop.last_results},
+            {"linked": "synced", "unlinked": "no_token"},
+        )
+
+        save_spotify_token("unlinked", "unlinked-token", "unlinked-refresh", 3600)
+        loop._tick(GroupManager.get_group("rock"))
+        self.assertEqual(loop.synced_members, {"linked", "unlinked"})
+        self.assertEqual([result["member"] for result in loop.last_results], ["unlinked"])
+
+    def test_unexpected_player_response_backs_off(self):
+        self.spotify.routes[("GET", "/v1/me/player")] = (
+            lambda handler, params: handler._send(200, dumps({"is_playing": True, "item": {"duration_ms": 1000}}))
+        )
+        with override_settings(SPOTYNOV_SYNC_LOOP={"MIN_INTERVAL": 0.01, "MAX_INTERVAL": 0.05}):
+            loop = GroupSyncLoop("rock")
+        loop.start()
+        self.addCleanup(loop.stop)
+        for _ in range(200):
+            if loop.polls >= 2:
+                break
+            time.sleep(0.005)
+        self.assertGreaterEqual(loop.polls, 2)
+        self.assertTrue(loop.running)
+        self.assertEqual(loop.interval, 0.05)
+
+
+    def test_unexpected_error_does_not_stop_loop(self):
+        self.spotify.routes[("GET", "/v1/me/player")] = lambda handler, params: handler._send(200, dumps({
+            "is_playing": True, "progress_ms": None, "item": {"uri": "spotify:track:1", "duration_ms": 1000},
+        }))
+        with override_settings(SPOTYNOV_SYNC_LOOP={"MIN_INTERVAL": 0.01, "MAX_INTERVAL": 0.05}):
+            loop = GroupSyncLoop("rock")
+        with self.assertLogs("users.sync_loop", "ERROR"):
+            loop.start()
+            self.addCleanup(loop.stop)
+            for _ in range(200):
+                if loop.polls >= 2:
+                    break
+                time.sleep(0.005)
+        self.assertGreaterEqual(loop.polls, 2)
+        self.assertTrue(loop.running)
+        self.assertEqual(loop.interval, 0.05)
+
+
+class SyncLoopViewTests(FakeSpotifyTestCase):
+    """
+    Seul l'administrateur d'un groupe démarre ou arrête sa boucle, et le nombre de boucles
+    est borné.
+    """
+    def setUp(self):
+        super().setUp()
+        for username in ("admin", "member", "other"):
+            UserManager.create_user(username, "secret")
+        GroupManager.create_group("rock", "admin")
+        GroupManager.join_group("rock", "member")
+        GroupManager.create_group("jazz", "other")
+        for group_name in ("rock", "jazz"):
+            self.addCleanup(stop_sync_loop, group_name)
+
+    def post(self, path, group_name, username=None):
+        extra = {"HTTP_AUTHORIZATION": self.bearer(username)} if username else {}
+        return self.client.post(path, {"group_name": group_name}, content_type="application/json", **extra)
+
+    def test_only_admin_starts_and_stops(self):
+        for path in ("/api/groups/sync/start/", "/api/groups/sync/stop/"):
+            with self.subTest(path=path):
+                self.assertEqual(self.post(path, "rock").status_code, 401)
+                self.assertEqual(self.post(path, "rock", "member").status_code, 403)
+        self.assertIsNone(get_sync_loop("rock"))
+
+        self.assertEqual(self.post("/api/groups/sync/start/", "rock", "admin").status_code, 200)
+        self.assertIsNotNone(get_sync_loop("rock"))
+        self.assertEqual(self.post("/api/groups/sync/stop/", "rock", "member").status_code, 403)
+        self.assertEqual(self.post("/api/groups/sync/stop/", "rock", "admin").status_code, 200)
+        self.assertIsNone(get_sync_loop("rock"))
+
+    def test_number_of_loops_is_capped(self):
+        with override_settings(SPOTYNOV_SYNC_LOOP={"MAX_LOOPS": 1}):
+            self.assertEqual(self.post("/api/groups/sync/start/", "rock", "admin").status_code, 200)
+            self.assertEqual(self.post("/api/groups/sync/start/", "jazz", "other").status_code, 503)
+            self.assertEqual(self.post("/api/groups/sync/start/", "rock", "admin").status_code, 200)
+            stop_sync_loop("rock")
+            self.assertEqual(self.post("/api/groups/sync/start/", "jazz", "other").status_code, 200)
+
+
+class GroupEventsTests(SimpleTestCase):
+    """
+    Un client qui se reconnecte reçoit les événements manqués depuis `Last-Event-ID`, ou un
+    état complet s'ils ont quitté le tampon.
+    """
+    def read(self, channel, count, last_event_id=None, group=None):
+        async def load_group():
+            return group
+
+        async def read():
+            stream = stream_group_events(channel, load_group, last_event_id)
+            try:
+                return [await stream.__anext__() for _ in range(count)]
+            finally:
+                await stream.aclose()
+
+        events = []
+        for message in asyncio.run(read()):
+            fields = dict(line.split(": ", 1) for line in message.strip().splitlines())
+            events.append((int(fields["id"]), fields["event"], loads(fields["data"])))
+        return events
+
+    def publish(self, channel, usernames):
+        members = ["admin"]
+        for username in usernames:
+            members.append(username)
+            group = {"members": list(members), "admin": "admin"}
+            channel.publish("member_joined", {"username": username, **group}, group=group)
+
+    def test_replay_from_last_event_id(self):
+        channel = GroupChannel("rock", buffer_size=4)
+        self.publish(channel, ["alice", "bob", "carol"])
+        events = self.read(channel, 2, last_event_id=1)
+        self.assertEqual(
+            [(seq, event, data["username"]) for seq, event, data in events],
+            [(2, "member_joined", "bob"), (3, "member_joined", "carol")],
+        )
+        self.assertEqual(channel.subscribers, 0)
+
+    def test_resync_after_buffer_overflow(self):
+        channel = GroupChannel("rock", buffer_size=2)
+        self.publish(channel, ["alice", "bob", "carol", "dave"])
+        [(seq, event, state)] = self.read(channel, 1, last_event_id=1)
+        self.assertEqual((seq, event), (4, "state"))
+        self.assertEqual(state["members"], ["admin", "alice", "bob", "carol", "dave"])
+
+    def test_first_subscriber_loads_group(self):
+        channel = GroupChannel("rock", buffer_size=2)
+        [(seq, event, state)] = self.read(channel, 1, group={"members": ["admin"], "admin": "admin"})
+        self.assertEqual((seq, event, state["members"]), (0, "state", ["admin"]))
+        [(_, event, _)] = self.read(GroupChannel("jazz", buffer_size=2), 1)
+        self.assertEqual(event, "group_deleted")
+
+
+class GroupListViewTests(StorageTestCase):
+    """
+    Pagination de la liste des groupes par curseur, filtre par préfixe et sélection des champs.
+    """
+    path = "/api/groups/"
+
+    def setUp(self):
+        super().setUp()
+        for index, group_name in enumerate(("rock", "rap", "jazz", "reggae", "blues")):
+            GroupManager.create_group(group_name, f"user-{index}")
+        GroupManager.join_group("rock", "user-9")
+
+    def get(self, **params):
+        response = self.client.get(self.path, params)
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, loads(content)
+
+    def test_pages_follow_next_cursor(self):
+        names, params = [], {"limit": 2}
+        while True:
+            status_code, page = self.get(**params)
+            self.assertEqual(status_code, 200)
+            self.assertLessEqual(len(page["groups"]), 2)
+            names.extend(page["groups"])
+            if page["next_cursor"] is None:
+                break
+            params["cursor"] = page["next_cursor"]
+        self.assertEqual(names, ["blues", "jazz", "rap", "reggae", "rock"])
+        self.assertEqual(self.get()[1], GroupManager.load_groups())
+
+    def test_prefix_and_fields(self):
+        status_code, page = self.get(prefix="r", fields="admin,member_count")
+        self.assertEqual(status_code, 200)
+        self.assertEqual(page, {
+            "groups": {
+                "rap": {"admin": "user-1", "member_count": 1},
+                "reggae": {"admin": "user-3", "member_count": 1},
+                "rock": {"admin": "user-0", "member_count": 2},
+            },
+            "next_cursor": None,
+        })
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ({"cursor": "a"}, {"cursor": "_w"}, {"limit": "0"}, {"limit": "x"}, {"fields": "password"}):
+            with self.subTest(params=params):
+                status_code, body = self.get(**params)
+                self.assertEqual(status_code, 400)
+                self.assertIn("error", body)
+
+
+
+class GroupChangesViewTests(StorageTestCase):
+    """
+    Le flux des modifications renvoie un état complet quand les modifications depuis le
+    curseur ne sont plus toutes conservées.
+    """
+    path = "/api/groups/changes/"
+
+    def setUp(self):
+        super().setUp()
+        self.restart()
+        GroupManager.create_group("rock", "alice")
+
+    def restart(self):
+        # Nouvelle instance du stockage, comme dans un worker qui démarre
+        config = storage_settings(self.backend, self.directory)
+        config["OPTIONS"]["change_log_size"] = 2
+        settings_override = override_settings(SPOTYNOV_STORAGE=config)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get(self, **params):
+        response = self.client.get(self.path, params)
+        self.assertEqual(response.status_code, 200)
+        return loads(b"".join(response.streaming_content))
+
+    def test_changes_since_cursor(self):
+        cursor = self.get()["cursor"]
+        GroupManager.join_group("rock", "bob")
+        body = self.get(since=cursor)
+        self.assertEqual([change["group"] for change in body["changes"]], ["rock"])
+        self.assertEqual(body["changes"][0]["value"]["members"], ["alice", "bob"])
+        self.assertEqual(self.get(since=body["cursor"])["changes"], [])
+
+    def test_snapshot_when_changes_are_evicted(self):
+        cursor = self.get()["cursor"]
+        for group_name in ("rap", "jazz", "blues"):
+            GroupManager.create_group(group_name, f"{group_name}-admin")
+        body = self.get(since=cursor)
+        self.assertNotIn("changes", body)
+        self.assertEqual(body["snapshot"], GroupManager.load_groups())
+        self.assertEqual(body["cursor"], GroupManager.get_groups_version()[0])
+
+    def test_snapshot_when_cursor_predates_compaction(self):
+        cursor = self.get()["cursor"]
+        GroupManager.create_group("rap", "bob")
+        get_storage().groups.compact()
+        self.restart()
+        body = self.get(since=cursor)
+        self.assertEqual(body["snapshot"], GroupManager.load_groups())
+
+    def test_snapshot_when_cursor_is_unknown(self):
+        body = self.get(since=GroupManager.get_groups_version()[0] + 10)
+        self.assertEqual(body["snapshot"], GroupManager.load_groups())
+
+class SpotifyTokenViewTests(FakeSpotifyTestCase):
+    path = "/api/spotify/tokens/alice/"
+
+    def setUp(self):
+        super().setUp()
+        UserManager.create_user("alice", "secret")
+        save_spotify_token("alice", "alice-token", "alice-refresh", 3600)
+
+    def test_conditional_request_does_not_refresh(self):
+        # Le token arrive à expiration : seule une réponse complète le renouvelle
+        save_spotify_token("alice", "alice-token", "alice-refresh", 1)
+        etag = f'"{UserManager.get_user_version("alice")[0]}"'
+
+        response = self.client.get(self.path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("POST /api/token", self.spotify.stats())
+
+        response = self.client.get(self.path, HTTP_AUTHORIZATION=self.bearer("alice"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()["access_token"], "alice-token")
+        self.assertEqual(self.spotify.stats()["POST /api/token"], 1)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get(self.path, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+
+    def test_refreshed_only_for_the_user_themselves(self):
+        save_spotify_token("alice", "alice-token", "alice-refresh", 1)
+        UserManager.create_user("bob", "secret")
+        for authorization in ({}, {"HTTP_AUTHORIZATION": self.bearer("bob")}):
+            response = self.client.get(self.path, **authorization)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["access_token"], "alice-token")
+        self.assertNotIn("POST /api/token", self.spotify.stats())
+
+
+class SyncPlaybackViewTests(FakeSpotifyTestCase):
+    """
+    Seul l'administrateur du groupe, authentifié par son token JWT, peut synchroniser la
+    lecture avec les tokens enregistrés.
+    """
+    paths = ("/api/groups/sync/", "/api/async/groups/sync/")
+
+    def setUp(self):
+        super().setUp()
+        for username in ("admin", "member"):
+            UserManager.create_user(username, "secret")
+            save_spotify_token(username, f"{username}-token", f"{username}-refresh", 3600)
+        GroupManager.create_group("rock", "admin")
+        GroupManager.join_group("rock", "member")
+
+    def post(self, path, **extra):
+        return self.client.post(path, {"group_name": "rock"}, content_type="application/json", **extra)
+
+    def test_anonymous_caller_is_refused(self):
+        for path in self.paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.post(path).status_code, 401)
+                self.assertEqual(self.post(path, HTTP_AUTHORIZATION="spotify-token").status_code, 401)
+        self.assertEqual(self.spotify.stats(), {})
+
+    def test_member_is_refused(self):
+        for path in self.paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.post(path, HTTP_AUTHORIZATION=self.bearer("member")).status_code, 403)
+        self.assertEqual(self.spotify.stats(), {})
+
+    def test_admin_syncs_members(self):
+        for path in self.paths:
+            with self.subTest(path=path):
+                response = self.post(path, HTTP_AUTHORIZATION=self.bearer("admin"))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [(result["member"], result["status"]) for result in response.json()["results"]],
+                    [("member", "synced")],
+                )
+
+
+
+class MetricsTests(FakeSpotifyTestCase):
+    """
+    Chaque réponse porte l'en-tête `Server-Timing` de sa requête, et les mesures du processus
+    sont exposées au format texte de Prometheus.
+    """
+    path = "/api/users/alice/personality/"
+    # Ligne d'échantillon : nom, étiquettes éventuelles et valeur
+    sample = re.compile(r'^spotynov_[a-z_]+(\{([a-z_]+="[^"]*",?)+\})? -?[0-9.e+-]+$')
+
+    def setUp(self):
+        super().setUp()
+        PERSONALITY_CACHE.clear()
+        self.addCleanup(PERSONALITY_CACHE.clear)
+        UserManager.create_user("alice", "secret")
+        save_spotify_token("alice", "alice-token", "alice-refresh", 3600)
+
+    def server_timing(self, response):
+        entries = {}
+        for entry in response["Server-Timing"].split(", "):
+            name, _, value = entry.partition(";")
+            entries[name] = value
+        return entries
+
+    def test_server_timing_header(self):
+        response = self.client.get(self.path, HTTP_AUTHORIZATION=self.bearer("alice"))
+        self.assertEqual(response.status_code, 200)
+        entries = self.server_timing(response)
+        for name in ("jwt", "upstream", "render", "total"):
+            self.assertRegex(entries[name], r"^dur=[0-9]+\.[0-9]{3}$")
+        self.assertEqual(entries["upstream_calls"], f'desc="{sum(self.spotify.stats().values())}"')
+
+    def test_server_timing_can_be_disabled(self):
+        with override_settings(SPOTYNOV_METRICS={"SERVER_TIMING": False}):
+            response = Client().get("/api/groups/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+
+    def test_prometheus_exposition(self):
+        self.client.get(self.path, HTTP_AUTHORIZATION=self.bearer("alice"))
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+
+        samples, types = {}, {}
+        for line in response.content.decode().splitlines():
+            if line.startswith("# TYPE "):
+                _, _, metric, kind = line.split(" ")
+                types[metric] = kind
+            elif not line.startswith("# HELP "):
+                self.assertRegex(line, self.sample)
+                name, _, value = line.rpartition(" ")
+                samples[name] = float(value)
+
+        self.assertEqual(types["spotynov_request_duration_seconds"], "histogram")
+        self.assertEqual(types["spotynov_upstream_calls_total"], "counter")
+        self.assertEqual(types["spotynov_ratelimit_queue_depth"], "gauge")
+        self.assertGreater(samples["spotynov_upstream_calls_total"], 0)
+        self.assertIn("spotynov_coalescing_executed_total", samples)
+
+        view = 'view="user-personality"'
+        buckets = [value for name, value in samples.items()
+                   if name.startswith("spotynov_request_duration_seconds_bucket{" + view)]
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], samples[f"spotynov_request_duration_seconds_count{{{view}}}"])
+        self.assertGreater(samples[f"spotynov_request_duration_seconds_sum{{{view}}}"], 0)
+        self.assertIn('spotynov_request_phase_seconds_count{phase="upstream"}', samples)
+
+class BulkSignalTests(StorageTestCase):
+    """
+    Les signaux des opérations groupées ne sont envoyés qu'après la persistance du lot.
+    """
+    def setUp(self):
+        super().setUp()
+        self.received = []
+
+        def receiver(signal, username, **kwargs):
+            # Le lot doit déjà être écrit dans le journal (lu sans prendre le verrou du stockage)
+            try:
+                with open(f"{get_storage().users.path}.log", "rb") as f:
+                    persisted = f'"key":"{username}"'.encode() in f.read().replace(b" ", b"")
+            except FileNotFoundError:
+                persisted = False
+            self.received.append((signal, username, persisted))
+
+        user_created.connect(receiver, weak=False, dispatch_uid="bulk-test-users")
+        member_joined.connect(receiver, weak=False, dispatch_uid="bulk-test-groups")
+        self.addCleanup(user_created.disconnect, dispatch_uid="bulk-test-users")
+        self.addCleanup(member_joined.disconnect, dispatch_uid="bulk-test-groups")
+
+    def test_signals_sent_after_batch(self):
+        results = apply_bulk("create_user", [
+            {"username": "alice", "password": "a"},
+            {"username": "alice", "password": "b"},
+            {"username": "bob", "password": "b"},
+        ])
+        self.assertEqual([result["status"] for result in results], [201, 400, 201])
+        self.assertEqual(
+            self.received, [(user_created, "alice", True), (user_created, "bob", True)]
+        )
+
+    def test_signals_dropped_when_batch_fails(self):
+        with self.assertRaises(RuntimeError):
+            with deferred_signals(), get_storage().batch():
+                UserManager.create_user("alice", "secret")
+                GroupManager.create_group("rock", "alice")
+                raise RuntimeError
+        self.assertEqual(self.received, [])
+        self.assertFalse(UserManager.user_exists("alice"))
+        self.assertIsNone(GroupManager.get_group("rock"))
+
+    def test_unit_operations_still_send_immediately(self):
+        UserManager.create_user("alice", "secret")
+        self.assertEqual(self.received, [(user_created, "alice", True)])
@@ -0,0 +1,170 @@
+import threading
+import time
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.dispatch import receiver
+from .models import UserManager
+from .signals import user_deleted
+from .spotify import get_spotify_client, spotify_token_url
+from .utils import save_spotify_token
+
+# Délai (en secondes) avant l'expiration d'un token à partir duquel il est renouvelé
+DEFAULT_REFRESH_MARGIN = 60
+
+
+class SpotifyTokenManager:
+    """
+    Gestion du cycle de vie des tokens Spotify des utilisateurs.
+
+    Les tokens sont enregistrés avec leur date d'expiration (`spotify_token_expires_at`).
+    Quand un token demandé expire dans moins de `refresh_margin` secondes, il est renouvelé
+    auprès de `spotify_token_url()` avant d'être retourné : l'appel à Spotify qui suit ne
+    reçoit donc pas de 401.
+
+    Les renouvellements simultanés pour un même utilisateur sont regroupés : un seul appel
+    part vers Spotify, les autres threads attendent son résultat (verrou par utilisateur,
+    libéré à la suppression de l'utilisateur).
+
+    **Méthodes** :
+    - `get_access_token(username, force_refresh)`: Retourne un token d'accès valide, ou `None`.
+    - `refresh(username, stale_token)`: Renouvelle le token d'accès d'un utilisateur.
+    - `call(username, send)`: Appelle Spotify avec le token d'un utilisateur.
+    - `acall(username, send)`: Équivalent asynchrone de `call`.
+    - `forget(username)`: Libère le verrou d'un utilisateur supprimé.
+    """
+    def __init__(self, refresh_margin=DEFAULT_REFRESH_MARGIN):
+        self.refresh_margin = refresh_margin
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock_for(self, username):
+        with self._locks_lock:
+            return self._locks.setdefault(username, threading.Lock())
+
+    def forget(self, username):
+        with self._locks_lock:
+            self._locks.pop(username, None)
+
+    def _is_fresh(self, tokens):
+        expires_at = tokens.get("expires_at")
+        return expires_at is None or expires_at - self.refresh_margin > time.time()
+
+    def get_access_token(self, username, force_refresh=False):
+        """
+        Retourne un token d'accès Spotify valide pour un utilisateur.
+
+        **Paramètres** :
+        - `username` (str) : Nom d'utilisateur.
+        - `force_refresh` (bool) : Renouvelle le token même s'il n'est pas encore expiré
+          (par exemple après un 401 de Spotify).
+
+        **Retour** :
+        - Le token d'accès.
+        - `None` si l'utilisateur n'a pas lié son compte Spotify ou si le renouvellement échoue.
+        """
+        tokens = UserManager.get_spotify_tokens(username)
+        if not tokens:
+            return None
+        if not force_refresh and self._is_fresh(tokens):
+            return tokens["access_token"]
+        return self.refresh(username, stale_token=tokens["access_token"])
+
+    def refresh(self, username, stale_token=None):
+        """
+        Renouvelle le token d'accès d'un utilisateur avec son token de rafraîchissement.
+
+        **Paramètres** :
+        - `username` (str) : Nom d'utilisateur.
+        - `stale_token` (str) : Token que l'appelant souhaite remplacer. Si un autre thread
+          l'a déjà remplacé pendant l'attente du verrou, le nouveau token est retourné
+          sans nouvel appel à Spotify.
+
+        **Retour** :
+        - Le nouveau token d'accès, ou `None` si Spotify refuse le renouvellement.
+        """
+        with self._lock_for(username):
+            tokens = UserManager.get_spotify_tokens(username)
+            if not tokens:
+                return None
+            if tokens["access_token"] != stale_token and self._is_fresh(tokens):
+                return tokens["access_token"]
+
+            data = {
+                "grant_type": "refresh_token",
+                "refresh_token": tokens["refresh_token"],
+                "client_id": settings.SPOTIFY_CLIENT_ID,
+                "client_secret": settings.SPOTIFY_CLIENT_SECRET,
+            }
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+            try:
+                token_info = get_spotify_client().post(spotify_token_url(), data=data, headers=headers).json()
+            except (requests.RequestException, ValueError):
+                return None
+
+            if "access_token" not in token_info:
+                return None
+
+            # Spotify ne renvoie un nouveau token de rafraîchissement que s'il a changé
+            save_spotify_token(
+                username,
+                token_info["access_token"],
+                token_info.get("refresh_token", tokens["refresh_token"]),
+                token_info.get("expires_in"),
+            )
+            return token_info["access_token"]
+
+    def call(self, username, send):
+        """
+        Appelle Spotify avec le token d'un utilisateur.
+
+        Si Spotify répond 401 (token révoqué, ou enregistré sans date d'expiration), le token
+        est renouvelé et l'appel rejoué une fois.
+
+        **Paramètres** :
+        - `username` (str) : Nom d'utilisateur dont le token est utilisé.
+        - `send` (callable) : Fonction recevant le token et retournant la réponse Spotify.
+
+        **Retour** :
+        - La réponse de Spotify, ou `None` si l'utilisateur n'a pas de token.
+        """
+        token = self.get_access_token(username)
+        if token is None:
+            return None
+
+        response = send(token)
+        if response.status_code == 401:
+            token = self.get_access_token(username, force_refresh=True)
+            if token is not None:
+                response = send(token)
+        return response
+
+    async def acall(self, username, send):
+        """
+        Équivalent asynchrone de `call` : `send` retourne une coroutine.
+
+        La lecture et le renouvellement du token sont exécutés dans le pool de threads
+        (`thread_sensitive=False`) : les renouvellements de plusieurs requêtes ne sont pas
+        sérialisés sur un seul thread.
+        """
+        get_access_token = sync_to_async(self.get_access_token, thread_sensitive=False)
+        token = await get_access_token(username)
+        if token is None:
+            return None
+
+        response = await send(token)
+        if response.status_code == 401:
+            token = await get_access_token(username, force_refresh=True)
+            if token is not None:
+                response = await send(token)
+        return response
+
+
+token_manager = SpotifyTokenManager(
+    refresh_margin=getattr(settings, "SPOTIFY_TOKEN_REFRESH_MARGIN", DEFAULT_REFRESH_MARGIN)
+)
+
+
+@receiver(user_deleted)
+def forget_token_lock(sender, username, **kwargs):
+    token_manager.forget(username)
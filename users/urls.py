@@ -1,11 +1,16 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import (
-    RegisterView, LoginView, ProtectedView,
-    GroupListView, GroupUsersView, CreateGroupView, JoinGroupView, LeaveGroupView,
-    UserPersonalityView, SyncPlaybackView, SpotifyTokenView
+    RegisterView, LoginView, ProtectedView, BulkOperationView,
+    GroupListView, GroupChangesView, GroupUsersView, GroupPersonalityView, CreateGroupView, JoinGroupView, LeaveGroupView,
+    UserPersonalityView, SyncPlaybackView, StartSyncLoopView, StopSyncLoopView,
+    SpotifyTokenView, SpotifyRateLimitView, SpotifyCoalescingView, MetricsView,
 )
 from users.views import SpotifyLoginView, spotify_callback
+from .async_views import (
+    AsyncLoginView, AsyncUserPersonalityView, AsyncSyncPlaybackView, GroupEventsView, async_spotify_callback,
+)
+from django.views.decorators.csrf import csrf_exempt
 from django.urls import path, re_path
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
@@ -34,19 +39,37 @@ urlpatterns = [
     
     # Group Management
     path('groups/', GroupListView.as_view(), name='group-list'),
+    path('groups/changes/', GroupChangesView.as_view(), name='group-changes'),
     path('groups/create/', CreateGroupView.as_view(), name='create_group'),
     path('groups/join/', JoinGroupView.as_view(), name='join_group'),
     path('groups/<str:group_name>/users/', GroupUsersView.as_view(), name='group-users'),
+    path('groups/<str:group_name>/personality/', GroupPersonalityView.as_view(), name='group-personality'),
     path('groups/leave/', LeaveGroupView.as_view(), name='leave_group'),
+    path('register/bulk/', BulkOperationView.as_view(operation="create_user"), name='register-bulk'),
+    path('groups/create/bulk/', BulkOperationView.as_view(operation="create_group"), name='create-group-bulk'),
+    path('groups/join/bulk/', BulkOperationView.as_view(operation="join_group"), name='join-group-bulk'),
+    path('groups/leave/bulk/', BulkOperationView.as_view(operation="leave_group"), name='leave-group-bulk'),
     path('groups/sync/', SyncPlaybackView.as_view(), name='sync-playback'),
+    path('groups/sync/start/', StartSyncLoopView.as_view(), name='sync-loop-start'),
+    path('groups/sync/stop/', StopSyncLoopView.as_view(), name='sync-loop-stop'),
     
     # User & Spotify Management
     path('users/<str:username>/personality/', UserPersonalityView.as_view(), name='user-personality'),
     path('spotify/tokens/<str:username>/', SpotifyTokenView.as_view(), name='spotify-tokens'),
     path("spotify/login/<str:username>/", SpotifyLoginView.as_view(), name="spotify-login"),
     path('spotify/callback/', spotify_callback, name='spotify-callback'),
+    path('spotify/ratelimit/', SpotifyRateLimitView.as_view(), name='spotify-ratelimit'),
+    path('spotify/coalescing/', SpotifyCoalescingView.as_view(), name='spotify-coalescing'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('spotify/login/<str:username>/', SpotifyLoginView.as_view(), name='spotify-login'),
 
+    # Variantes asynchrones (ASGI) des routes qui attendent Spotify
+    path('async/login/', csrf_exempt(AsyncLoginView.as_view()), name='async-login'),
+    path('async/groups/sync/', csrf_exempt(AsyncSyncPlaybackView.as_view()), name='async-sync-playback'),
+    path('async/users/<str:username>/personality/', AsyncUserPersonalityView.as_view(), name='async-user-personality'),
+    path('async/spotify/callback/', async_spotify_callback, name='async-spotify-callback'),
+    path('async/groups/<str:group_name>/events/', GroupEventsView.as_view(), name='group-events'),
+
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),
@@ -1,5 +1,9 @@
-import json
+import logging
 import os
+import time
+from .backends import get_storage
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 USERS_FILE = os.path.join(BASE_DIR, "users.json")
@@ -9,92 +13,63 @@ def load_users():
     Charge les utilisateurs depuis le fichier `users.json`, en vérifiant qu'il est lisible.
     
     Cette fonction s'assure que le fichier existe et contient des données JSON valides.
-    Si le fichier est corrompu ou inaccessible, une alerte est affichée et un dictionnaire vide est retourné.
+    Si le fichier est corrompu ou inaccessible, un dictionnaire vide est retourné.
     
     **Processus** :
-    1. Vérifie l'existence du fichier `users.json`.
-    2. Ouvre le fichier et charge son contenu en JSON.
-    3. Gère les erreurs liées à la lecture ou au format du fichier.
+    1. Récupère les utilisateurs auprès du moteur de stockage configuré.
+    2. Avec le moteur JSON, le fichier n'est relu que s'il a été modifié depuis le dernier chargement.
     
     **Réponses possibles** :
     - Retourne un dictionnaire contenant les utilisateurs si le fichier est valide.
     - Retourne un dictionnaire vide en cas d'erreur.
     """
-    if not os.path.exists(USERS_FILE):
-        return {}
-
-    try:
-        with open(USERS_FILE, "r") as file:
-            return json.load(file)
-    except (json.JSONDecodeError, IOError):
-        print("Erreur : Le fichier users.json est corrompu ou inaccessible.")
-        return {}
+    return get_storage().load_users()
 
 def save_users(users):
     """
     Sauvegarde les utilisateurs dans le fichier `users.json` de manière sécurisée.
     
-    Cette fonction écrit les données utilisateur dans le fichier JSON avec un format lisible
-    en ajoutant une indentation.
+    Cette fonction remplace toutes les données utilisateur ; les modifications unitaires
+    passent plutôt par `put_user()` du moteur de stockage.
     
     **Processus** :
-    1. Ouvre le fichier `users.json` en mode écriture.
-    2. Écrit le dictionnaire des utilisateurs en JSON formaté.
-    3. Gère les erreurs d'écriture éventuelles.
-    
-    **Erreurs possibles** :
-    - Affiche un message d'erreur si l'écriture dans le fichier échoue.
+    1. Remplace le dictionnaire des utilisateurs.
+    2. Avec le moteur JSON, réécrit `users.json` de manière atomique et vide son journal.
     """
-    try:
-        with open(USERS_FILE, "w") as file:
-            json.dump(users, file, indent=4)
-    except IOError:
-        print("Erreur lors de l'écriture dans users.json")
+    get_storage().save_users(users)
 
-def save_spotify_token(username, access_token, refresh_token):
+def save_spotify_token(username, access_token, refresh_token, expires_in=None):
     """
     Sauvegarde les tokens Spotify d'un utilisateur dans le fichier `users.json`.
     
     Cette fonction met à jour ou ajoute les tokens Spotify d'un utilisateur donné 
     dans le fichier JSON.
     
+    **Paramètres** :
+    - `expires_in` (int) : Durée de validité du token d'accès en secondes, telle que renvoyée
+      par Spotify. Elle est convertie en date d'expiration (`spotify_token_expires_at`).
+    
     **Processus** :
     1. Vérifie que `username` est valide.
-    2. Vérifie et crée le fichier `users.json` s'il n'existe pas.
-    3. Charge les utilisateurs existants ou initialise une nouvelle structure JSON.
-    4. Ajoute ou met à jour les tokens Spotify de l'utilisateur.
-    5. Sauvegarde les nouvelles données dans `users.json`.
+    2. Récupère l'utilisateur dans le stockage.
+    3. Ajoute ou met à jour les tokens Spotify de l'utilisateur et leur expiration.
+    4. Enregistre l'utilisateur modifié.
     
     **Erreurs possibles** :
-    - Affiche un message d'erreur si `username` est vide.
-    - Affiche un message si le fichier est inaccessible.
+    - Si `username` est vide, rien n'est enregistré (message de niveau `DEBUG` dans le
+      journal `users.utils`).
     """
-    print(f"DEBUG: save_spotify_token appelé avec username={username}")
-    
     if not username:
-        print("⚠️ ERREUR: Username vide !")
+        logger.debug("save_spotify_token appelé sans nom d'utilisateur")
         return  # Stopper l'exécution si `username` est vide
 
-    if not os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "w") as file:
-            json.dump({}, file)
-
-    try:
-        with open(USERS_FILE, "r+") as file:
-            try:
-                users = json.load(file)
-            except json.JSONDecodeError:
-                users = {}
-
-            if username not in users:
-                users[username] = {}
-
-            users[username]["spotify_access_token"] = access_token
-            users[username]["spotify_refresh_token"] = refresh_token
-
-            file.seek(0)
-            json.dump(users, file, indent=4)
-            file.truncate()
-
-    except IOError:
-        print("Erreur d'accès au fichier users.json")
+    storage = get_storage()
+    with storage.atomic():
+        user = dict(storage.get_user(username) or {})
+        user["spotify_access_token"] = access_token
+        user["spotify_refresh_token"] = refresh_token
+        if expires_in is not None:
+            user["spotify_token_expires_at"] = time.time() + expires_in
+        else:
+            user.pop("spotify_token_expires_at", None)
+        storage.put_user(username, user)
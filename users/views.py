@@ -1,7 +1,8 @@
 import os
+import time
 import requests
 import json
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -10,35 +11,32 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import AuthenticationFailed
 from .utils import save_spotify_token
+from .signals import playback_changed
+from .group_list import (
+    QUERY_PARAMS, parse_query, parse_changes_query, stream_all_groups, stream_group_page, stream_group_changes,
+)
+from .streaming import StreamingJSONResponse
+from .conditional import not_modified, version_headers
+from .bulk import apply_bulk, bulk_max_items
+from .spotify import get_spotify_client, coalescing_stats, spotify_token_url
+from .playback import sync_members
+from .sync_loop import SyncLoopLimitExceeded, start_sync_loop, stop_sync_loop
+from .tokens import token_manager
+from .ratelimit import BACKGROUND, get_rate_limiter
+from .metrics import render_prometheus
+from .group_personality import get_group_taste, discard_group_taste
+from .personality import (
+    PERSONALITY_CACHE, CACHE_STATUS_HEADER, UpstreamError, analyse_history, cached_etags, fetch_history,
+    update_cache,
+)
 from rest_framework.decorators import api_view
 
-
-SPOTIFY_API_URL = "https://api.spotify.com/v1"
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
-SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
-
-
-import os
-import requests
-import json
-from django.http import JsonResponse
-from rest_framework.views import APIView
-from rest_framework.response import Response
-from rest_framework import status
-from .models import UserManager, GroupManager
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import AuthenticationFailed
-from .utils import save_spotify_token
-from rest_framework.decorators import api_view
 
-SPOTIFY_API_URL = "https://api.spotify.com/v1"
-SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
-SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
-SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+# Autorisations demandées lors de la liaison d'un compte Spotify
+SPOTIFY_SCOPES = "user-read-playback-state user-modify-playback-state user-top-read"
 
 def spotify_callback(request):
     """
@@ -62,6 +60,7 @@ def spotify_callback(request):
     **Réponses possibles** :
     - 200 : Succès, les tokens sont enregistrés.
     - 400 : Erreur si `code` ou `state` est manquant ou si l'échange de token échoue.
+    - 502 : Erreur si Spotify est injoignable.
     """
     code = request.GET.get("code")
     username = request.GET.get("state")
@@ -80,13 +79,16 @@ def spotify_callback(request):
     }
     
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    response = requests.post(SPOTIFY_TOKEN_URL, data=data, headers=headers)
-    token_info = response.json()
+    try:
+        response = get_spotify_client().post(spotify_token_url(), data=data, headers=headers)
+        token_info = response.json()
+    except (requests.RequestException, ValueError):
+        return JsonResponse({"error": "Spotify est injoignable"}, status=502)
     
     if "access_token" not in token_info:
         return JsonResponse({"error": "Échec de récupération du token", "details": token_info}, status=400)
     
-    save_spotify_token(username, token_info["access_token"], token_info["refresh_token"])
+    save_spotify_token(username, token_info["access_token"], token_info["refresh_token"], token_info.get("expires_in"))
     
     return JsonResponse({
         "message": "Spotify connecté avec succès !",
@@ -191,22 +193,78 @@ class ProtectedView(APIView):
 
 class GroupListView(APIView):
     """
-    Liste tous les groupes existants.
+    Liste les groupes existants.
     
-    Cette vue permet de récupérer la liste de tous les groupes créés dans l'application.
+    Sans paramètre, la vue retourne le dictionnaire complet des groupes (forme historique).
+    Avec l'un des paramètres ci-dessous, elle retourne une page de groupes triés par nom :
+    `{"groups": {...}, "next_cursor": ...}`.
+    
+    Dans les deux cas, la réponse est encodée au fil de la lecture des groupes, par pages
+    lues dans le stockage (voir `group_list`) : la mémoire utilisée par une requête ne
+    dépend pas du nombre total de groupes.
+    
+    La réponse porte la version de l'ensemble des groupes (`ETag`, `Last-Modified`) : un
+    client qui la renvoie (`If-None-Match`) reçoit un 304 sans que les groupes soient lus.
     
     **Méthode HTTP** : GET
     
+    **Paramètres** (dans l'URL, optionnels) :
+    - `limit` (int) : Nombre de groupes par page (voir `SPOTYNOV_GROUP_LIST`).
+    - `cursor` (str) : Valeur `next_cursor` de la page précédente.
+    - `prefix` (str) : Ne retourne que les groupes dont le nom commence par ce préfixe.
+    - `fields` (str) : Champs retournés pour chaque groupe, séparés par des virgules, parmi
+      `members`, `admin` et `member_count`.
+    
     **Réponses possibles** :
-    - 200 : Succès, retourne la liste des groupes.
-    - 500 : Erreur serveur si la récupération des groupes échoue.
+    - 200 : Succès, retourne les groupes.
+    - 304 : Les groupes n'ont pas changé depuis la version indiquée par le client.
+    - 400 : Erreur si un paramètre est invalide.
     """
     def get(self, request):
-        groups = GroupManager.load_groups()
-        if not isinstance(groups, dict):
-            return Response({"error": "Problème de lecture des groupes"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        version = GroupManager.get_groups_version()
+        response = not_modified(request, version)
+        if response is not None:
+            return response
 
-        return Response(groups, status=status.HTTP_200_OK)
+        if not any(param in request.query_params for param in QUERY_PARAMS):
+            return StreamingJSONResponse(stream_all_groups(), headers=version_headers(version))
+
+        try:
+            query = parse_query(request.query_params)
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return StreamingJSONResponse(stream_group_page(**query), headers=version_headers(version))
+
+class GroupChangesView(APIView):
+    """
+    Flux des modifications de groupes, pour maintenir une copie de tous les groupes sans
+    retélécharger `GroupListView`.
+    
+    Chaque création, arrivée ou départ de membre et suppression de groupe est numérotée
+    par la version des groupes (la même que l'`ETag` de `GroupListView`) et conservée dans
+    un journal borné (option `change_log_size` de `SPOTYNOV_STORAGE`). Le client rappelle
+    la vue avec le `cursor` reçu : il ne reçoit que les modifications suivantes, ou un
+    état complet si elles ne sont plus toutes conservées.
+    
+    **Méthode HTTP** : GET
+    
+    **Paramètres** (dans l'URL) :
+    - `since` (int, optionnel) : Curseur reçu lors de l'appel précédent. Sans curseur, la
+      vue retourne un état complet.
+    - `limit` (int, optionnel) : Nombre maximum de modifications retournées.
+    
+    **Réponses possibles** :
+    - 200 : Succès, retourne `changes`, `cursor` et `has_more`, ou `snapshot` et `cursor`.
+    - 400 : Erreur si un paramètre est invalide.
+    """
+    def get(self, request):
+        try:
+            query = parse_changes_query(request.query_params)
+        except ValueError as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return StreamingJSONResponse(stream_group_changes(**query))
 
 class GroupUsersView(APIView):
     """
@@ -216,19 +274,67 @@ class GroupUsersView(APIView):
     
     **Méthode HTTP** : GET
     
+    La réponse porte la version du groupe (`ETag`, `Last-Modified`) : un client qui la
+    renvoie (`If-None-Match`) reçoit un 304 sans que le groupe soit lu.
+    
     **Paramètres** :
     - `group_name` (str) : Nom du groupe dont on souhaite récupérer les membres.
     
     **Réponses possibles** :
     - 200 : Succès, retourne la liste des membres du groupe.
+    - 304 : Le groupe n'a pas changé depuis la version indiquée par le client.
     - 404 : Erreur si le groupe n'existe pas.
     """
     def get(self, request, group_name):
-        groups = GroupManager.load_groups()
-        if group_name in groups:
-            return Response(groups[group_name]["members"], status=status.HTTP_200_OK)
+        version = GroupManager.get_group_version(group_name)
+        response = not_modified(request, version)
+        if response is not None:
+            return response
+
+        group = GroupManager.get_group(group_name)
+        if group is not None:
+            return Response(group["members"], status=status.HTTP_200_OK, headers=version_headers(version))
         return Response({"error": "Groupe introuvable"}, status=status.HTTP_404_NOT_FOUND)
 
+class GroupPersonalityView(APIView):
+    """
+    Agrège les profils musicaux des membres d'un groupe en un profil de groupe.
+    
+    Le profil du groupe est conservé en mémoire et mis à jour de façon incrémentale : à
+    chaque appel, seule la contribution des membres arrivés ou partis depuis l'appel
+    précédent (ou dont le profil a expiré) est ajoutée ou retranchée. Les historiques des
+    nouveaux membres sont collectés en parallèle, avec le token Spotify enregistré de
+    chacun (voir `group_personality.get_group_taste`).
+    
+    Le profil n'est servi qu'aux membres du groupe : il est calculé avec les tokens
+    enregistrés de chacun d'eux.
+    
+    **Méthode HTTP** : GET
+    
+    **Paramètres** :
+    - `group_name` (str) : Nom du groupe dont on souhaite analyser le style musical.
+    - `Authorization` (en-tête) : Token JWT d'un membre du groupe (`Bearer ...`).
+    
+    **Réponses possibles** :
+    - 200 : Succès, retourne le profil du groupe : moyennes pondérées par le nombre de titres,
+      histogramme des genres et membres dont le profil n'a pas pu être récupéré.
+    - 401 : Erreur si la requête n'est pas authentifiée.
+    - 403 : Erreur si l'utilisateur authentifié n'est pas membre du groupe.
+    - 404 : Erreur si le groupe n'existe pas.
+    """
+    def get(self, request, group_name):
+        if not request.user.is_authenticated:
+            return Response({"error": "Authentification requise"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        group = GroupManager.get_group(group_name)
+        if group is None:
+            discard_group_taste(group_name)
+            return Response({"error": "Groupe introuvable"}, status=status.HTTP_404_NOT_FOUND)
+        if request.user.username not in group["members"]:
+            return Response({"error": "Accès refusé"}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response(get_group_taste(group_name, group["members"]), status=status.HTTP_200_OK)
+
 class CreateGroupView(APIView):
     """
     Crée un nouveau groupe avec un administrateur.
@@ -341,6 +447,45 @@ class LeaveGroupView(APIView):
         result = GroupManager.leave_group(username)
         return Response(result, status=status.HTTP_200_OK if "error" not in result else status.HTTP_400_BAD_REQUEST)
 
+class BulkOperationView(APIView):
+    """
+    Applique une opération (inscription, création de groupe, adhésion ou départ) à une
+    liste d'éléments en une seule requête.
+    
+    Les éléments sont validés puis appliqués dans l'ordre, et le stockage n'est écrit
+    qu'une fois pour toute la requête (voir `bulk.apply_bulk`). L'opération est fixée par
+    la route (`as_view(operation=...)`).
+    
+    **Méthode HTTP** : POST
+    
+    **Paramètres** (dans le corps de la requête) :
+    - `items` (list) : Éléments à traiter, avec les mêmes champs que la route unitaire
+      (au plus `SPOTYNOV_BULK_MAX_ITEMS`).
+    
+    **Réponses possibles** :
+    - 200 : Retourne le résultat de chaque élément (`index`, `status`, `message` ou `error`)
+      et le nombre d'éléments réussis et échoués.
+    - 400 : Erreur si `items` n'est pas une liste ou contient trop d'éléments.
+    """
+    operation = None
+
+    def post(self, request):
+        items = request.data.get("items")
+        if not isinstance(items, list):
+            return Response({"error": "Le champ items doit être une liste."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > bulk_max_items():
+            return Response(
+                {"error": f"Au plus {bulk_max_items()} éléments par requête."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = apply_bulk(self.operation, items)
+        succeeded = sum(1 for result in results if result["status"] < 300)
+        return Response({
+            "results": results,
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+        }, status=status.HTTP_200_OK)
+
 class UserPersonalityView(APIView):
     """
     Analyse les titres Spotify likés pour déterminer le style musical de l'utilisateur.
@@ -348,40 +493,77 @@ class UserPersonalityView(APIView):
     Cette vue récupère les morceaux les plus écoutés de l'utilisateur sur Spotify afin 
     d'analyser sa préférence musicale en fonction de la popularité et de la durée moyenne des titres.
     
+    L'historique complet est analysé : toutes les pages des trois périodes d'écoute (court,
+    moyen et long terme), les caractéristiques audio des titres et les genres de leurs artistes.
+    Les requêtes de chaque étape sont envoyées en parallèle (voir `personality.fetch_history`).
+    
     **Méthode HTTP** : GET
     
     **Paramètres** :
     - `username` (str) : Nom d'utilisateur dont on souhaite analyser le style musical.
+    - `Authorization` (en-tête) : Token JWT de l'utilisateur `username` (`Bearer ...`), ou token
+      d'accès Spotify.
     
     **Processus** :
-    1. Vérifie la présence d'un token Spotify valide.
-    2. Récupère les titres les plus écoutés de l'utilisateur via l'API Spotify.
-    3. Calcule la popularité et la durée moyenne des morceaux likés.
+    1. Avec un token Spotify fourni par l'appelant, l'historique est collecté avec ce token et
+       analysé sans passer par le cache : rien ne garantit que le token appartient à `username`.
+    2. Sinon, la requête doit être authentifiée (JWT) en tant que `username`.
+    3. Retourne le profil en cache (`PERSONALITY_CACHE`) s'il n'a pas expiré.
+    4. Récupère les titres les plus écoutés de l'utilisateur avec son token enregistré (renouvelé
+       s'il arrive à expiration) ; un profil expiré est revalidé par des requêtes
+       conditionnelles (`If-None-Match`).
+    5. Calcule la popularité et la durée moyenne des morceaux likés, ainsi que les moyennes,
+       percentiles et distributions de leurs caractéristiques et l'histogramme des genres.
+    
+    L'en-tête `X-Cache` de la réponse vaut `HIT`, `REVALIDATED`, `MISS` ou `BYPASS` (token
+    Spotify fourni par l'appelant).
     
     **Réponses possibles** :
     - 200 : Succès, retourne l'analyse du style musical.
-    - 401 : Erreur si le token Spotify est manquant.
+    - 401 : Erreur si la requête n'est ni authentifiée ni accompagnée d'un token Spotify, ou si
+      l'utilisateur n'a pas lié son compte Spotify.
+    - 403 : Erreur si la requête est authentifiée en tant qu'un autre utilisateur.
     - 400 : Erreur si la récupération des titres likés échoue.
+    - 502 : Erreur si Spotify est injoignable.
     """
     def get(self, request, username):
-        token = request.headers.get("Authorization")
-        if not token:
-            return Response({"error": "Token Spotify manquant"}, status=status.HTTP_401_UNAUTHORIZED)
+        client = get_spotify_client()
+        token = request.headers.get("Authorization") if request.auth is None else None
+        entry = None
+
+        if token:
+            def get(path, params, headers):
+                return client.get(path, token, params=params, headers=headers, priority=BACKGROUND)
+        else:
+            if not request.user.is_authenticated:
+                return Response({"error": "Authentification requise"}, status=status.HTTP_401_UNAUTHORIZED)
+            if request.user.username != username:
+                return Response({"error": "Accès refusé"}, status=status.HTTP_403_FORBIDDEN)
+
+            entry, fresh = PERSONALITY_CACHE.lookup(username)
+            if fresh:
+                return Response(entry["profile"], status=status.HTTP_200_OK, headers={CACHE_STATUS_HEADER: "HIT"})
+
+            def get(path, params, headers):
+                return token_manager.call(username, lambda token: client.get(
+                    path, token, params=params, headers=headers, priority=BACKGROUND
+                ))
 
-        headers = {"Authorization": token}
-        response = requests.get(f"{SPOTIFY_API_URL}/me/top/tracks", headers=headers)
-
-        if response.status_code != 200:
+        try:
+            history = fetch_history(get, cached_etags(entry))
+        except requests.RequestException:
+            return Response({"error": "Spotify est injoignable"}, status=status.HTTP_502_BAD_GATEWAY)
+        except UpstreamError as error:
+            if error.response is None:
+                return Response({"error": "Token Spotify manquant"}, status=status.HTTP_401_UNAUTHORIZED)
             return Response({"error": "Impossible de récupérer les titres likés"}, status=status.HTTP_400_BAD_REQUEST)
 
-        tracks = response.json().get("items", [])
-        if not tracks:
-            return Response({"message": "Aucun titre liké"}, status=status.HTTP_200_OK)
-
-        popularity = sum(track["popularity"] for track in tracks) / len(tracks)
-        duration = sum(track["duration_ms"] for track in tracks) / len(tracks)
+        if token:
+            profile = analyse_history(username, history)
+            return Response(profile, status=status.HTTP_200_OK, headers={CACHE_STATUS_HEADER: "BYPASS"})
 
-        return Response({"username": username, "popularity_average": popularity, "duration_average": duration}, status=status.HTTP_200_OK)
+        entry, cache_status = update_cache(username, entry, history)
+        return Response(entry["profile"], status=status.HTTP_200_OK, headers={CACHE_STATUS_HEADER: cache_status})
 
 class SyncPlaybackView(APIView):
     """
@@ -390,33 +572,53 @@ class SyncPlaybackView(APIView):
     Cette vue permet à un administrateur de groupe de synchroniser sa lecture Spotify
     avec celle des autres membres du groupe.
     
+    Chaque membre est synchronisé avec son propre token Spotify (enregistré lors de la
+    liaison de son compte), et les commandes de lecture sont envoyées en parallèle.
+    
     **Méthode HTTP** : POST
     
     **Paramètres** :
     - `group_name` (str) : Nom du groupe dont la lecture doit être synchronisée.
-    - `Authorization` (str) : Token d'accès Spotify de l'utilisateur initiant la synchronisation.
+    - `Authorization` (en-tête) : Token JWT de l'administrateur du groupe (`Bearer ...`).
     
     **Processus** :
-    1. Vérifie la présence d'un token Spotify et d'un nom de groupe valide.
-    2. Récupère la lecture en cours de l'administrateur via l'API Spotify.
-    3. Si une musique est en cours de lecture, elle est synchronisée avec les membres du groupe.
+    1. Vérifie la présence d'un nom de groupe et que la requête est authentifiée en tant
+       qu'administrateur du groupe : les tokens enregistrés ne sont utilisés qu'à sa demande.
+    2. Récupère la lecture en cours de l'administrateur via l'API Spotify, avec son token enregistré.
+    3. Si une musique est en cours de lecture, elle est lancée simultanément chez tous les
+       autres membres du groupe.
     
     **Réponses possibles** :
-    - 200 : Succès, la lecture est synchronisée.
-    - 400 : Erreur si le token ou le nom du groupe est manquant.
+    - 200 : Succès, retourne le résultat et la latence de la synchronisation de chaque membre.
+    - 400 : Erreur si le nom du groupe ou le token Spotify de l'administrateur est manquant.
+    - 401 : Erreur si la requête n'est pas authentifiée.
+    - 403 : Erreur si la requête est authentifiée en tant qu'un autre utilisateur que l'administrateur.
     - 404 : Erreur si le groupe n'existe pas.
     - 400 : Erreur si aucune lecture en cours n'est détectée.
+    - 502 : Erreur si Spotify est injoignable.
     """
     def post(self, request):
-        token = request.headers.get("Authorization")
         group_name = request.data.get("group_name")
 
-        if not token or not group_name:
+        if not group_name:
             return Response({"error": "Token ou nom du groupe manquant"}, status=status.HTTP_400_BAD_REQUEST)
+        if not request.user.is_authenticated:
+            return Response({"error": "Authentification requise"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        headers = {"Authorization": token}
-        playback = requests.get(f"{SPOTIFY_API_URL}/me/player", headers=headers)
+        group = GroupManager.get_group(group_name)
+        if group is None:
+            return Response({"error": "Groupe introuvable"}, status=status.HTTP_404_NOT_FOUND)
+        if request.user.username != group.get("admin"):
+            return Response({"error": "Accès refusé"}, status=status.HTTP_403_FORBIDDEN)
 
+        client = get_spotify_client()
+        try:
+            playback = token_manager.call(group["admin"], lambda token: client.get("/me/player", token))
+        except requests.RequestException:
+            return Response({"error": "Spotify est injoignable"}, status=status.HTTP_502_BAD_GATEWAY)
+
+        if playback is None:
+            return Response({"error": "Token ou nom du groupe manquant"}, status=status.HTTP_400_BAD_REQUEST)
         if playback.status_code != 200:
             return Response({"error": "Impossible de récupérer la lecture en cours"}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -427,15 +629,102 @@ class SyncPlaybackView(APIView):
         track_uri = track_info["item"]["uri"]
         position_ms = track_info["progress_ms"]
 
-        groups = GroupManager.load_groups()
-        if group_name not in groups:
+        start = time.perf_counter()
+        members = [member for member in group["members"] if member != group.get("admin")]
+        results = sync_members(members, track_uri, position_ms)
+        playback_changed.send(sender=SyncPlaybackView, group_name=group_name, playback={
+            "is_playing": True, "track_uri": track_uri, "position_ms": position_ms,
+        })
+
+        return Response({
+            "message": "Lecture synchronisée",
+            "track_uri": track_uri,
+            "position_ms": position_ms,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+            "results": results,
+        }, status=status.HTTP_200_OK)
+
+class StartSyncLoopView(APIView):
+    """
+    Démarre la synchronisation continue de la lecture d'un groupe.
+    
+    Contrairement à `SyncPlaybackView`, qui copie une seule fois la lecture de
+    l'administrateur, une boucle en arrière-plan suit sa lecture et ne renvoie une commande
+    aux membres que lorsque le titre change ou que l'écart dépasse un seuil, en corrigeant
+    les positions des temps de transfert (voir `sync_loop.GroupSyncLoop`). Les tokens
+    enregistrés de l'administrateur et des membres sont utilisés : seul l'administrateur du
+    groupe peut démarrer la boucle.
+    
+    Le nombre de boucles d'un processus est borné par `SPOTYNOV_SYNC_LOOP["MAX_LOOPS"]`.
+    
+    **Méthode HTTP** : POST
+    
+    **Paramètres** :
+    - `group_name` (str) : Nom du groupe à synchroniser.
+    - `Authorization` (en-tête) : Token JWT de l'administrateur du groupe (`Bearer ...`).
+    
+    **Réponses possibles** :
+    - 200 : Succès, retourne l'état de la boucle (déjà démarrée ou non).
+    - 400 : Erreur si le nom du groupe est manquant.
+    - 401 : Erreur si la requête n'est pas authentifiée.
+    - 403 : Erreur si la requête est authentifiée en tant qu'un autre utilisateur que l'administrateur.
+    - 404 : Erreur si le groupe n'existe pas.
+    - 503 : Erreur si le nombre maximum de boucles est atteint.
+    """
+    def post(self, request):
+        group_name = request.data.get("group_name")
+        if not group_name:
+            return Response({"error": "Nom du groupe manquant"}, status=status.HTTP_400_BAD_REQUEST)
+        if not request.user.is_authenticated:
+            return Response({"error": "Authentification requise"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        group = GroupManager.get_group(group_name)
+        if group is None:
+            return Response({"error": "Groupe introuvable"}, status=status.HTTP_404_NOT_FOUND)
+        if request.user.username != group.get("admin"):
+            return Response({"error": "Accès refusé"}, status=status.HTTP_403_FORBIDDEN)
+
+        try:
+            loop = start_sync_loop(group_name)
+        except SyncLoopLimitExceeded as error:
+            return Response({"error": str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(loop.status(), status=status.HTTP_200_OK)
+
+class StopSyncLoopView(APIView):
+    """
+    Arrête la synchronisation continue de la lecture d'un groupe.
+    
+    **Méthode HTTP** : POST
+    
+    **Paramètres** :
+    - `group_name` (str) : Nom du groupe.
+    - `Authorization` (en-tête) : Token JWT de l'administrateur du groupe (`Bearer ...`).
+    
+    **Réponses possibles** :
+    - 200 : Succès, retourne le dernier état de la boucle.
+    - 400 : Erreur si le nom du groupe est manquant.
+    - 401 : Erreur si la requête n'est pas authentifiée.
+    - 403 : Erreur si la requête est authentifiée en tant qu'un autre utilisateur que l'administrateur.
+    - 404 : Erreur si le groupe n'existe pas ou si aucune synchronisation n'est en cours pour ce groupe.
+    """
+    def post(self, request):
+        group_name = request.data.get("group_name")
+        if not group_name:
+            return Response({"error": "Nom du groupe manquant"}, status=status.HTTP_400_BAD_REQUEST)
+        if not request.user.is_authenticated:
+            return Response({"error": "Authentification requise"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        group = GroupManager.get_group(group_name)
+        if group is None:
             return Response({"error": "Groupe introuvable"}, status=status.HTTP_404_NOT_FOUND)
+        if request.user.username != group.get("admin"):
+            return Response({"error": "Accès refusé"}, status=status.HTTP_403_FORBIDDEN)
 
-        for member in groups[group_name]["members"]:
-            if member != groups[group_name]["admin"]:
-                requests.put(f"{SPOTIFY_API_URL}/me/player/play", json={"uris": [track_uri], "position_ms": position_ms}, headers=headers)
+        loop = stop_sync_loop(group_name)
+        if loop is None:
+            return Response({"error": "Aucune synchronisation en cours"}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response({"message": "Lecture synchronisée"}, status=status.HTTP_200_OK)
+        return Response(loop.status(), status=status.HTTP_200_OK)
 
 class SpotifyTokenView(APIView):
     """
@@ -448,21 +737,95 @@ class SpotifyTokenView(APIView):
     
     **Paramètres** :
     - `username` (str) : Nom d'utilisateur dont on souhaite récupérer les tokens Spotify.
+    - `Authorization` (en-tête, optionnel) : Token JWT de l'utilisateur `username` (`Bearer ...`).
     
     **Processus** :
-    1. Vérifie si les tokens de l'utilisateur existent.
-    2. Retourne les tokens trouvés ou une erreur si aucun token n'est disponible.
+    1. Répond 304 si le client possède déjà la version courante de l'utilisateur, d'après la
+       seule version du stockage (sans charger l'enregistrement ni appeler Spotify).
+    2. Si la requête est authentifiée en tant que `username`, renouvelle le token d'accès
+       s'il arrive à expiration ; aucun autre appelant ne déclenche d'appel à Spotify.
+    3. Retourne les tokens trouvés ou une erreur si aucun token n'est disponible.
+    
+    Un renouvellement modifie l'enregistrement de l'utilisateur : la réponse porte alors la
+    nouvelle version. Un client qui conserve les tokens doit surveiller `expires_at` et
+    redemander sans en-tête conditionnel quand le token arrive à expiration, une réponse 304
+    ne déclenchant aucun renouvellement.
     
     **Réponses possibles** :
-    - 200 : Succès, retourne les tokens Spotify.
+    - 200 : Succès, retourne les tokens Spotify et leur date d'expiration (`expires_at`).
+    - 304 : Les tokens n'ont pas changé depuis la version indiquée par le client.
     - 404 : Erreur si les tokens de l'utilisateur ne sont pas trouvés.
     """
     def get(self, request, username):
+        response = not_modified(request, UserManager.get_user_version(username))
+        if response is not None:
+            return response
+
+        if request.user.is_authenticated and request.user.username == username:
+            token_manager.get_access_token(username)
+        version = UserManager.get_user_version(username)
         tokens = UserManager.get_spotify_tokens(username)
         if tokens:
-            return Response(tokens, status=status.HTTP_200_OK)
+            return Response(tokens, status=status.HTTP_200_OK, headers=version_headers(version))
         return Response({"error": "Tokens non trouvés"}, status=status.HTTP_404_NOT_FOUND)
 
+class SpotifyRateLimitView(APIView):
+    """
+    Expose l'état du régulateur des appels à Spotify de ce processus.
+    
+    **Méthode HTTP** : GET
+    
+    **Réponses possibles** :
+    - 200 : Succès, retourne la profondeur de la file d'attente (totale et par priorité),
+      les jetons disponibles, le délai de suspension restant après un 429, le nombre de
+      429 reçus et le nombre de requêtes abandonnées après une attente trop longue.
+    """
+    def get(self, request):
+        return Response(get_rate_limiter().stats(), status=status.HTTP_200_OK)
+
+class SpotifyCoalescingView(APIView):
+    """
+    Expose les compteurs de regroupement des requêtes GET envoyées à Spotify par ce processus.
+    
+    **Méthode HTTP** : GET
+    
+    **Réponses possibles** :
+    - 200 : Succès, retourne le nombre de requêtes en cours, de requêtes réellement envoyées
+      (`executed`) et de requêtes servies par un appel identique déjà en cours (`coalesced`).
+    """
+    def get(self, request):
+        return Response(coalescing_stats(), status=status.HTTP_200_OK)
+
+class MetricsView(APIView):
+    """
+    Expose les mesures de ce processus au format texte de Prometheus.
+    
+    **Méthode HTTP** : GET
+    
+    **Réponses possibles** :
+    - 200 : Succès, retourne les compteurs (appels à Spotify et nouvelles tentatives, succès
+      et échecs des caches, octets lus dans les fichiers du stockage), les histogrammes des
+      durées des requêtes par vue et de leurs phases (voir `TimingMiddleware`), ainsi que
+      l'état du régulateur et du regroupement des requêtes Spotify.
+    """
+    def get(self, request):
+        limiter = get_rate_limiter().stats()
+        flights = coalescing_stats()
+        body = render_prometheus({
+            "ratelimit_queue_depth": ("gauge", "Requêtes en attente du régulateur Spotify.", limiter["queue_depth"]),
+            "ratelimit_tokens": ("gauge", "Jetons disponibles du régulateur Spotify.", limiter["tokens"]),
+            "ratelimit_throttled_total": ("counter", "Réponses 429 reçues de Spotify.", limiter["throttled"]),
+            "ratelimit_rejected_total": (
+                "counter", "Requêtes abandonnées après une attente trop longue.", limiter["rejected"],
+            ),
+            "coalescing_in_flight": ("gauge", "Requêtes GET Spotify en cours.", flights["in_flight"]),
+            "coalescing_executed_total": ("counter", "Requêtes GET envoyées à Spotify.", flights["executed"]),
+            "coalescing_coalesced_total": (
+                "counter", "Requêtes GET servies par un appel identique en cours.", flights["coalesced"],
+            ),
+        })
+        return HttpResponse(body, content_type="text/plain; version=0.0.4; charset=utf-8")
+
 class SpotifyLoginView(APIView):
     """
     Génère une URL d'authentification Spotify pour l'utilisateur.
@@ -480,6 +843,10 @@ class SpotifyLoginView(APIView):
     1. Génère une URL d'authentification Spotify avec les bons paramètres.
     2. Retourne cette URL pour que l'utilisateur puisse s'y connecter.
     
+    Les autorisations demandées (`SPOTIFY_SCOPES`) couvrent la lecture en cours et sa
+    synchronisation, ainsi que les titres les plus écoutés, lus avec le token enregistré pour
+    les profils musicaux de l'utilisateur et de ses groupes.
+    
     **Réponses possibles** :
     - 200 : Succès, retourne l'URL d'authentification Spotify.
     """
@@ -489,7 +856,7 @@ class SpotifyLoginView(APIView):
             f"client_id={SPOTIFY_CLIENT_ID}"
             f"&response_type=code"
             f"&redirect_uri={SPOTIFY_REDIRECT_URI}"
-            f"&scope=user-read-playback-state user-modify-playback-state"
+            f"&scope={SPOTIFY_SCOPES}"
             f"&state={username}"
         )
         return Response({"auth_url": auth_url}, status=status.HTTP_200_OK)